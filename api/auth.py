@@ -6,9 +6,12 @@ from fastapi.security import OAuth2PasswordBearer
 from fastapi import HTTPException, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy.orm import joinedload
 from database.init_db import User, Trader, get_async_db  # Added Trader
 from api.schemas import TokenData
-from constants import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from api.services.auth_cache import token_cache, UserPrincipal, TraderPrincipal
+from api.services.password_pool import password_pool, PasswordPoolBusyError
+from constants import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, OPERATOR_ROLE_NAMES
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -25,6 +28,22 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+async def hash_password_async(password: str) -> str:
+    """Хэширует пароль в пуле потоков, не блокируя цикл событий."""
+    try:
+        return await password_pool.run(hash_password, password)
+    except PasswordPoolBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Проверяет пароль в пуле потоков, не блокируя цикл событий."""
+    try:
+        return await password_pool.run(verify_password, plain_password, hashed_password)
+    except PasswordPoolBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Создает JWT токен с истечением срока действия."""
     to_encode = data.copy()
@@ -37,8 +56,12 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
-    """Получает текущего пользователя по JWT токену."""
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)) -> UserPrincipal:
+    """Получает текущего пользователя по JWT токену (проверенные токены кэшируются)."""
+    cached = token_cache.get("user", token)
+    if isinstance(cached, UserPrincipal):
+        return cached
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_email: Optional[str] = payload.get("sub")
@@ -48,31 +71,57 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession
     except JWTError:
         raise HTTPException(status_code=401, detail="Не удалось проверить токен")
 
-    result = await db.execute(select(User).filter(User.email == token_data.email))
+    result = await db.execute(select(User).options(joinedload(User.role)).filter(User.email == token_data.email))
     user = result.scalars().first()
     if user is None:
         raise HTTPException(status_code=401, detail="Пользователь не найден")
-    return user
-
 
-async def get_current_trader(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
-    """Gets the current trader by JWT token and checks if the trader is active."""
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_email: Optional[str] = payload.get("sub")
-        if user_email is None:
+    principal = UserPrincipal.from_orm(user)
+    token_cache.put("user", token, principal.email, principal, payload.get("exp"))
+    return principal
+
+
+async def get_current_operator(current_user: UserPrincipal = Depends(get_current_user)) -> UserPrincipal:
+    """Пользователь с операторскими правами: суперпользователь или роль из OPERATOR_ROLE_NAMES."""
+    if not (current_user.is_superuser or current_user.role_name in OPERATOR_ROLE_NAMES):
+        raise HTTPException(status_code=403, detail="Недостаточно прав для операции")
+    return current_user
+
+
+async def get_current_trader(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)) -> TraderPrincipal:
+    """Gets the current trader by JWT token and checks if the trader is active (verified tokens are cached)."""
+    principal = token_cache.get("trader", token)
+    if not isinstance(principal, TraderPrincipal):
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            user_email: Optional[str] = payload.get("sub")
+            if user_email is None:
+                raise HTTPException(status_code=401, detail="Could not validate token")
+            token_data = TokenData(email=user_email)
+        except JWTError:
             raise HTTPException(status_code=401, detail="Could not validate token")
-        token_data = TokenData(email=user_email)
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Could not validate token")
 
-    result = await db.execute(select(Trader).filter(Trader.email == token_data.email))
-    trader = result.scalars().first()
-    if trader is None:
-        raise HTTPException(status_code=401, detail="Trader not found")
-    if not trader.access:
+        result = await db.execute(select(Trader).filter(Trader.email == token_data.email))
+        trader = result.scalars().first()
+        if trader is None:
+            raise HTTPException(status_code=401, detail="Trader not found")
+
+        principal = TraderPrincipal.from_orm(trader)
+        token_cache.put("trader", token, principal.email, principal, payload.get("exp"))
+
+    if not principal.access:
         raise HTTPException(status_code=403, detail="Trader account is disabled")
-    return trader
+    return principal
+
+
+def invalidate_user(email: str) -> None:
+    """Сбрасывает кэшированные токены пользователя (смена пароля, профиля)."""
+    token_cache.invalidate("user", email)
+
+
+def invalidate_trader(email: str) -> None:
+    """Drops cached tokens of a trader (password, access or profile change)."""
+    token_cache.invalidate("trader", email)
 
 
 def create_trader_token(trader: Trader) -> str:
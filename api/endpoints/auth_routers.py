@@ -11,9 +11,10 @@ from typing import Optional, List
 
 from api.auth import (
     create_access_token,
-    verify_password,
-    hash_password,
-    get_current_user
+    verify_password_async,
+    hash_password_async,
+    get_current_user,
+    invalidate_user
 )
 from database.init_db import User, Role, ExchangeOrder, get_async_db
 from api.schemas import (
@@ -25,6 +26,7 @@ from api.schemas import (
     OrderResponse          # Добавляем схему для ответа с заказами
 )
 from api.utils.user_utils import get_current_user_info
+from api.services.auth_cache import UserPrincipal
 from api.enums import OrderStatus, VerificationLevelEnum
 
 # Настройка логирования
@@ -48,7 +50,7 @@ async def register_user(request: RegisterRequest, db: AsyncSession = Depends(get
         raise HTTPException(status_code=400, detail="Email уже зарегистрирован")
 
     # Хеширование пароля
-    hashed_password = hash_password(request.password)
+    hashed_password = await hash_password_async(request.password)
     
     # Получение роли по умолчанию (например, 'user')
     result = await db.execute(select(Role).filter(Role.name == 'user'))
@@ -100,7 +102,7 @@ async def login_user(request: LoginRequest, db: AsyncSession = Depends(get_async
             )
         
         # Проверка пароля
-        if not verify_password(request.password, user.password_hash):
+        if not await verify_password_async(request.password, user.password_hash):
             raise HTTPException(
                 status_code=401, 
                 detail="Неверный email или пароль"
@@ -147,7 +149,7 @@ async def login_user(request: LoginRequest, db: AsyncSession = Depends(get_async
 @router.get("/profile", response_model=UserDetailedResponse)
 async def get_me(
     db: AsyncSession = Depends(get_async_db),
-    current_user: User = Depends(get_current_user),
+    current_user: UserPrincipal = Depends(get_current_user),
     start_date: Optional[datetime] = Query(None, description="Фильтр заказов: начальная дата"),
     end_date: Optional[datetime] = Query(None, description="Фильтр заказов: конечная дата"),
     status: Optional[OrderStatus] = Query(None, description="Фильтр заказов: статус")
@@ -156,13 +158,8 @@ async def get_me(
     Получение детальной информации о текущем пользователе, включая историю заказов с фильтрацией.
     """
     try:
-        # Получаем информацию о пользователе с предзагрузкой заказов
-        stmt = (
-            select(User)
-            .options(selectinload(User.orders))
-            .filter(User.id == current_user.id)
-        )
-        result = await db.execute(stmt)
+        # Заказы загружаются ниже отдельным запросом с фильтрами — связь User.orders не нужна
+        result = await db.execute(select(User).filter(User.id == current_user.id))
         user = result.scalar_one_or_none()
 
         if not user:
@@ -218,7 +215,7 @@ async def get_me(
 async def update_profile(
     user_update: UserUpdateRequest, 
     db: AsyncSession = Depends(get_async_db), 
-    current_user: User = Depends(get_current_user)
+    current_user: UserPrincipal = Depends(get_current_user)
 ):
     """Обновление профиля текущего пользователя."""
     user_email = current_user.email  # Сохраняем email заранее для логирования
@@ -242,6 +239,8 @@ async def update_profile(
             logger.error("Ошибка при коммите изменений профиля пользователя %s: %s", user_email, e)
             raise HTTPException(status_code=500, detail="Ошибка обновления профиля")
 
+        invalidate_user(user_email)
+
         logger.info("Профиль пользователя %s успешно обновлен", user_email)
         return {"message": "Профиль успешно обновлен"}
 
@@ -258,15 +257,18 @@ async def update_profile(
 async def change_password(
     request: ChangePasswordRequest,
     db: AsyncSession = Depends(get_async_db),
-    current_user: User = Depends(get_current_user)
+    current_user: UserPrincipal = Depends(get_current_user)
 ):
     """Изменение пароля текущего пользователя."""
     user_email = current_user.email  # Сохраняем email пользователя заранее
     logger.info("Пользователь %s пытается изменить пароль", user_email)
 
     try:
+        # Снимок из кэша токенов не содержит хэш пароля, загружаем строку пользователя
+        user = await get_current_user_info(db, current_user)
+
         # Верификация текущего пароля
-        if not verify_password(request.current_password, current_user.password_hash):
+        if not await verify_password_async(request.current_password, user.password_hash):
             logger.warning(
                 "Неудачная попытка изменения пароля пользователем %s: неверный текущий пароль",
                 user_email
@@ -274,11 +276,11 @@ async def change_password(
             raise HTTPException(status_code=401, detail="Неверный текущий пароль")
 
         # Хеширование нового пароля
-        hashed_new_password = hash_password(request.new_password)
+        hashed_new_password = await hash_password_async(request.new_password)
 
         # Обновление пароля и времени обновления
-        current_user.password_hash = hashed_new_password
-        current_user.updated_at = datetime.utcnow()
+        user.password_hash = hashed_new_password
+        user.updated_at = datetime.utcnow()
 
         # Коммит изменений в базу данных внутри транзакционного контекста
         try:
@@ -288,6 +290,8 @@ async def change_password(
             logger.error("Ошибка при коммите изменения пароля пользователя %s: %s", user_email, e)
             raise HTTPException(status_code=500, detail="Ошибка изменения пароля")
 
+        invalidate_user(user_email)
+
         logger.info("Пользователь %s успешно изменил пароль", user_email)
         return {"message": "Пароль успешно изменен"}
     
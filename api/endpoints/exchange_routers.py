@@ -1,19 +1,14 @@
 # api/endpoints/exchange_routers.py
 
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
-from sqlalchemy import delete
 from datetime import datetime
-from typing import List
-from decimal import Decimal
+from typing import List, Optional
 
-from database.init_db import ExchangeRate, get_async_db
-from .garantex_api import (
-    fetch_usdt_rub_garantex_rates,
-    fetch_btc_rub_garantex_rates
-)
-from api.schemas import ExchangeRateResponse
+from database.init_db import get_async_db
+from api.services.rate_service import rate_service, RatesUnavailableError
+from api.services.rate_history import RESOLUTIONS, get_rate_bars, history_bounds, pick_resolution
+from api.schemas import ExchangeRateResponse, ExchangeRateBarResponse
 
 router = APIRouter()
 
@@ -26,72 +21,47 @@ async def health_check():
 async def update_exchange_rates(db: AsyncSession = Depends(get_async_db)):
     """Обновление курсов обмена валют для USDT и BTC с добавлением median_rate."""
     try:
-        # Шаг 1: Получаем курсы USDT/RUB и BTC/RUB из Garantex
-        usdt_rates = await fetch_usdt_rub_garantex_rates()
-        btc_rates = await fetch_btc_rub_garantex_rates()
+        await rate_service.refresh(db)
+        return {"message": "Курсы успешно обновлены", "version": rate_service.version}
 
-        if not usdt_rates or not btc_rates:
-            raise HTTPException(status_code=500, detail="Не удалось получить курсы с Garantex")
-
-        # Список валют для обновления
-        currencies = [
-            {"currency": "USDT", "rates": usdt_rates},
-            {"currency": "BTC", "rates": btc_rates}
-        ]
-
-        for item in currencies:
-            currency = item["currency"]
-            rates = item["rates"]
-
-            buy_rate = Decimal(str(rates["buy_rate"]))
-            sell_rate = Decimal(str(rates["sell_rate"]))
-            median_rate = (buy_rate + sell_rate) / 2  # Вычисляем средний курс
-
-            # Проверяем, существует ли уже запись для этой валюты
-            stmt = select(ExchangeRate).where(ExchangeRate.currency == currency)
-            result = await db.execute(stmt)
-            rate_obj = result.scalar_one_or_none()
-
-            if rate_obj:
-                # Обновляем существующую запись
-                rate_obj.buy_rate = buy_rate
-                rate_obj.sell_rate = sell_rate
-                rate_obj.median_rate = median_rate  # Обновляем средний курс
-                rate_obj.source = rates.get("source", "Garantex")
-                rate_obj.updated_at = datetime.utcnow()
-            else:
-                # Создаем новую запись
-                new_rate = ExchangeRate(
-                    currency=currency,
-                    buy_rate=buy_rate,
-                    sell_rate=sell_rate,
-                    median_rate=median_rate,  # Устанавливаем средний курс при создании
-                    source=rates.get("source", "Garantex"),
-                    updated_at=datetime.utcnow()
-                )
-                db.add(new_rate)
-
-        # Шаг 2: Сохраняем все изменения в базе данных
-        await db.commit()
-
-        return {"message": "Курсы успешно обновлены"}
-
-    except HTTPException as http_exc:
-        raise http_exc
+    except RatesUnavailableError as e:
+        raise HTTPException(status_code=500, detail=str(e))
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=500, detail=f"Ошибка обновления курсов: {str(e)}")
 
 @router.get("/get_rates", response_model=List[ExchangeRateResponse])
-async def get_exchange_rates(db: AsyncSession = Depends(get_async_db)):
-    """Получение текущих курсов обмена валют с учетом median_rate."""
+async def get_exchange_rates(response: Response):
+    """Получение текущих курсов обмена валют с учетом median_rate из кэша в памяти."""
+    rates = rate_service.all()
+    if not rates:
+        raise HTTPException(status_code=404, detail="Курсы не найдены")
+    response.headers["X-Rates-Version"] = str(rate_service.version)
+    return rates
+
+@router.get("/rates_version")
+async def get_rates_version():
+    """Версия и время последнего обновления кэша курсов."""
+    return {"version": rate_service.version, "updated_at": rate_service.updated_at}
+
+@router.get("/rates_history", response_model=List[ExchangeRateBarResponse])
+async def get_rates_history(
+    currency: str = Query(..., description="Валюта, например USDT"),
+    start: Optional[datetime] = Query(None, description="Начало интервала (по умолчанию сутки назад)"),
+    end: Optional[datetime] = Query(None, description="Конец интервала (по умолчанию сейчас)"),
+    resolution: Optional[str] = Query(None, description="1m или 1h; по умолчанию выбирается по длине интервала"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """История курса в виде OHLC-свечей из таблицы агрегатов."""
+    start, end = history_bounds(start, end)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="Начало интервала должно быть раньше конца")
+    if resolution is None:
+        resolution = pick_resolution(start, end)
+    elif resolution not in RESOLUTIONS:
+        raise HTTPException(status_code=400, detail=f"Допустимые значения resolution: {', '.join(RESOLUTIONS)}")
+
     try:
-        result = await db.execute(select(ExchangeRate))
-        rates = result.scalars().all()
-        if not rates:
-            raise HTTPException(status_code=404, detail="Курсы не найдены")
-        return rates
-    except HTTPException as http_err:
-        raise http_err
+        return await get_rate_bars(db, currency, start, end, resolution)
     except Exception as e:
-        raise HTTPException(status_code=500, detail="Ошибка получения курсов")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Ошибка получения истории курсов")
@@ -1,64 +1,92 @@
 # api/endpoints/garantex_api.py
 
+import asyncio
 import httpx
 import logging
-# Импорт URL для API Garantex
-from constants import GARANTEX_API_URL
+from typing import Dict, Iterable, Optional
+# Импорт URL и настроек клиента для API Garantex
+from constants import (
+    GARANTEX_API_URL,
+    GARANTEX_TIMEOUT_SECONDS,
+    GARANTEX_MAX_CONNECTIONS,
+    GARANTEX_KEEPALIVE_EXPIRY_SECONDS
+)
+from api.services.order_book import OrderBookSnapshot
 from config.logging_config import setup_logging
 
 setup_logging()
 logger = logging.getLogger(__name__)
 
-async def fetch_usdt_rub_garantex_rates():
+# Долгоживущий клиент с пулом соединений, общий для всех запросов к Garantex
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_client() -> httpx.AsyncClient:
     """
-    Асинхронная функция для получения курсов USDT/RUB с Garantex.
+    Возвращает общий httpx.AsyncClient, создавая его при первом обращении.
+    Соединения переиспользуются (keep-alive), поэтому TCP+TLS рукопожатие
+    выполняется один раз, а не на каждый запрос.
     """
-    try:
-        logger.info("Запрос курсов USDT/RUB с Garantex начат")
-        async with httpx.AsyncClient() as client:
-            response = await client.get(GARANTEX_API_URL, params={"market": "usdtrub"})
-            response.raise_for_status()
-            data = response.json()
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(GARANTEX_TIMEOUT_SECONDS),
+            limits=httpx.Limits(
+                max_connections=GARANTEX_MAX_CONNECTIONS,
+                max_keepalive_connections=GARANTEX_MAX_CONNECTIONS,
+                keepalive_expiry=GARANTEX_KEEPALIVE_EXPIRY_SECONDS
+            ),
+            headers={"Connection": "keep-alive"}
+        )
+    return _client
 
-        # Извлечение минимальной цены продажи и максимальной цены покупки
-        if data.get("asks") and data.get("bids"):
-            buy_rate = float(data["asks"][0]["price"])
-            sell_rate = float(data["bids"][0]["price"])
-            logger.info(f"Курсы USDT/RUB успешно получены: buy_rate={buy_rate}, sell_rate={sell_rate}")
-            return {"buy_rate": buy_rate, "sell_rate": sell_rate, "source": "Garantex"}
-        else:
-            logger.warning("Данные о курсах USDT/RUB отсутствуют в ответе API.")
-            return None
-    except httpx.HTTPError as http_err:
-        logger.error(f"HTTP ошибка при запросе курсов USDT/RUB: {http_err}")
-        return None
-    except Exception as e:
-        logger.error(f"Ошибка при запросе курсов USDT/RUB: {e}")
-        return None
 
-async def fetch_btc_rub_garantex_rates():
+async def close_client() -> None:
+    """Закрывает общий клиент (вызывается при остановке приложения)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def fetch_garantex_rates(market: str, url: str = GARANTEX_API_URL) -> Optional[dict]:
     """
-    Асинхронная функция для получения курсов BTC/RUB с Garantex.
+    Асинхронная функция для получения курсов произвольного рынка Garantex (например, "usdtrub").
     """
     try:
-        logger.info("Запрос курсов BTC/RUB с Garantex начат")
-        async with httpx.AsyncClient() as client:
-            response = await client.get(GARANTEX_API_URL, params={"market": "btcrub"})
-            response.raise_for_status()
-            data = response.json()
+        logger.info(f"Запрос курсов {market} с Garantex начат")
+        response = await get_client().get(url, params={"market": market})
+        response.raise_for_status()
+        data = response.json()
 
-        # Извлечение минимальной цены продажи и максимальной цены покупки
+        # Стакан разбирается один раз; лучшие цены берутся из отсортированных уровней
         if data.get("asks") and data.get("bids"):
-            buy_rate = float(data["asks"][0]["price"])
-            sell_rate = float(data["bids"][0]["price"])
-            logger.info(f"Курсы BTC/RUB успешно получены: buy_rate={buy_rate}, sell_rate={sell_rate}")
-            return {"buy_rate": buy_rate, "sell_rate": sell_rate, "source": "Garantex"}
+            order_book = OrderBookSnapshot.from_depth(data)
+            buy_rate = float(order_book.asks.prices[0])
+            sell_rate = float(order_book.bids.prices[0])
+            logger.info(f"Курсы {market} успешно получены: buy_rate={buy_rate}, sell_rate={sell_rate}")
+            return {
+                "buy_rate": buy_rate,
+                "sell_rate": sell_rate,
+                "source": "Garantex",
+                "order_book": order_book
+            }
         else:
-            logger.warning("Данные о курсах BTC/RUB отсутствуют в ответе API.")
+            logger.warning(f"Данные о курсах {market} отсутствуют в ответе API.")
             return None
     except httpx.HTTPError as http_err:
-        logger.error(f"HTTP ошибка при запросе курсов BTC/RUB: {http_err}")
+        logger.error(f"HTTP ошибка при запросе курсов {market}: {http_err}")
         return None
     except Exception as e:
-        logger.error(f"Ошибка при запросе курсов BTC/RUB: {e}")
-        return None
\ No newline at end of file
+        logger.error(f"Ошибка при запросе курсов {market}: {e}")
+        return None
+
+
+async def fetch_markets_rates(markets: Iterable[str], url: str = GARANTEX_API_URL) -> Dict[str, Optional[dict]]:
+    """
+    Параллельно запрашивает курсы для списка рынков.
+    Время обновления равно одному запросу, а не сумме запросов по всем рынкам.
+    """
+    markets = list(markets)
+    results = await asyncio.gather(*(fetch_garantex_rates(market, url) for market in markets))
+    return dict(zip(markets, results))
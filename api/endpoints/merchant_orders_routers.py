@@ -1,17 +1,151 @@
 # api/endpoints/merchant_orders_routers.py
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import ColumnElement, and_, cast, insert
 from sqlalchemy.future import select
+from sqlalchemy.sql.dml import ReturningInsert
+import itertools
 import logging
+from datetime import datetime
 
 from database.init_db import TraderOrder, Trader, ReqTrader, get_async_db
 from api.schemas import TraderOrderResponse, TraderOrderCreate
-from api.enums import OrderStatus, TraderReqStatus
+from api.enums import OrderStatus, TraderReqStatus, TraderOrderTypeEnum
+from api.services.order_events import OrderEvent, order_events
+from api.services.balance_ledger import RESERVING_ORDER_TYPES, BalanceChange, reserve_for_order
+from api.services.trader_routing import trader_routing
+from api.services.trader_stats import record_order_created
+from constants import TRADER_ROUTING_MAX_ATTEMPTS
 from decimal import Decimal
+from typing import Any, NoReturn, Optional, Tuple
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+def _eligibility_filter(order_type: TraderOrderTypeEnum) -> ColumnElement[bool]:
+    """Трейдер принимает ордера этого типа, реквизит можно для него использовать."""
+    if order_type == TraderOrderTypeEnum.pay_in:
+        return and_(Trader.pay_in == True, ReqTrader.can_sell == True)
+    return and_(Trader.pay_out == True, ReqTrader.can_buy == True)
+
+
+def _insert_eligible_order(order: TraderOrderCreate, trader_req_id: int, median_rate: Decimal) -> ReturningInsert[TraderOrder]:
+    """
+    INSERT ... SELECT из req_traders JOIN traders: строка вставляется, только если реквизит
+    одобрен, трейдер активен и тип ордера разрешён и трейдеру, и реквизиту.
+    """
+    columns = TraderOrder.__table__.c
+    now = datetime.utcnow()
+    values = {
+        "order_type": order.order_type,
+        "currency": order.currency,
+        "fiat": order.fiat,
+        "amount_currency": order.amount_currency,
+        "total_fiat": order.total_fiat,
+        "median_rate": median_rate,
+        "status": OrderStatus.pending,
+        "payment_method_id": order.payment_method_id,
+        "created_at": now,
+        "updated_at": now,
+    }
+    eligible = (
+        select(
+            ReqTrader.trader_id,
+            ReqTrader.id,
+            *(cast(value, columns[name].type) for name, value in values.items())
+        )
+        .join(Trader, Trader.id == ReqTrader.trader_id)
+        .where(
+            ReqTrader.id == trader_req_id,
+            ReqTrader.status == TraderReqStatus.approve,
+            Trader.access == True,
+            _eligibility_filter(order.order_type)
+        )
+    )
+    return (
+        insert(TraderOrder)
+        .from_select(["trader_id", "trader_req_id", *values], eligible)
+        .returning(TraderOrder)
+    )
+
+
+async def _raise_rejection(db: AsyncSession, order: TraderOrderCreate) -> NoReturn:
+    """Причина отказа — отдельный запрос только на неуспешном пути."""
+    result = await db.execute(
+        select(ReqTrader, Trader)
+        .outerjoin(Trader, and_(Trader.id == ReqTrader.trader_id, Trader.access == True))
+        .filter(
+            ReqTrader.id == order.trader_req_id,
+            ReqTrader.status == TraderReqStatus.approve  # Проверяем, что реквизит активен
+        )
+    )
+    row = result.first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Trader requisite not found or not approved")
+
+    req, trader = row
+    raise _rejection(order.order_type, req, trader)
+
+
+def _rejection(order_type: TraderOrderTypeEnum, req: ReqTrader, trader: Optional[Trader]) -> HTTPException:
+    if not trader:
+        return HTTPException(status_code=400, detail="Trader is not active or not found")
+
+    # Проверяем, что trader принимает ордера (pay_in для ордеров на покупку, pay_out для ордеров на продажу)
+    if order_type == TraderOrderTypeEnum.pay_in and not trader.pay_in:
+        return HTTPException(status_code=400, detail="Trader is not accepting pay-in orders")
+    if order_type == TraderOrderTypeEnum.pay_out and not trader.pay_out:
+        return HTTPException(status_code=400, detail="Trader is not accepting pay-out orders")
+
+    # Проверяем, что реквизит может использоваться для данного типа ордера
+    if order_type == TraderOrderTypeEnum.pay_in and not req.can_sell:
+        return HTTPException(status_code=400, detail="This requisite cannot be used for pay-in orders")
+    if order_type == TraderOrderTypeEnum.pay_out and not req.can_buy:
+        return HTTPException(status_code=400, detail="This requisite cannot be used for pay-out orders")
+
+    # При повторном чтении реквизит подходит: он или трейдер изменились между вставкой и проверкой
+    return HTTPException(status_code=409, detail="Trader requisite is no longer eligible, retry the request")
+
+
+async def _reserve_balance(db: AsyncSession, db_order: Any) -> Tuple[bool, Optional[BalanceChange]]:
+    """
+    Для pay_out блокирует сумму ордера на балансе трейдера (тот же запрос пишет журнал).
+    При нехватке средств транзакция с ордером откатывается и возвращается (False, None).
+    """
+    if db_order.order_type not in RESERVING_ORDER_TYPES:
+        return True, None
+    trader_id, fiat = db_order.trader_id, db_order.fiat.value  # после rollback атрибуты недоступны
+    change = await reserve_for_order(db, db_order)
+    if change is not None:
+        return True, change
+    await db.rollback()
+    # Баланс в индексе устарел: до следующей перезагрузки ордера трейдеру не направляются
+    trader_routing.set_balance(trader_id, fiat, Decimal("0"))
+    return False, None
+
+
+async def _create_routed_order(
+    db: AsyncSession, order: TraderOrderCreate, median_rate: Decimal
+) -> Tuple[TraderOrder, Optional[BalanceChange]]:
+    """
+    Реквизит выбирает trader_routing; если индекс устарел и вставка не прошла проверку
+    (или у трейдера не хватило средств), пробуется следующий кандидат.
+    """
+    candidates = trader_routing.candidates(
+        order.order_type, order.fiat, order.payment_method_id, order.total_fiat, order.bank
+    )
+    for trader_req_id in itertools.islice(candidates, TRADER_ROUTING_MAX_ATTEMPTS):
+        result = await db.execute(_insert_eligible_order(order, trader_req_id, median_rate))
+        db_order = result.scalar_one_or_none()
+        if db_order is None:
+            trader_routing.remove_requisite(trader_req_id)
+            continue
+        reserved, change = await _reserve_balance(db, db_order)
+        if reserved:
+            return db_order, change
+    raise HTTPException(status_code=409, detail="No available trader for this order")
+
+
 @router.post("/", response_model=TraderOrderResponse)
 async def create_merchant_order(
     order: TraderOrderCreate, 
@@ -20,70 +154,33 @@ async def create_merchant_order(
     """
     Endpoint for merchants to create a new order for a trader.
     Does not require trader authentication but validates trader's availability and requisite.
+    Without trader_req_id the requisite is picked by the routing engine.
     """
     try:
-        # Проверяем существование реквизита
-        req_result = await db.execute(
-            select(ReqTrader).filter(
-                ReqTrader.id == order.trader_req_id,
-                ReqTrader.status == TraderReqStatus.approve  # Проверяем, что реквизит активен
-            )
-        )
-        
-        req = req_result.scalar_one_or_none()
-        if not req:
-            raise HTTPException(status_code=404, detail="Trader requisite not found or not approved")
-        
-        # Получаем trader_id из реквизита
-        trader_id = req.trader_id
-        
-        # Проверяем, что trader существует и активен
-        trader_result = await db.execute(
-            select(Trader).filter(
-                Trader.id == trader_id,
-                Trader.access == True  # Проверяем, что трейдер активен
-            )
-        )
-        
-        trader = trader_result.scalar_one_or_none()
-        if not trader:
-            raise HTTPException(status_code=400, detail="Trader is not active or not found")
-        
-        # Проверяем, что trader принимает ордера (pay_in для ордеров на покупку, pay_out для ордеров на продажу)
-        if order.order_type.value == "pay_in" and not trader.pay_in:
-            raise HTTPException(status_code=400, detail="Trader is not accepting pay-in orders")
-        if order.order_type.value == "pay_out" and not trader.pay_out:
-            raise HTTPException(status_code=400, detail="Trader is not accepting pay-out orders")
-        
-        # Проверяем, что реквизит может использоваться для данного типа ордера
-        if order.order_type.value == "pay_in" and not req.can_sell:
-            raise HTTPException(status_code=400, detail="This requisite cannot be used for pay-in orders")
-        if order.order_type.value == "pay_out" and not req.can_buy:
-            raise HTTPException(status_code=400, detail="This requisite cannot be used for pay-out orders")
-        
-        # Создаем ордер
         # Расчет median_rate (в реальном приложении это может быть получено из сервиса обмена валют)
         median_rate = order.total_fiat / order.amount_currency if order.amount_currency != 0 else Decimal('0')
-        
-        db_order = TraderOrder(
-            trader_id=trader_id,
-            trader_req_id=order.trader_req_id,
-            order_type=order.order_type,
-            currency=order.currency,
-            fiat=order.fiat,
-            amount_currency=order.amount_currency,
-            total_fiat=order.total_fiat,
-            median_rate=median_rate,
-            status=OrderStatus.pending,
-            payment_method_id=order.payment_method_id
-        )
-        
-        db.add(db_order)
+
+        db_order: Optional[TraderOrder]
+        if order.trader_req_id is None:
+            db_order, balance_change = await _create_routed_order(db, order, median_rate)
+        else:
+            # Один запрос: проверка реквизита и трейдера + вставка ордера с RETURNING (без refresh)
+            result = await db.execute(_insert_eligible_order(order, order.trader_req_id, median_rate))
+            db_order = result.scalar_one_or_none()
+            if db_order is None:
+                await _raise_rejection(db, order)
+            reserved, balance_change = await _reserve_balance(db, db_order)
+            if not reserved:
+                raise HTTPException(status_code=409, detail="Trader has insufficient available balance")
+
+        await record_order_created(db, db_order)
         await db.commit()
-        await db.refresh(db_order)
-        
-        logger.info(f"Merchant created new order: id={db_order.id}, trader_id={trader_id}, type={order.order_type}")
-        
+        if balance_change is not None:
+            trader_routing.set_balance(balance_change.trader_id, balance_change.fiat, balance_change.available)
+        await order_events.publish(OrderEvent.trader_order(db_order))
+
+        logger.info(f"Merchant created new order: id={db_order.id}, trader_id={db_order.trader_id}, type={order.order_type}")
+
         return db_order
     except HTTPException:
         raise
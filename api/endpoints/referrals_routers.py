@@ -3,7 +3,8 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 from sqlalchemy import select
 from datetime import datetime
-from api.auth import get_current_user
+from api.auth import get_current_user, invalidate_user
+from api.services.auth_cache import UserPrincipal
 from database.init_db import User, get_async_db
 from api.schemas import ReferralData, UserResponse
 import logging
@@ -17,7 +18,7 @@ router = APIRouter()
 # Получение данных реферальной системы
 @router.get("/referrals", response_model=ReferralData)
 async def get_referrals(
-    current_user: User = Depends(get_current_user), 
+    current_user: UserPrincipal = Depends(get_current_user), 
     db: AsyncSession = Depends(get_async_db)
 ):
     try:
@@ -58,7 +59,7 @@ async def get_referrals(
 # Генерация реферального кода
 @router.post("/referrals/generate", response_model=str)
 async def generate_referral_code(
-    current_user: User = Depends(get_current_user), 
+    current_user: UserPrincipal = Depends(get_current_user), 
     db: AsyncSession = Depends(get_async_db)
 ):
     """
@@ -79,6 +80,7 @@ async def generate_referral_code(
         # commit и refresh также вызываем асинхронно
         await db.commit()
         await db.refresh(user)
+        invalidate_user(user.email)
         logger.info("Реферальный код сгенерирован: %s", user.referral_code)
 
     return user.referral_code
@@ -87,7 +89,7 @@ async def generate_referral_code(
 # Получение уже созданного промокода и реферальной ссылки
 @router.get("/referrals/code", response_model=dict)
 async def get_referral_code(
-    current_user: User = Depends(get_current_user), 
+    current_user: UserPrincipal = Depends(get_current_user), 
     db: AsyncSession = Depends(get_async_db)
 ):
     """
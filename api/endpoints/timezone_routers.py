@@ -3,8 +3,9 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import joinedload
 import logging
-from database.init_db import TimeZone, Trader, get_async_db
-from api.auth import get_current_trader
+from database.init_db import TimeZone, Trader, get_async_db, get_async_read_db
+from api.auth import get_current_trader, invalidate_trader
+from api.services.auth_cache import TraderPrincipal
 
 # Setup logging
 from config.logging_config import setup_logging
@@ -14,7 +15,7 @@ logger = logging.getLogger(__name__)  # Исправлено с 'name' на '__n
 router = APIRouter()
 
 @router.get("/timezones")
-async def get_timezones(db: AsyncSession = Depends(get_async_db)):
+async def get_timezones(db: AsyncSession = Depends(get_async_read_db)):
     """Get all available time zones."""
     try:
         result = await db.execute(select(TimeZone).order_by(TimeZone.utc_offset))
@@ -36,7 +37,7 @@ async def get_timezones(db: AsyncSession = Depends(get_async_db)):
 
 @router.get("/trader/timezone")
 async def get_trader_timezone(
-    current_trader: Trader = Depends(get_current_trader),
+    current_trader: TraderPrincipal = Depends(get_current_trader),
     db: AsyncSession = Depends(get_async_db)
 ):
     """Get current trader's time zone."""
@@ -69,7 +70,7 @@ async def get_trader_timezone(
 @router.put("/trader/timezone/{timezone_id}")
 async def update_trader_timezone(
     timezone_id: int,
-    current_trader: Trader = Depends(get_current_trader),
+    current_trader: TraderPrincipal = Depends(get_current_trader),
     db: AsyncSession = Depends(get_async_db)
 ):
     """Update trader's time zone."""
@@ -82,8 +83,10 @@ async def update_trader_timezone(
             raise HTTPException(status_code=404, detail="Time zone not found")
             
         # Update trader's time zone
-        current_trader.time_zone_id = timezone_id
+        db_trader = await db.get(Trader, current_trader.id)
+        db_trader.time_zone_id = timezone_id
         await db.commit()
+        invalidate_trader(current_trader.email)
         
         return {"message": "Time zone updated successfully"}
     except HTTPException:
@@ -1,40 +1,59 @@
 # api/endpoints/trader_orders_router.py
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from typing import List
+from typing import List, Optional
 import logging
 
-from database.init_db import TraderOrder, Trader, get_async_db
+from database.init_db import TraderOrder, get_async_db, get_async_read_db
 from api.schemas import TraderOrderResponse, TraderOrderUpdate
 from api.auth import get_current_trader
+from api.services.auth_cache import TraderPrincipal
+from api.services.balance_ledger import RESERVING_ORDER_TYPES, release_order
+from api.services.order_events import DELETE, OrderEvent, order_events
+from api.services.order_state_machine import (
+    NOT_FOUND,
+    VERSION_CONFLICT,
+    TransitionRejected,
+    publish_trader_transition,
+    transition_trader_order,
+)
+from api.services.trader_routing import trader_routing
+from api.services.trader_stats import record_order_deleted
+from api.utils.pagination import NEXT_CURSOR_HEADER, keyset_page, split_page
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 @router.get("/", response_model=List[TraderOrderResponse])
 async def read_trader_orders(
-    skip: int = 0, 
-    limit: int = 50, 
-    db: AsyncSession = Depends(get_async_db),
-    current_trader: Trader = Depends(get_current_trader)
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_read_db),
+    current_trader: TraderPrincipal = Depends(get_current_trader)
 ):
     """
-    Endpoint to read trader's own orders. Requires trader authentication.
+    Endpoint to read trader's own orders, newest first. Requires trader authentication.
+    Pass the X-Next-Cursor response header back as `cursor` to get the next page.
     """
     try:
         # Получаем ордера, связанные с текущим трейдером
         query = select(TraderOrder).filter(TraderOrder.trader_id == current_trader.id)
         
-        # Применяем пагинацию
-        query = query.offset(skip).limit(limit)
+        # Keyset-пагинация по индексу (trader_id, created_at, id)
+        query = keyset_page(query, TraderOrder.created_at, TraderOrder.id, cursor, limit)
         
         result = await db.execute(query)
-        orders = result.scalars().all()
+        orders, next_cursor = split_page(result.scalars().all(), limit)
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
         
         logger.info(f"Retrieved {len(orders)} orders for trader_id={current_trader.id}")
         
         return orders
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error retrieving trader orders: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error retrieving orders: {str(e)}")
@@ -43,7 +62,7 @@ async def read_trader_orders(
 async def read_trader_order(
     order_id: int,
     db: AsyncSession = Depends(get_async_db),
-    current_trader: Trader = Depends(get_current_trader)
+    current_trader: TraderPrincipal = Depends(get_current_trader)
 ):
     """
     Endpoint to read a specific trader order. Requires trader authentication.
@@ -74,35 +93,37 @@ async def update_trader_order(
     order_id: int, 
     order: TraderOrderUpdate, 
     db: AsyncSession = Depends(get_async_db), 
-    current_trader: Trader = Depends(get_current_trader)
+    current_trader: TraderPrincipal = Depends(get_current_trader)
 ):
     """
     Endpoint to update an existing trader order. Requires trader authentication.
+    Only the status can change, and only along TRADER_ORDER_TRANSITIONS (other fields are rejected
+    with 422); pass `version` from the last read to reject the update if the order changed in between.
     """
     try:
-        # Получаем ордер и проверяем, что он принадлежит текущему трейдеру
-        result = await db.execute(
-            select(TraderOrder).filter(
-                TraderOrder.id == order_id,
-                TraderOrder.trader_id == current_trader.id
+        # Переход статуса одним UPDATE; баланс и статистика трейдера — в той же транзакции
+        try:
+            result = await transition_trader_order(
+                db, order_id, order.status, TraderOrder.trader_id == current_trader.id,
+                expected_version=order.version
             )
-        )
-        
-        db_order = result.scalar_one_or_none()
-        
-        if db_order is None:
-            raise HTTPException(status_code=404, detail="Order not found")
-            
-        # Обновляем поля ордера
-        for key, value in order.dict(exclude_unset=True).items():
-            setattr(db_order, key, value)
-            
+        except TransitionRejected as rejected:
+            if rejected.reason == NOT_FOUND:
+                raise HTTPException(status_code=404, detail="Order not found")
+            if rejected.reason == VERSION_CONFLICT:
+                raise HTTPException(status_code=409, detail="Order was modified concurrently, reload and retry")
+            current = rejected.current_status.value if rejected.current_status else None
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid status transition from {current} to {order.status.value}"
+            )
+
         await db.commit()
-        await db.refresh(db_order)
+        await publish_trader_transition(result)
         
-        logger.info(f"Updated order: id={order_id}, trader_id={current_trader.id}, status={db_order.status}")
+        logger.info(f"Updated order: id={order_id}, trader_id={current_trader.id}, status={result.order.status}")
         
-        return db_order
+        return result.order
     except HTTPException:
         raise
     except Exception as e:
@@ -114,7 +135,7 @@ async def update_trader_order(
 async def delete_trader_order(
     order_id: int, 
     db: AsyncSession = Depends(get_async_db), 
-    current_trader: Trader = Depends(get_current_trader)
+    current_trader: TraderPrincipal = Depends(get_current_trader)
 ):
     """
     Endpoint to delete a trader order. Requires trader authentication.
@@ -133,9 +154,16 @@ async def delete_trader_order(
         if db_order is None:
             raise HTTPException(status_code=404, detail="Order not found")
             
-        # Удаляем ордер
+        # Удаляем ордер; заблокированные под него средства освобождаются
+        balance_change = None
+        if db_order.order_type in RESERVING_ORDER_TYPES:
+            balance_change = await release_order(db, db_order)
+        await record_order_deleted(db, db_order)
         await db.delete(db_order)
         await db.commit()
+        if balance_change is not None:
+            trader_routing.set_balance(balance_change.trader_id, balance_change.fiat, balance_change.available)
+        await order_events.publish(OrderEvent.trader_order(db_order, action=DELETE))
         
         logger.info(f"Deleted order: id={order_id}, trader_id={current_trader.id}")
         
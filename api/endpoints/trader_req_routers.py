@@ -5,9 +5,10 @@ from sqlalchemy.future import select
 from typing import List
 from datetime import datetime
 
-from database.init_db import BanksTrader, PaymentMethodTrader, get_async_db, ReqTrader
+from database.init_db import BanksTrader, PaymentMethodTrader, get_async_db, get_async_read_db, ReqTrader
 from api.schemas import ReqTraderCreate, ReqTraderResponse, ReqTraderUpdate
 from api.auth import get_current_trader
+from api.services.trader_routing import trader_routing
 
 router = APIRouter()
 
@@ -50,6 +51,7 @@ async def create_trader_requisite(
         db.add(new_requisite)
         await db.commit()
         await db.refresh(new_requisite)
+        trader_routing.upsert_requisite(new_requisite)
         return ReqTraderResponse.from_orm(new_requisite)
     except HTTPException as he:
         raise he
@@ -59,7 +61,7 @@ async def create_trader_requisite(
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 @router.get("/all_requisites", response_model=List[ReqTraderResponse])
-async def get_trader_requisites(db: AsyncSession = Depends(get_async_db)):
+async def get_trader_requisites(db: AsyncSession = Depends(get_async_read_db)):
     try:
         # Instead of JOINs, we'll fetch all data separately and combine it in Python
         result = await db.execute(select(ReqTrader))
@@ -143,6 +145,7 @@ async def update_trader_requisite(
         requisite.updated_at = datetime.utcnow()
         await db.commit()
         await db.refresh(requisite)
+        trader_routing.upsert_requisite(requisite)
         
         return ReqTraderResponse(
             id=requisite.id,
@@ -4,20 +4,28 @@ from fastapi import APIRouter, Depends, HTTPException, Body
 from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy.orm import joinedload
+from sqlalchemy import and_
+from sqlalchemy.orm import raiseload
+from fastapi.encoders import jsonable_encoder
+from typing import Optional
 from decimal import Decimal
 
 from api.auth import (
     create_access_token,
-    verify_password,
-    hash_password,
-    get_current_trader
+    verify_password_async,
+    hash_password_async,
+    get_current_trader,
+    invalidate_trader
 )
+from api.services.auth_cache import TraderPrincipal
+from api.services.trader_routing import trader_routing
+from api.services.trader_stats import success_rate
 from database.init_db import (
     TimeZone, 
     Trader, 
     BalanceTrader,
     FiatCurrencyTrader,
+    TraderStats,
     get_async_db
 )
 from api.schemas import (
@@ -25,7 +33,8 @@ from api.schemas import (
     TraderRegisterRequest,
     TraderUpdateRequest,
     ChangePasswordRequest,
-    TraderDetailedResponse
+    TraderDetailedResponse,
+    TraderStatsResponse
 )
 from api.enums import TraderVerificationLevelEnum, TraderFiatEnum
 from constants import ACCESS_TOKEN_EXPIRE_MINUTES
@@ -71,7 +80,7 @@ async def register_trader(request: TraderRegisterRequest, db: AsyncSession = Dep
             raise HTTPException(status_code=500, detail="System configuration error")
 
         # Hash password
-        hashed_password = hash_password(request.password)
+        hashed_password = await hash_password_async(request.password)
         
         # Create new trader with Moscow time zone and RUB as default currency
         new_trader = Trader(
@@ -108,20 +117,39 @@ async def register_trader(request: TraderRegisterRequest, db: AsyncSession = Dep
         logger.error("Error registering trader %s: %s", request.email, str(e))
         raise HTTPException(status_code=500, detail="Error registering trader")
 
+def _trader_profile_query():
+    """
+    Трейдер с часовым поясом, балансом в своей валюте, валютой и статистикой: один запрос,
+    только однострочные соединения по ключам (без коллекций и distinct).
+    """
+    return (
+        select(Trader, TimeZone, BalanceTrader, FiatCurrencyTrader, TraderStats)
+        .outerjoin(TimeZone, TimeZone.id == Trader.time_zone_id)
+        .outerjoin(FiatCurrencyTrader, FiatCurrencyTrader.id == Trader.fiat_currency_id)
+        .outerjoin(
+            BalanceTrader,
+            and_(BalanceTrader.trader_id == Trader.id, BalanceTrader.fiat == Trader.fiat_currency_id)
+        )
+        .outerjoin(TraderStats, TraderStats.trader_id == Trader.id)
+        .options(raiseload(Trader.referred_traders))  # lazy="selectin" добавил бы второй запрос; профилю связь не нужна
+    )
+
+
+def _stats_response(stats: Optional[TraderStats]) -> TraderStatsResponse:
+    if stats is None:
+        return TraderStatsResponse()
+    response = TraderStatsResponse.model_validate(stats)
+    response.success_rate = success_rate(stats)
+    return response
+
+
 @router.post("/login")
 async def login_trader(request: TraderLoginRequest, db: AsyncSession = Depends(get_async_db)):
     """Authenticate a trader."""
     try:
-        # Get trader by email with balance information
-        result = await db.execute(
-            select(Trader)
-            .options(
-                joinedload(Trader.balance_trader),
-                joinedload(Trader.fiat_currency)
-            )
-            .filter(Trader.email == request.email)
-        )
-        trader = result.scalars().first()
+        # Трейдер, баланс, валюта и статистика — одним запросом
+        row = (await db.execute(_trader_profile_query().filter(Trader.email == request.email))).first()
+        trader = row.Trader if row else None
         
         if not trader:
             raise HTTPException(
@@ -130,7 +158,7 @@ async def login_trader(request: TraderLoginRequest, db: AsyncSession = Depends(g
             )
         
         # Verify password
-        if not verify_password(request.password, trader.password_hash):
+        if not await verify_password_async(request.password, trader.password_hash):
             raise HTTPException(
                 status_code=401, 
                 detail="Invalid email or password"
@@ -144,12 +172,8 @@ async def login_trader(request: TraderLoginRequest, db: AsyncSession = Depends(g
             )
 
         # Get balance information
-        balance = Decimal('0.00')
-        fiat_currency = None
-        if trader.balance_trader:
-            balance = trader.balance_trader[0].balance if trader.balance_trader else Decimal('0.00')
-        if trader.fiat_currency:
-            fiat_currency = trader.fiat_currency.currency_name
+        balance = row.BalanceTrader.balance if row.BalanceTrader else Decimal('0.00')
+        fiat_currency = row.FiatCurrencyTrader.currency_name if row.FiatCurrencyTrader else None
 
         # Create access token
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -170,7 +194,8 @@ async def login_trader(request: TraderLoginRequest, db: AsyncSession = Depends(g
                     "created_at": str(trader.created_at) if trader.created_at else None,
                     "updated_at": str(trader.updated_at) if trader.updated_at else None,
                     "balance": str(balance),
-                    "fiat_currency": fiat_currency
+                    "fiat_currency": fiat_currency,
+                    "stats": jsonable_encoder(_stats_response(row.TraderStats))
                 },
                 "token": access_token,
                 "message": "Login successful"
@@ -186,49 +211,38 @@ async def login_trader(request: TraderLoginRequest, db: AsyncSession = Depends(g
 
 @router.get("/profile", response_model=TraderDetailedResponse)
 async def get_trader_profile(
-    current_trader: Trader = Depends(get_current_trader),
+    current_trader: TraderPrincipal = Depends(get_current_trader),
     db: AsyncSession = Depends(get_async_db)
 ):
     """Get current trader's detailed profile including balance."""
     try:
-        # Get trader with time zone and balance information
-        result = await db.execute(
-            select(Trader)
-            .options(
-                joinedload(Trader.time_zone),
-                joinedload(Trader.balance_trader),
-                joinedload(Trader.fiat_currency)
-            )
-            .filter(Trader.id == current_trader.id)
-            # Add unique() to handle multiple rows from joined collections
-            .distinct()
-        )
-        # Use unique().scalar_one_or_none() instead of just scalar_one_or_none()
-        trader = result.unique().scalar_one_or_none()
+        # Часовой пояс, баланс, валюта и статистика — одним запросом по первичному ключу
+        row = (await db.execute(_trader_profile_query().filter(Trader.id == current_trader.id))).first()
         
-        if not trader:
+        if not row:
             raise HTTPException(status_code=404, detail="Trader not found")
 
-        # Get the balance information
-        balance = None
-        if trader.balance_trader:
-            balance = trader.balance_trader[0].balance if trader.balance_trader else Decimal('0.00')
+        trader, time_zone, balance_row = row.Trader, row.TimeZone, row.BalanceTrader
 
         return TraderDetailedResponse(
             id=trader.id,
             email=trader.email,
             verification_level=trader.verification_level,
             time_zone_id=trader.time_zone_id,
-            time_zone_name=trader.time_zone.name if trader.time_zone else None,
-            time_zone_offset=trader.time_zone.utc_offset if trader.time_zone else None,
+            time_zone_name=time_zone.name if time_zone else None,
+            time_zone_offset=time_zone.utc_offset if time_zone else None,
             pay_in=trader.pay_in,
             pay_out=trader.pay_out,
             access=trader.access,
             created_at=trader.created_at,
             updated_at=trader.updated_at,
-            balance=balance,
-            fiat_currency=trader.fiat_currency.currency_name if trader.fiat_currency else None
+            balance=balance_row.balance if balance_row else None,
+            reserved_balance=balance_row.reserved if balance_row else None,
+            fiat_currency=row.FiatCurrencyTrader.currency_name if row.FiatCurrencyTrader else None,
+            stats=_stats_response(row.TraderStats)
         )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching trader profile: {str(e)}")
         raise HTTPException(status_code=500, detail="Error fetching trader profile")
@@ -236,7 +250,7 @@ async def get_trader_profile(
 @router.put("/update_profile")
 async def update_trader_profile(
     request: TraderUpdateRequest,
-    current_trader: Trader = Depends(get_current_trader),
+    current_trader: TraderPrincipal = Depends(get_current_trader),
     db: AsyncSession = Depends(get_async_db)
 ):
     """Update trader's profile."""
@@ -249,9 +263,11 @@ async def update_trader_profile(
             )
             if not tz_result.scalar_one_or_none():
                 raise HTTPException(status_code=400, detail="Invalid time zone")
-            current_trader.time_zone_id = request.time_zone_id
+            db_trader = await db.get(Trader, current_trader.id)
+            db_trader.time_zone_id = request.time_zone_id
 
         await db.commit()
+        invalidate_trader(current_trader.email)
         return {"message": "Profile updated successfully"}
     except HTTPException:
         raise
@@ -263,16 +279,21 @@ async def update_trader_profile(
 @router.put("/change_password")
 async def change_trader_password(
     request: ChangePasswordRequest,
-    current_trader: Trader = Depends(get_current_trader),
+    current_trader: TraderPrincipal = Depends(get_current_trader),
     db: AsyncSession = Depends(get_async_db)
 ):
     """Change trader's password."""
     try:
-        if not verify_password(request.current_password, current_trader.password_hash):
+        # The cached principal has no password hash, so load the trader row
+        db_trader = await db.get(Trader, current_trader.id)
+        if db_trader is None:
+            raise HTTPException(status_code=404, detail="Trader not found")
+        if not await verify_password_async(request.current_password, db_trader.password_hash):
             raise HTTPException(status_code=401, detail="Invalid current password")
 
-        current_trader.password_hash = hash_password(request.new_password)
+        db_trader.password_hash = await hash_password_async(request.new_password)
         await db.commit()
+        invalidate_trader(current_trader.email)
         return {"message": "Password changed successfully"}
     except HTTPException:
         raise
@@ -286,7 +307,7 @@ async def toggle_trader_online_status(
     trader_id: str,
     is_online: bool = Body(..., description="Whether the trader is accepting orders (true/false)"),  # Простое булевое значение
     db: AsyncSession = Depends(get_async_db),
-    current_trader: Trader = Depends(get_current_trader)
+    current_trader: TraderPrincipal = Depends(get_current_trader)
 ):
     """
     Toggle whether the trader is online/accepting orders (updates pay_in).
@@ -303,5 +324,7 @@ async def toggle_trader_online_status(
     # Обновляем флаг онлайн-статуса (pay_in)
     db_trader.pay_in = is_online
     await db.commit()
+    invalidate_trader(db_trader.email)
+    trader_routing.update_trader(db_trader.id, pay_in=is_online)
     logger.info(f"Trader {trader_id} online status toggled to {is_online}")
     return db_trader.pay_in
\ No newline at end of file
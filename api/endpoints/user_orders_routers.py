@@ -1,17 +1,37 @@
 # api/endpoints/user_orders_routers.py
 
 from decimal import Decimal
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
 from fastapi.encoders import jsonable_encoder
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import joinedload
 from api.enums import OrderTypeEnum
-from database.init_db import ExchangeOrder, OrderStatus, User, get_async_db, PaymentMethod, PaymentMethodEnum, ExchangeRate  # Добавлен ExchangeRate
+from database.init_db import ExchangeOrder, OrderStatus, get_async_db, get_async_read_db, PaymentMethod, PaymentMethodEnum
 from typing import List, Optional
-from api.auth import get_current_user
-from api.schemas import UpdateOrderStatusRequest, OrderResponse, ExchangeOrderRequest, PaymentMethodSchema
-from api.utils.user_utils import get_current_user_info
+from api.auth import get_current_operator, get_current_user
+from api.schemas import (
+    UpdateOrderStatusRequest,
+    OrderResponse,
+    ExchangeOrderRequest,
+    PaymentMethodSchema,
+    OrderStatusBatchRequest,
+    OrderStatusBatchResponse,
+    OrderStatusBatchItemResult,
+)
+from api.services.auth_cache import UserPrincipal
+from api.services.order_events import OrderEvent, order_events
+from api.services.order_state_machine import (
+    EXCHANGE_ORDER_TRANSITIONS,
+    EXCHANGE_ORDER_USER_CANCELLABLE,
+    NOT_FOUND,
+    VERSION_CONFLICT,
+    TransitionRejected,
+    exchange_orders,
+    publish_exchange_transition,
+)
+from api.services.rate_service import rate_service
+from api.utils.pagination import NEXT_CURSOR_HEADER, NEXT_OFFSET_HEADER, keyset_page, offset_page, split_page
 from datetime import datetime
 import logging
 
@@ -51,42 +71,53 @@ async def get_payment_methods(db: AsyncSession = Depends(get_async_db)):
 # Получение всех заявок пользователя с поддержкой сортировки и фильтрации
 @router.get("/orders", response_model=List[OrderResponse])
 async def get_user_orders(
-    db: AsyncSession = Depends(get_async_db),
-    current_user: User = Depends(get_current_user),
+    response: Response,
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: UserPrincipal = Depends(get_current_user),
     status: Optional[OrderStatus] = None,
     sort_by: Optional[str] = None,
-    order: Optional[str] = "asc"
+    order: Optional[str] = "asc",
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    offset: int = Query(0, ge=0)
 ):
     """
-    Получение всех заявок текущего пользователя с поддержкой сортировки и фильтрации.
+    Получение заявок текущего пользователя постранично с фильтрацией по статусу.
 
     :param status: OrderStatus - Фильтр по статусу заявки.
-    :param sort_by: str - Поле для сортировки (например, "created_at").
+    :param sort_by: str - Поле для сортировки (по умолчанию "created_at").
     :param order: str - Порядок сортировки ("asc" или "desc").
+    :param limit: int - Размер страницы.
+    :param cursor: str - Курсор из заголовка X-Next-Cursor предыдущей страницы (сортировка по created_at).
+    :param offset: int - Смещение из заголовка X-Next-Offset (сортировка по другим полям).
     :param db: AsyncSession - Сессия базы данных.
-    :param current_user: User - Текущий пользователь.
+    :param current_user: UserPrincipal - Текущий пользователь.
     :return: List[OrderResponse] - Список схем ответов с заявками.
     """
     try:
-        user = await get_current_user_info(db, current_user)
-        stmt = select(ExchangeOrder).options(joinedload(ExchangeOrder.payment_method)).filter(ExchangeOrder.user_id == user.id)
+        stmt = select(ExchangeOrder).options(joinedload(ExchangeOrder.payment_method)).filter(ExchangeOrder.user_id == current_user.id)
 
         if status:
             stmt = stmt.filter(ExchangeOrder.status == status)
 
-        if sort_by:
-            sort_column = getattr(ExchangeOrder, sort_by, None)
-            if sort_column is not None:
-                if order == "desc":
-                    sort_column = sort_column.desc()
-                else:
-                    sort_column = sort_column.asc()
-                stmt = stmt.order_by(sort_column)
-
-        result = await db.execute(stmt)
-        orders = result.scalars().all()
-
-        if not orders:
+        sort_column = ExchangeOrder.__table__.c.get(sort_by) if sort_by else None
+        if sort_column is None or sort_by == "created_at":
+            # Keyset-пагинация по индексу (user_id, created_at, id)
+            stmt = keyset_page(stmt, ExchangeOrder.created_at, ExchangeOrder.id, cursor, limit, descending=order == "desc")
+            result = await db.execute(stmt)
+            orders, next_cursor = split_page(result.scalars().all(), limit)
+            if next_cursor:
+                response.headers[NEXT_CURSOR_HEADER] = next_cursor
+        else:
+            # Прочие поля сортировки, как и раньше, без индекса: страницы по смещению
+            stmt = offset_page(stmt, sort_column, ExchangeOrder.id, offset, limit, descending=order == "desc")
+            result = await db.execute(stmt)
+            rows = result.scalars().all()
+            orders = rows[:limit]
+            if len(rows) > limit:
+                response.headers[NEXT_OFFSET_HEADER] = str(offset + limit)
+
+        if not orders and cursor is None and offset == 0:
             raise HTTPException(status_code=404, detail="Заявки не найдены")
 
         return jsonable_encoder(orders)
@@ -104,19 +135,18 @@ async def get_user_orders(
 async def create_exchange_order(
     order: ExchangeOrderRequest,
     db: AsyncSession = Depends(get_async_db),
-    current_user: User = Depends(get_current_user)
+    current_user: UserPrincipal = Depends(get_current_user)
 ):
     """
     Создание новой заявки на обмен валюты для текущего пользователя с учетом median_rate.
+    Если доступен стакан Garantex, курс заявки — VWAP исполнения её объёма по стакану.
     Пользователь может указать:
     - amount (количество BTC), тогда total_rub рассчитывается автоматически;
     - total_rub (сумма в рублях), тогда amount рассчитывается автоматически.
     """
     try:
-        # Шаг 1: Получаем median_rate для BTC/RUB из базы данных
-        stmt = select(ExchangeRate).where(ExchangeRate.currency == order.currency)
-        result = await db.execute(stmt)
-        exchange_rate = result.scalar_one_or_none()
+        # Шаг 1: Получаем median_rate из кэша курсов в памяти
+        exchange_rate = rate_service.get(order.currency)
 
         if not exchange_rate:
             raise HTTPException(
@@ -130,6 +160,20 @@ async def create_exchange_order(
                 status_code=500, detail=f"Median rate для {order.currency} не установлен"
             )
 
+        # Если стакан доступен, цена учитывает глубину: VWAP на объём заявки
+        order_book = rate_service.get_order_book(order.currency)
+        if order_book is not None:
+            quote = order_book.quote(
+                order.order_type.value,
+                amount=float(order.amount) if order.amount is not None else None,
+                total=float(order.total_rub) if order.total_rub is not None else None
+            )
+            if quote is None:
+                raise HTTPException(
+                    status_code=400, detail=f"Недостаточно ликвидности для заявки по {order.currency}"
+                )
+            median_rate = Decimal(str(quote.vwap)).quantize(Decimal('0.00000001'))
+
         # Шаг 2: Расчет недостающего поля (amount или total_rub) с использованием median_rate
         input_amount = order.amount
         input_total_rub = order.total_rub
@@ -180,6 +224,7 @@ async def create_exchange_order(
         db.add(new_order)
         await db.flush()
         await db.commit()
+        await order_events.publish(OrderEvent.exchange_order(new_order))
 
         logger.info(
             f"Пользователь {current_user.email} успешно создал заявку. "
@@ -209,29 +254,26 @@ async def create_exchange_order(
 
 # Отмена заявки на обмен
 @router.post("/orders/{order_id}/cancel")
-async def cancel_order(order_id: int, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
+async def cancel_order(order_id: int, db: AsyncSession = Depends(get_async_db), current_user: UserPrincipal = Depends(get_current_user)):
     """
     Отмена заявки на обмен валюты для текущего пользователя.
     """
     try:
-        user = await get_current_user_info(db, current_user)
-        stmt = select(ExchangeOrder).filter(ExchangeOrder.id == order_id, ExchangeOrder.user_id == user.id)
-        result = await db.execute(stmt)
-        order = result.scalars().first()
-
-        if not order:
-            logger.warning(f"Заявка ID {order_id} не найдена для пользователя ID {user.id}")
-            raise HTTPException(status_code=404, detail="Заявка не найдена")
-
-        if order.status in [OrderStatus.completed, OrderStatus.canceled]:
-            logger.warning(f"Попытка отмены заявки ID {order_id} с неподходящим статусом {order.status}")
-            raise HTTPException(status_code=400, detail=f"Невозможно отменить заявку со статусом {order.status}")
+        try:
+            result = await exchange_orders.transition(
+                db, order_id, OrderStatus.canceled, ExchangeOrder.user_id == current_user.id,
+                sources=EXCHANGE_ORDER_USER_CANCELLABLE
+            )
+        except TransitionRejected as rejected:
+            if rejected.reason == NOT_FOUND:
+                logger.warning(f"Заявка ID {order_id} не найдена для пользователя ID {current_user.id}")
+                raise HTTPException(status_code=404, detail="Заявка не найдена")
+            logger.warning(f"Попытка отмены заявки ID {order_id} с неподходящим статусом {rejected.current_status}")
+            raise HTTPException(status_code=400, detail=f"Невозможно отменить заявку со статусом {rejected.current_status}")
 
-        order.status = OrderStatus.canceled
-        order.updated_at = datetime.utcnow()
         await db.commit()
-        await db.refresh(order)
-        logger.info(f"Заявка ID {order_id} пользователя ID {user.id} успешно отменена")
+        await publish_exchange_transition(result)
+        logger.info(f"Заявка ID {order_id} пользователя ID {current_user.id} успешно отменена")
         return {"message": "Заявка успешно отменена", "order_id": order_id}
 
     except HTTPException as http_exc:
@@ -250,46 +292,24 @@ async def update_order_status(
 ):
     """
     Обновление статуса заявки на обмен валюты.
+    Переход выполняется одним UPDATE с проверкой текущего статуса (и версии, если она передана).
     """
+    new_status = status_request.status
     try:
-        stmt = select(ExchangeOrder).filter(ExchangeOrder.id == order_id)
-        result = await db.execute(stmt)
-        order = result.scalars().first()
-
-        if not order:
-            logger.warning(f"Заявка ID {order_id} не найдена для обновления статуса")
-            raise HTTPException(status_code=404, detail="Заявка не найдена")
-
-        allowed_transitions = {
-            OrderStatus.pending: [OrderStatus.processing, OrderStatus.canceled, OrderStatus.completed],
-            OrderStatus.processing: [OrderStatus.completed, OrderStatus.arbitrage, OrderStatus.waiting_confirmation],
-            OrderStatus.waiting_confirmation: [OrderStatus.completed, OrderStatus.arbitrage],
-            OrderStatus.completed: [OrderStatus.canceled, OrderStatus.processing, OrderStatus.pending, OrderStatus.arbitrage, OrderStatus.waiting_confirmation],
-            OrderStatus.canceled: [OrderStatus.completed, OrderStatus.processing, OrderStatus.pending, OrderStatus.arbitrage, OrderStatus.waiting_confirmation]
-        }
+        try:
+            result = await exchange_orders.transition(db, order_id, new_status, expected_version=status_request.version)
+        except TransitionRejected as rejected:
+            raise _transition_error(order_id, rejected, new_status)
 
-        current_status = order.status
-        new_status = status_request.status
-
-        if current_status in allowed_transitions:
-            if new_status not in allowed_transitions[current_status]:
-                logger.warning(
-                    f"Недопустимый переход из статуса {current_status} в {new_status} для заявки ID {order_id}"
-                )
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Недопустимый переход из статуса {current_status} в {new_status}",
-                )
-        else:
-            logger.warning(f"Изменение статуса для текущей заявки ID {order_id} невозможно")
-            raise HTTPException(status_code=400, detail="Изменение статуса для текущей заявки невозможно")
-
-        order.status = new_status
-        order.updated_at = datetime.utcnow()
         await db.commit()
-        await db.refresh(order)
+        await publish_exchange_transition(result)
         logger.info(f"Статус заявки ID {order_id} успешно обновлен на {new_status}")
-        return {"message": "Статус заявки успешно обновлен", "order_id": order_id, "new_status": order.status}
+        return {
+            "message": "Статус заявки успешно обновлен",
+            "order_id": order_id,
+            "new_status": result.order.status,
+            "version": result.order.version
+        }
 
     except HTTPException as http_exc:
         logger.error(f"Ошибка при обновлении статуса заявки ID {order_id}: {http_exc.detail}")
@@ -297,4 +317,57 @@ async def update_order_status(
     except Exception as e:
         await db.rollback()
         logger.error(f"Неизвестная ошибка при обновлении статуса заявки ID {order_id}: {e}")
-        raise HTTPException(status_code=500, detail="Внутренняя ошибка сервера")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Внутренняя ошибка сервера")
+
+
+def _transition_error(order_id: int, rejected: TransitionRejected, new_status: OrderStatus) -> HTTPException:
+    """Причина отказа машины состояний -> HTTP-ошибка с прежними текстами."""
+    if rejected.reason == NOT_FOUND:
+        logger.warning(f"Заявка ID {order_id} не найдена для обновления статуса")
+        return HTTPException(status_code=404, detail="Заявка не найдена")
+    if rejected.reason == VERSION_CONFLICT:
+        logger.warning(f"Заявка ID {order_id} изменена другим запросом")
+        return HTTPException(status_code=409, detail="Заявка была изменена, обновите данные и повторите запрос")
+    if rejected.current_status not in EXCHANGE_ORDER_TRANSITIONS:
+        logger.warning(f"Изменение статуса для текущей заявки ID {order_id} невозможно")
+        return HTTPException(status_code=400, detail="Изменение статуса для текущей заявки невозможно")
+    logger.warning(f"Недопустимый переход из статуса {rejected.current_status} в {new_status} для заявки ID {order_id}")
+    return HTTPException(
+        status_code=400,
+        detail=f"Недопустимый переход из статуса {rejected.current_status} в {new_status}",
+    )
+
+
+# Пакетное обновление статусов заявок (сверка с банковскими выписками)
+@router.post("/orders/change_status/batch", response_model=OrderStatusBatchResponse)
+async def update_order_statuses_batch(
+    batch_request: OrderStatusBatchRequest,
+    db: AsyncSession = Depends(get_async_db),
+    current_operator: UserPrincipal = Depends(get_current_operator)
+):
+    """
+    Смена статусов до ORDER_STATUS_BATCH_MAX_ITEMS заявок одним UPDATE ... FROM (VALUES ...).
+    Элемент применяется, только если заявка всё ещё в expected_status и переход допустим;
+    результат возвращается по каждому элементу, остальные элементы пакета от отказа не зависят.
+    Только для операторов: суперпользователь или роль из OPERATOR_ROLE_NAMES.
+    """
+    items = [(item.order_id, item.expected_status, item.new_status) for item in batch_request.items]
+    try:
+        results, updated_orders = await exchange_orders.transition_many(db, items)
+        await db.commit()
+        for order in updated_orders:
+            await order_events.publish(OrderEvent.exchange_order(order))
+
+        logger.info(
+            f"Пакетное обновление статусов оператором ID {current_operator.id}: "
+            f"обновлено {len(updated_orders)} из {len(items)} заявок"
+        )
+        return OrderStatusBatchResponse(
+            updated=len(updated_orders),
+            items=[OrderStatusBatchItemResult.model_validate(result) for result in results]
+        )
+
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"Неизвестная ошибка при пакетном обновлении статусов заявок: {e}")
+        raise HTTPException(status_code=500, detail="Внутренняя ошибка сервера")
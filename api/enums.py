@@ -74,4 +74,9 @@ class TraderFiatEnum(Enum):
 class TraderReqStatus(Enum):
     approve = "approve"
     check = "check"
-    delete = "deleted"
\ No newline at end of file
+    delete = "deleted"
+
+class BalanceLedgerEntryType(Enum):
+    reserve = "reserve"   # Средства заблокированы под ордер
+    settle = "settle"     # Ордер исполнен, заблокированные средства списаны
+    release = "release"   # Ордер отменён, блокировка снята
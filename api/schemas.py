@@ -5,7 +5,6 @@ from pydantic import BaseModel, EmailStr, Field, model_validator
 from api.enums import (
     OrderStatus,
     OrderTypeEnum,
-    AMLStatusEnum,
     PaymentMethodEnum,
     TraderOrderStatus,
     TraderOrderTypeEnum,
@@ -16,6 +15,7 @@ from api.enums import (
     TraderPaymentMethodEnum,
     TraderAddressStatusEnum
 )
+from constants import ORDER_STATUS_BATCH_MAX_ITEMS
 
 # -----------------------
 # Authentication Schemas
@@ -111,7 +111,7 @@ class PaymentMethodSchema(BaseModel):
 class TraderOrderResponse(BaseModel):
     id: int
     trader_id: int
-    order_type: OrderTypeEnum
+    order_type: TraderOrderTypeEnum
     currency: str
     fiat: str
     amount_currency: Decimal
@@ -122,6 +122,7 @@ class TraderOrderResponse(BaseModel):
     updated_at: datetime
     payment_method_id: int
     trader_req_id: int  # Include trader_req_id field
+    version: Optional[int] = None  # Передаётся обратно в TraderOrderUpdate.version
 
     class Config:
         from_attributes = True
@@ -133,17 +134,19 @@ class TraderOrderCreate(BaseModel):
     amount_currency: Decimal
     total_fiat: Decimal
     payment_method_id: int
-    trader_req_id: int  # Include trader_req_id field
+    trader_req_id: Optional[int] = None  # Без реквизита платформа выбирает трейдера сама
+    bank: Optional[str] = None  # Желаемый банк при автоматическом выборе
 
     class Config:
         from_attributes = True
 
 class TraderOrderUpdate(BaseModel):
     status: OrderStatus
-    aml_status: Optional[AMLStatusEnum] = None
+    version: Optional[int] = None  # Ожидаемая версия ордера; при расхождении — 409
 
     class Config:
         from_attributes = True
+        extra = "forbid"  # У ордера трейдера меняется только статус; прочие поля (в т.ч. aml_status) — 422
 
 class ExchangeOrderRequest(BaseModel):
     order_type: OrderTypeEnum
@@ -167,10 +170,32 @@ class ExchangeOrderRequest(BaseModel):
 
 class UpdateOrderStatusRequest(BaseModel):
     status: OrderStatus
+    version: Optional[int] = None  # Ожидаемая версия заявки; при расхождении — 409
+
+    class Config:
+        from_attributes = True
+
+class OrderStatusBatchItem(BaseModel):
+    order_id: int
+    expected_status: OrderStatus
+    new_status: OrderStatus
+
+class OrderStatusBatchRequest(BaseModel):
+    items: List[OrderStatusBatchItem] = Field(..., min_length=1, max_length=ORDER_STATUS_BATCH_MAX_ITEMS)
+
+class OrderStatusBatchItemResult(BaseModel):
+    order_id: int
+    result: str  # updated / status_mismatch / not_found / invalid_transition / duplicate
+    status: Optional[OrderStatus] = None
+    version: Optional[int] = None
 
     class Config:
         from_attributes = True
 
+class OrderStatusBatchResponse(BaseModel):
+    updated: int
+    items: List[OrderStatusBatchItemResult]
+
 class OrderResponse(BaseModel):
     id: int
     order_type: OrderTypeEnum
@@ -181,6 +206,7 @@ class OrderResponse(BaseModel):
     created_at: datetime
     updated_at: datetime
     payment_method: Optional[PaymentMethodSchema] = None
+    version: Optional[int] = None
 
     class Config:
         from_attributes = True
@@ -286,10 +312,26 @@ class TraderDetailedResponse(BaseModel):
     created_at: datetime
     updated_at: datetime
     balance: Optional[Decimal]
+    reserved_balance: Optional[Decimal] = None
     fiat_currency: Optional[str]
+    stats: Optional["TraderStatsResponse"] = None
 
     class Config:
         from_attributes = True
+
+class TraderStatsResponse(BaseModel):
+    orders_total: int = 0
+    orders_open: int = 0
+    orders_completed: int = 0
+    orders_canceled: int = 0
+    turnover_fiat: Decimal = Decimal("0")
+    turnover_currency: Decimal = Decimal("0")
+    success_rate: Optional[float] = None  # completed / (completed + canceled)
+
+    class Config:
+        from_attributes = True
+
+TraderDetailedResponse.model_rebuild()
         
 # -----------------------
 # Trader Address Schemas
@@ -354,6 +396,19 @@ class ExchangeRateResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class ExchangeRateBarResponse(BaseModel):
+    currency: str
+    resolution: str
+    bucket_start: datetime
+    open: Decimal
+    high: Decimal
+    low: Decimal
+    close: Decimal
+    tick_count: int
+
+    class Config:
+        from_attributes = True
+
 # -----------------------
 # Trader Method Schemas
 # -----------------------
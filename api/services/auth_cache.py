@@ -0,0 +1,137 @@
+# api/services/auth_cache.py
+
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Set, Tuple, Union
+
+from constants import AUTH_CACHE_MAX_SIZE, AUTH_CACHE_TTL_SECONDS
+
+
+@dataclass(frozen=True)
+class UserPrincipal:
+    """Лёгкий снимок пользователя, достаточный для авторизованных эндпоинтов."""
+    id: int
+    email: str
+    full_name: Optional[str]
+    role_id: int
+    is_superuser: bool
+    referral_code: Optional[str]
+    role_name: Optional[str] = None
+
+    @classmethod
+    def from_orm(cls, user: Any) -> "UserPrincipal":
+        # user.role должен быть загружен вместе с пользователем (ленивая загрузка в async-сессии недоступна)
+        return cls(
+            id=user.id,
+            email=user.email,
+            full_name=user.full_name,
+            role_id=user.role_id,
+            is_superuser=bool(user.is_superuser),
+            referral_code=user.referral_code,
+            role_name=user.role.name if user.role is not None else None
+        )
+
+
+@dataclass(frozen=True)
+class TraderPrincipal:
+    """Lightweight trader snapshot used by trader-authenticated endpoints."""
+    id: int
+    email: str
+    access: bool
+    pay_in: bool
+    pay_out: bool
+    verification_level: object
+    time_zone_id: int
+    fiat_currency_id: int
+
+    @classmethod
+    def from_orm(cls, trader: Any) -> "TraderPrincipal":
+        return cls(
+            id=trader.id,
+            email=trader.email,
+            access=bool(trader.access),
+            pay_in=bool(trader.pay_in),
+            pay_out=bool(trader.pay_out),
+            verification_level=trader.verification_level,
+            time_zone_id=trader.time_zone_id,
+            fiat_currency_id=trader.fiat_currency_id
+        )
+
+
+Principal = Union[UserPrincipal, TraderPrincipal]
+
+
+@dataclass
+class _Entry:
+    subject: str
+    principal: Principal
+    expires_at: float  # time.monotonic()
+
+
+class TokenCache:
+    """
+    TTL+LRU кэш проверенных JWT: (тип, токен) -> снимок пользователя/трейдера.
+
+    Запись живёт не дольше AUTH_CACHE_TTL_SECONDS и не дольше срока действия токена.
+    Все токены субъекта сбрасываются через invalidate() при смене пароля,
+    доступа или профиля.
+    """
+
+    def __init__(self, max_size: int = AUTH_CACHE_MAX_SIZE, ttl: float = AUTH_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple[str, str], _Entry]" = OrderedDict()
+        self._by_subject: Dict[Tuple[str, str], Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, kind: str, token: str) -> Optional[Principal]:
+        key = (kind, token)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry.principal
+
+    def put(self, kind: str, token: str, subject: str, principal: Principal, token_exp: Optional[float] = None) -> None:
+        ttl = self.ttl
+        if token_exp is not None:
+            ttl = min(ttl, token_exp - time.time())
+            if ttl <= 0:
+                return
+
+        key = (kind, token)
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = _Entry(subject, principal, time.monotonic() + ttl)
+        self._by_subject.setdefault((kind, subject), set()).add(token)
+
+        while len(self._entries) > self.max_size:
+            self._remove(next(iter(self._entries)))
+
+    def invalidate(self, kind: str, subject: str) -> None:
+        for token in self._by_subject.pop((kind, subject), set()):
+            self._entries.pop((kind, token), None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._by_subject.clear()
+
+    def _remove(self, key: Tuple[str, str]) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        tokens = self._by_subject.get((key[0], entry.subject))
+        if tokens is not None:
+            tokens.discard(key[1])
+            if not tokens:
+                del self._by_subject[(key[0], entry.subject)]
+
+
+# Общий кэш токенов процесса
+token_cache = TokenCache()
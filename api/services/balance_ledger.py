@@ -0,0 +1,136 @@
+# api/services/balance_ledger.py
+
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, Optional
+
+from sqlalchemy import Exists, cast, exists, insert, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.sql.dml import ReturningInsert
+
+from api.enums import BalanceLedgerEntryType, OrderStatus, TraderOrderTypeEnum
+from database.init_db import BalanceLedgerEntry, BalanceTrader, FiatCurrencyTrader
+
+# Ордера, под которые блокируются средства трейдера (трейдер выплачивает фиат)
+RESERVING_ORDER_TYPES = frozenset({TraderOrderTypeEnum.pay_out})
+
+_CLOSING_ENTRIES = [BalanceLedgerEntryType.settle, BalanceLedgerEntryType.release]
+
+
+@dataclass(frozen=True)
+class BalanceChange:
+    """Состояние баланса после записи в журнал."""
+    trader_id: int
+    fiat: str
+    balance: Decimal
+    reserved: Decimal
+
+    @property
+    def available(self) -> Decimal:
+        return self.balance - self.reserved
+
+
+def _fiat_name(order: Any) -> str:
+    return order.fiat.value if hasattr(order.fiat, "value") else str(order.fiat)
+
+
+def _ledger_statement(order: Any, entry_type: BalanceLedgerEntryType, values: Dict[str, Any],
+                      *conditions: Any) -> ReturningInsert[Decimal, Decimal]:
+    """
+    Один запрос: условный UPDATE строки баланса в CTE и запись в журнал из его RETURNING.
+    Если условие не выполнено, UPDATE не затрагивает строк и журнал не пополняется.
+    """
+    columns = BalanceLedgerEntry.__table__.c
+    fiat_id = (
+        select(FiatCurrencyTrader.id)
+        .where(FiatCurrencyTrader.currency_name == _fiat_name(order))
+        .scalar_subquery()
+    )
+    changed = (
+        update(BalanceTrader)
+        .where(BalanceTrader.trader_id == order.trader_id, BalanceTrader.fiat == fiat_id, *conditions)
+        .values(**values)
+        .returning(BalanceTrader.trader_id, BalanceTrader.fiat, BalanceTrader.balance, BalanceTrader.reserved)
+        .cte("balance_change")
+    )
+    entry = select(
+        changed.c.trader_id,
+        changed.c.fiat,
+        cast(order.id, columns.order_id.type),
+        cast(entry_type, columns.entry_type.type),
+        cast(order.total_fiat, columns.amount.type),
+        changed.c.balance,
+        changed.c.reserved,
+        cast(datetime.utcnow(), columns.created_at.type),
+    )
+    return (
+        insert(BalanceLedgerEntry)
+        .add_cte(changed)
+        .from_select(
+            ["trader_id", "fiat", "order_id", "entry_type", "amount", "balance_after", "reserved_after", "created_at"],
+            entry
+        )
+        .returning(BalanceLedgerEntry.balance_after, BalanceLedgerEntry.reserved_after)
+    )
+
+
+def _has_entry(order_id: int, *entry_types: BalanceLedgerEntryType) -> Exists:
+    return exists().where(BalanceLedgerEntry.order_id == order_id, BalanceLedgerEntry.entry_type.in_(entry_types))
+
+
+async def _apply(db: AsyncSession, order: Any, statement: ReturningInsert[Decimal, Decimal]) -> Optional[BalanceChange]:
+    row = (await db.execute(statement)).first()
+    if row is None:
+        return None
+    return BalanceChange(order.trader_id, _fiat_name(order), row.balance_after, row.reserved_after)
+
+
+async def reserve_for_order(db: AsyncSession, order: Any) -> Optional[BalanceChange]:
+    """
+    Блокирует total_fiat ордера: reserved += amount при balance - reserved >= amount.
+    None — средств недостаточно (или нет строки баланса). Коммит — на вызывающей стороне.
+    """
+    amount = order.total_fiat
+    return await _apply(db, order, _ledger_statement(
+        order,
+        BalanceLedgerEntryType.reserve,
+        {"reserved": BalanceTrader.reserved + amount},
+        BalanceTrader.balance - BalanceTrader.reserved >= amount,
+    ))
+
+
+async def settle_order(db: AsyncSession, order: Any) -> Optional[BalanceChange]:
+    """Ордер исполнен: заблокированная сумма списывается с баланса. Повторный вызов ничего не меняет."""
+    amount = order.total_fiat
+    return await _apply(db, order, _ledger_statement(
+        order,
+        BalanceLedgerEntryType.settle,
+        {"balance": BalanceTrader.balance - amount, "reserved": BalanceTrader.reserved - amount},
+        _has_entry(order.id, BalanceLedgerEntryType.reserve),
+        ~_has_entry(order.id, *_CLOSING_ENTRIES),
+    ))
+
+
+async def release_order(db: AsyncSession, order: Any) -> Optional[BalanceChange]:
+    """Ордер отменён или удалён: блокировка снимается. Повторный вызов ничего не меняет."""
+    amount = order.total_fiat
+    return await _apply(db, order, _ledger_statement(
+        order,
+        BalanceLedgerEntryType.release,
+        {"reserved": BalanceTrader.reserved - amount},
+        _has_entry(order.id, BalanceLedgerEntryType.reserve),
+        ~_has_entry(order.id, *_CLOSING_ENTRIES),
+    ))
+
+
+async def apply_order_status(db: AsyncSession, order: Any) -> Optional[BalanceChange]:
+    """Движение баланса по текущему статусу ордера: completed — списание, canceled — снятие блокировки."""
+    if order.order_type not in RESERVING_ORDER_TYPES:
+        return None
+    if order.status == OrderStatus.completed:
+        return await settle_order(db, order)
+    if order.status == OrderStatus.canceled:
+        return await release_order(db, order)
+    return None
@@ -0,0 +1,78 @@
+# api/services/leader_lock.py
+
+import asyncio
+import logging
+from typing import Optional
+
+import asyncpg
+
+from api.services.order_events_pg import _asyncpg_dsn
+from config.logging_config import setup_logging
+from config.settings import settings
+from constants import RATES_LEADER_LOCK_KEY
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+
+class AdvisoryLeaderLock:
+    """
+    Выбор одного процесса-ведущего среди воркеров через pg_try_advisory_lock.
+
+    Сессионная блокировка держится на отдельном соединении asyncpg (не из пула):
+    пока соединение живо, процесс остаётся ведущим; при его обрыве блокировку
+    снимает сама база, и её захватывает следующий воркер при очередной попытке.
+    За pgbouncer в режиме transaction сессионные блокировки не работают —
+    нужен прямой DSN.
+    """
+
+    def __init__(self, key: int, dsn: Optional[str] = None):
+        self.key = key
+        self.dsn = dsn or _asyncpg_dsn(settings.database_url)
+        self._conn: Optional[asyncpg.Connection] = None
+        self._held = False
+        # Одно соединение asyncpg не выполняет запросы параллельно
+        self._lock = asyncio.Lock()
+
+    @property
+    def is_leader(self) -> bool:
+        return self._held
+
+    async def try_acquire(self) -> bool:
+        """True, если процесс ведущий: блокировка уже удерживается или захвачена сейчас."""
+        async with self._lock:
+            try:
+                if self._conn is None or self._conn.is_closed():
+                    self._held = False
+                    self._conn = await asyncpg.connect(self.dsn)
+                if self._held:
+                    await self._conn.fetchval("SELECT 1")  # Блокировка жива, пока живо соединение
+                else:
+                    self._held = bool(await self._conn.fetchval("SELECT pg_try_advisory_lock($1)", self.key))
+                    if self._held:
+                        logger.info(f"Процесс стал ведущим (advisory lock {self.key})")
+            except Exception as e:
+                if self._held:
+                    logger.warning(f"Потеряна блокировка ведущего {self.key}: {e}")
+                else:
+                    logger.error(f"Не удалось проверить блокировку ведущего {self.key}: {e}")
+                await self._close()
+            return self._held
+
+    async def close(self) -> None:
+        """Закрывает соединение; база снимает блокировку вместе с сессией."""
+        async with self._lock:
+            await self._close()
+
+    async def _close(self) -> None:
+        conn, self._conn = self._conn, None
+        self._held = False
+        if conn is not None and not conn.is_closed():
+            try:
+                await conn.close()
+            except Exception:
+                conn.terminate()
+
+
+# Ведущий для обновления курсов с Garantex и агрегации их истории
+rates_leader = AdvisoryLeaderLock(RATES_LEADER_LOCK_KEY)
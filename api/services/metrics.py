@@ -0,0 +1,182 @@
+# api/services/metrics.py
+
+import bisect
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from sqlalchemy import Engine, event
+from sqlalchemy.engine.interfaces import DBAPICursor
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+# Границы гистограммы длительности запроса, в секундах
+LATENCY_BUCKETS: List[float] = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+# Метка для запросов, не совпавших ни с одним маршрутом (иначе сырые URL раздуют число серий)
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+class QueryStats:
+    """Число SQL-запросов и суммарное время в БД в рамках одного HTTP-запроса."""
+
+    __slots__ = ("statements", "seconds")
+
+    def __init__(self) -> None:
+        self.statements = 0
+        self.seconds = 0.0
+
+
+# Счётчики текущего HTTP-запроса; выставляются middleware в server.py.
+# Контекст доходит до событий движка через greenlet_spawn.
+query_stats_var: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def _before_cursor_execute(conn: Any, cursor: DBAPICursor, statement: str, parameters: Any,
+                           context: Any, executemany: bool) -> None:
+    if context is not None and query_stats_var.get() is not None:
+        context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn: Any, cursor: DBAPICursor, statement: str, parameters: Any,
+                          context: Any, executemany: bool) -> None:
+    stats = query_stats_var.get()
+    started = getattr(context, "_metrics_started", None)
+    if stats is not None and started is not None:
+        stats.statements += 1
+        stats.seconds += time.perf_counter() - started
+
+
+def instrument_engine(engine: Union[AsyncEngine, Engine]) -> None:
+    """Подключает подсчёт SQL-запросов к движку (AsyncEngine или Engine). Повторный вызов безопасен."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    if not event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class Histogram:
+    """Гистограмма с фиксированными границами; счётчики по корзинам не накопительные."""
+
+    __slots__ = ("buckets", "counts", "count", "sum")
+
+    def __init__(self, buckets: List[float]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """Пары (le, накопленное число) для экспозиции, последняя — +Inf."""
+        result, total = [], 0
+        for bound, count in zip([_format_value(b) for b in self.buckets] + ["+Inf"], self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+def status_class(status: int) -> str:
+    return f"{status // 100}xx"
+
+
+class RequestMetrics:
+    """
+    Метрики HTTP-запросов процесса по шаблону маршрута (не по сырому URL):
+    число запросов по классам статуса, гистограмма длительности,
+    число SQL-запросов и время в БД.
+    """
+
+    def __init__(self, buckets: Optional[List[float]] = None) -> None:
+        self.buckets = buckets or LATENCY_BUCKETS
+        self.requests: Dict[Tuple[str, str, str], int] = {}
+        self.latency: Dict[Tuple[str, str], Histogram] = {}
+        self.db_statements: Dict[Tuple[str, str], int] = {}
+        self.db_seconds: Dict[Tuple[str, str], float] = {}
+
+    def observe(self, method: str, route: str, status: int, seconds: float,
+                queries: Optional[QueryStats] = None) -> None:
+        key = (method, route)
+        status_key = (method, route, status_class(status))
+        self.requests[status_key] = self.requests.get(status_key, 0) + 1
+
+        histogram = self.latency.get(key)
+        if histogram is None:
+            histogram = self.latency[key] = Histogram(self.buckets)
+        histogram.observe(seconds)
+
+        if queries is not None:
+            self.db_statements[key] = self.db_statements.get(key, 0) + queries.statements
+            self.db_seconds[key] = self.db_seconds.get(key, 0.0) + queries.seconds
+
+    def render(self) -> str:
+        lines: List[str] = []
+
+        lines += _header("http_requests_total", "counter", "HTTP requests by route template and status class.")
+        for (method, route, status), value in sorted(self.requests.items()):
+            lines.append(_sample("http_requests_total", {"method": method, "route": route, "status": status}, value))
+
+        lines += _header("http_request_duration_seconds", "histogram", "HTTP request latency by route template.")
+        for (method, route), histogram in sorted(self.latency.items()):
+            labels = {"method": method, "route": route}
+            for bound, count in histogram.cumulative():
+                lines.append(_sample("http_request_duration_seconds_bucket", {**labels, "le": bound}, count))
+            lines.append(_sample("http_request_duration_seconds_sum", labels, histogram.sum))
+            lines.append(_sample("http_request_duration_seconds_count", labels, histogram.count))
+
+        lines += _header("http_request_db_statements_total", "counter", "SQL statements executed while serving requests.")
+        for (method, route), value in sorted(self.db_statements.items()):
+            lines.append(_sample("http_request_db_statements_total", {"method": method, "route": route}, value))
+
+        lines += _header("http_request_db_seconds_total", "counter", "Time spent in the database while serving requests.")
+        for (method, route), seconds in sorted(self.db_seconds.items()):
+            lines.append(_sample("http_request_db_seconds_total", {"method": method, "route": route}, seconds))
+
+        return "\n".join(lines) + "\n"
+
+
+def render_gauges(prefix: str, series: List[Tuple[Dict[str, str], Dict[str, Any]]], help_text: str = "") -> str:
+    """
+    Числовые поля словарей stats как gauge-метрики <prefix>_<поле>.
+    series — пары (метки, stats), например по движкам primary/replica; вложенные словари пропускаются.
+    """
+    samples: Dict[str, List[str]] = {}
+    for labels, stats in series:
+        for name, value in stats.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            metric = f"{prefix}_{name}"
+            samples.setdefault(metric, []).append(_sample(metric, labels, value))
+    lines: List[str] = []
+    for metric, metric_samples in samples.items():
+        lines += _header(metric, "gauge", help_text)
+        lines += metric_samples
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+def _header(name: str, kind: str, help_text: str) -> Iterable[str]:
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+def _sample(name: str, labels: Dict[str, str], value: float) -> str:
+    if labels:
+        rendered = ",".join(f'{key}="{_escape(str(val))}"' for key, val in labels.items())
+        return f"{name}{{{rendered}}} {_format_value(value)}"
+    return f"{name} {_format_value(value)}"
+
+
+# Метрики HTTP-запросов процесса
+request_metrics = RequestMetrics()
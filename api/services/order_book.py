@@ -0,0 +1,112 @@
+# api/services/order_book.py
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class FillQuote:
+    """Результат исполнения заявки по стакану."""
+    amount: float        # Объём в криптовалюте
+    total: float         # Сумма в рублях
+    vwap: float          # Средневзвешенная цена исполнения
+    worst_price: float   # Цена последнего задействованного уровня
+    levels: int          # Сколько уровней стакана задействовано
+
+
+class OrderBookSide:
+    """
+    Одна сторона стакана в порядке исполнения (asks по возрастанию, bids по убыванию цены).
+    Хранит накопленные объём и сумму, поэтому котировка на любой объём
+    считается бинарным поиском за O(log n).
+    """
+
+    def __init__(self, prices: np.ndarray, volumes: np.ndarray):
+        self.prices = prices
+        self.volumes = volumes
+        self.cum_volume = np.cumsum(volumes)
+        self.cum_notional = np.cumsum(prices * volumes)
+
+    @classmethod
+    def from_levels(cls, levels: List[Dict[str, Any]], descending: bool) -> "OrderBookSide":
+        prices = np.array([float(level["price"]) for level in levels], dtype=np.float64)
+        volumes = np.array([float(level["volume"]) for level in levels], dtype=np.float64)
+        order = np.argsort(-prices if descending else prices, kind="stable")
+        return cls(prices[order], volumes[order])
+
+    def to_levels(self) -> List[Dict[str, float]]:
+        """Уровни в формате Garantex (для хранения снимка в базе)."""
+        return [{"price": float(p), "volume": float(v)} for p, v in zip(self.prices, self.volumes)]
+
+    @property
+    def depth(self) -> float:
+        """Суммарный объём стороны стакана."""
+        return float(self.cum_volume[-1]) if len(self.cum_volume) else 0.0
+
+    def _quote(self, target: float, by_total: bool) -> Optional[FillQuote]:
+        if target <= 0:
+            return None
+        cumulative = self.cum_notional if by_total else self.cum_volume
+        i = int(np.searchsorted(cumulative, target, side="left"))
+        if i >= len(cumulative):
+            return None  # Недостаточно ликвидности
+
+        prev_volume = self.cum_volume[i - 1] if i else 0.0
+        prev_notional = self.cum_notional[i - 1] if i else 0.0
+        price = self.prices[i]
+        if by_total:
+            total = target
+            amount = prev_volume + (target - prev_notional) / price
+        else:
+            amount = target
+            total = prev_notional + (target - prev_volume) * price
+
+        return FillQuote(
+            amount=float(amount),
+            total=float(total),
+            vwap=float(total / amount),
+            worst_price=float(price),
+            levels=i + 1
+        )
+
+    def quote_amount(self, amount: float) -> Optional[FillQuote]:
+        """Котировка на покупку/продажу заданного объёма криптовалюты."""
+        return self._quote(amount, by_total=False)
+
+    def quote_total(self, total: float) -> Optional[FillQuote]:
+        """Котировка на заданную сумму в рублях."""
+        return self._quote(total, by_total=True)
+
+
+@dataclass(frozen=True)
+class OrderBookSnapshot:
+    """Снимок стакана Garantex, разобранный один раз при получении."""
+    asks: OrderBookSide
+    bids: OrderBookSide
+    timestamp: Optional[int] = None
+
+    @classmethod
+    def from_depth(cls, data: Dict[str, Any]) -> "OrderBookSnapshot":
+        return cls(
+            asks=OrderBookSide.from_levels(data.get("asks") or [], descending=False),
+            bids=OrderBookSide.from_levels(data.get("bids") or [], descending=True),
+            timestamp=data.get("timestamp")
+        )
+
+    def to_depth(self) -> Dict[str, Any]:
+        """Обратное from_depth: снимок в виде JSON-совместимого словаря."""
+        return {"asks": self.asks.to_levels(), "bids": self.bids.to_levels(), "timestamp": self.timestamp}
+
+    def side_for(self, order_type: str) -> OrderBookSide:
+        """Покупка исполняется по asks, продажа — по bids."""
+        return self.asks if order_type == "buy" else self.bids
+
+    def quote(self, order_type: str, amount: Optional[float] = None, total: Optional[float] = None) -> Optional[FillQuote]:
+        side = self.side_for(order_type)
+        if amount is not None:
+            return side.quote_amount(amount)
+        if total is not None:
+            return side.quote_total(total)
+        return None
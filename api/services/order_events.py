@@ -0,0 +1,177 @@
+# api/services/order_events.py
+
+import asyncio
+import json
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Protocol
+
+from fastapi.encoders import jsonable_encoder
+
+from api.schemas import OrderResponse, TraderOrderResponse
+from config.logging_config import setup_logging
+from config.settings import settings
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Виды заявок, для которых публикуются события
+TRADER_ORDER = "trader_order"
+EXCHANGE_ORDER = "exchange_order"
+
+# Действия над заявкой
+UPSERT = "upsert"
+DELETE = "delete"
+
+
+@dataclass(frozen=True)
+class OrderEvent:
+    """Изменение одной заявки, публикуется после коммита."""
+    kind: str
+    action: str
+    order_id: int
+    owner_id: int  # trader_id для TRADER_ORDER, user_id для EXCHANGE_ORDER
+    status: Optional[str] = None
+    version: Optional[str] = None  # updated_at заявки в ISO-формате
+    data: Optional[Dict[str, Any]] = None  # сериализованная заявка (для UPSERT)
+
+    def to_payload(self) -> str:
+        """Компактная форма для NOTIFY — без данных заявки (лимит payload 8000 байт)."""
+        return json.dumps(
+            {"k": self.kind, "a": self.action, "id": self.order_id, "o": self.owner_id, "s": self.status, "v": self.version},
+            separators=(",", ":")
+        )
+
+    @classmethod
+    def from_payload(cls, payload: str) -> "OrderEvent":
+        raw = json.loads(payload)
+        return cls(kind=raw["k"], action=raw["a"], order_id=raw["id"], owner_id=raw["o"], status=raw.get("s"), version=raw.get("v"))
+
+    @classmethod
+    def trader_order(cls, order: Any, action: str = UPSERT) -> "OrderEvent":
+        return cls(
+            kind=TRADER_ORDER,
+            action=action,
+            order_id=order.id,
+            owner_id=order.trader_id,
+            status=order.status.value,
+            version=order.updated_at.isoformat() if order.updated_at else None,
+            data=jsonable_encoder(TraderOrderResponse.model_validate(order)) if action == UPSERT else None
+        )
+
+    @classmethod
+    def exchange_order(cls, order: Any, action: str = UPSERT) -> "OrderEvent":
+        return cls(
+            kind=EXCHANGE_ORDER,
+            action=action,
+            order_id=order.id,
+            owner_id=order.user_id,
+            status=order.status.value,
+            version=order.updated_at.isoformat() if order.updated_at else None,
+            data=jsonable_encoder(_exchange_order_response(order)) if action == UPSERT else None
+        )
+
+
+def _exchange_order_response(order: Any) -> OrderResponse:
+    # Связь payment_method не трогаем: ленивая загрузка в async-сессии недоступна
+    return OrderResponse(
+        id=order.id,
+        order_type=order.order_type,
+        currency=order.currency,
+        amount=order.amount,
+        total_rub=order.total_rub,
+        status=order.status,
+        created_at=order.created_at,
+        updated_at=order.updated_at
+    )
+
+
+Subscriber = Callable[[OrderEvent], Awaitable[None]]
+
+
+class OrderEventBackend(Protocol):
+    """Способ доставки событий: InProcessBackend или PostgresNotifyBackend."""
+
+    async def start(self, deliver: Subscriber) -> None: ...
+
+    async def stop(self) -> None: ...
+
+    async def publish(self, event: OrderEvent) -> None: ...
+
+
+class InProcessBackend:
+    """Доставка событий подписчикам того же процесса (один узел, один процесс)."""
+
+    def __init__(self) -> None:
+        self._deliver: Optional[Subscriber] = None
+
+    async def start(self, deliver: Subscriber) -> None:
+        self._deliver = deliver
+
+    async def stop(self) -> None:
+        self._deliver = None
+
+    async def publish(self, event: OrderEvent) -> None:
+        if self._deliver is not None:
+            await self._deliver(event)
+
+
+class OrderEventBus:
+    """
+    Шина событий заявок. Эндпоинты публикуют изменения после коммита,
+    подписчики (например, WebSocket-менеджер) получают их без опроса БД.
+    Способ доставки определяется backend'ом.
+    """
+
+    def __init__(self, backend: Optional[OrderEventBackend] = None) -> None:
+        self.backend: OrderEventBackend = backend or InProcessBackend()
+        self._subscribers: List[Subscriber] = []
+        self._started = False
+
+    def subscribe(self, callback: Subscriber) -> None:
+        if callback not in self._subscribers:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback: Subscriber) -> None:
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    async def start(self) -> None:
+        if not self._started:
+            await self.backend.start(self._dispatch)
+            self._started = True
+
+    async def stop(self) -> None:
+        if self._started:
+            await self.backend.stop()
+            self._started = False
+
+    async def publish(self, event: OrderEvent) -> None:
+        """Публикация не должна ломать уже закоммиченный запрос — ошибки только логируются."""
+        try:
+            if not self._started:
+                await self.start()
+            await self.backend.publish(event)
+        except Exception as e:
+            logger.error(f"Ошибка публикации события {event.kind}:{event.order_id}: {e}")
+
+    async def _dispatch(self, event: OrderEvent) -> None:
+        results = await asyncio.gather(
+            *(callback(event) for callback in list(self._subscribers)), return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"Ошибка подписчика на событие {event.kind}:{event.order_id}: {result}")
+
+
+def create_backend(name: str) -> OrderEventBackend:
+    if name == "postgres":
+        from api.services.order_events_pg import PostgresNotifyBackend
+        return PostgresNotifyBackend()
+    if name == "inprocess":
+        return InProcessBackend()
+    raise ValueError(f"Неизвестный backend событий ордеров: {name}")
+
+
+# Общая шина событий процесса
+order_events = OrderEventBus(create_backend(settings.order_events_backend))
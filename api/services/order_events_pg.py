@@ -0,0 +1,109 @@
+# api/services/order_events_pg.py
+
+import asyncio
+import logging
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Optional
+
+import asyncpg
+from sqlalchemy import text
+
+from config.logging_config import setup_logging
+from config.settings import settings
+from constants import ORDER_EVENTS_CHANNEL, ORDER_EVENTS_RECONNECT_MAX_SECONDS
+from database.init_db import engine
+
+if TYPE_CHECKING:
+    from api.services.order_events import OrderEvent
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+
+def _asyncpg_dsn(url: str) -> str:
+    """DSN для asyncpg из URL SQLAlchemy (postgresql+asyncpg://... -> postgresql://...)."""
+    return url.replace("postgresql+asyncpg://", "postgresql://", 1)
+
+
+class PostgresNotifyBackend:
+    """
+    Доставка событий ордеров между процессами через LISTEN/NOTIFY.
+
+    Публикация — pg_notify через общий пул. Приём — отдельное соединение
+    asyncpg с add_listener; при обрыве оно переподключается с нарастающей паузой.
+    Каждый процесс получает и собственные события, поэтому локальной доставки нет.
+    """
+
+    def __init__(self, dsn: Optional[str] = None, channel: str = ORDER_EVENTS_CHANNEL):
+        self.dsn = dsn or _asyncpg_dsn(settings.database_url)
+        self.channel = channel
+        self._deliver: Optional[Callable[["OrderEvent"], Awaitable[None]]] = None
+        self._conn: Optional[asyncpg.Connection] = None
+        self._task: Optional["asyncio.Task[None]"] = None
+        self._lost: Optional[asyncio.Event] = None
+
+    async def start(self, deliver: Callable[["OrderEvent"], Awaitable[None]]) -> None:
+        self._deliver = deliver
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._close()
+        self._deliver = None
+
+    async def publish(self, event: "OrderEvent") -> None:
+        async with engine.connect() as conn:
+            await conn.execute(
+                text("SELECT pg_notify(:channel, :payload)"),
+                {"channel": self.channel, "payload": event.to_payload()}
+            )
+            await conn.commit()
+
+    def _on_notification(self, connection: Any, pid: int, channel: str, payload: str) -> None:
+        from api.services.order_events import OrderEvent
+
+        try:
+            event = OrderEvent.from_payload(payload)
+        except Exception as e:
+            logger.error(f"Некорректное уведомление в канале {channel}: {e}")
+            return
+        if self._deliver is not None:
+            asyncio.ensure_future(self._deliver(event))
+
+    def _on_termination(self, connection: Any) -> None:
+        if self._lost is not None:
+            self._lost.set()
+
+    async def _listen_forever(self) -> None:
+        delay = 1.0
+        while True:
+            try:
+                self._lost = asyncio.Event()
+                self._conn = await asyncpg.connect(self.dsn)
+                self._conn.add_termination_listener(self._on_termination)
+                await self._conn.add_listener(self.channel, self._on_notification)
+                logger.info(f"Подписка на канал {self.channel} установлена")
+                delay = 1.0
+                await self._lost.wait()
+                logger.warning(f"Соединение LISTEN {self.channel} потеряно, переподключение")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка подписки на канал {self.channel}: {e}")
+            await self._close()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, ORDER_EVENTS_RECONNECT_MAX_SECONDS)
+
+    async def _close(self) -> None:
+        conn, self._conn = self._conn, None
+        if conn is not None and not conn.is_closed():
+            try:
+                await conn.close()
+            except Exception:
+                conn.terminate()
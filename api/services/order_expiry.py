@@ -0,0 +1,162 @@
+# api/services/order_expiry.py
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, FrozenSet, List, Optional
+
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.sql.dml import ReturningUpdate
+
+from api.enums import OrderStatus
+from api.services.order_state_machine import (
+    OrderStateMachine,
+    Transition,
+    apply_trader_side_effects,
+    exchange_orders,
+    publish_exchange_transition,
+    publish_trader_transition,
+    trader_orders,
+)
+from config.logging_config import setup_logging
+from config.settings import settings
+from constants import ORDER_EXPIRY_BATCH_SIZE, ORDER_EXPIRY_INTERVAL_SECONDS, ORDER_EXPIRY_MAX_BATCHES
+from database.init_db import AsyncSessionLocal
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Статусы, в которых заявка может истечь; совпадают с условием частичных индексов ix_*_open_status_created
+EXPIRABLE_STATUSES = frozenset({OrderStatus.pending, OrderStatus.processing})
+
+
+@dataclass
+class ExpiryRule:
+    """Вид заявок, которые истекают: машина состояний, TTL и побочные эффекты отмены."""
+    name: str
+    machine: OrderStateMachine
+    ttl_seconds: float
+    publish: Callable[[Transition], Awaitable[None]]
+    side_effects: Optional[Callable[[AsyncSession, Transition], Awaitable[None]]] = None
+
+    @property
+    def statuses(self) -> FrozenSet[OrderStatus]:
+        # Отмена только там, где её допускает таблица переходов
+        return EXPIRABLE_STATUSES & self.machine.sources[OrderStatus.canceled]
+
+
+def expire_statement(rule: ExpiryRule, due_before: datetime, limit: int) -> "ReturningUpdate[Any]":
+    """
+    Отмена одной пачки просроченных заявок одним запросом:
+
+        UPDATE t SET status = 'canceled', version = version + 1, updated_at = :now
+        FROM (SELECT id, status FROM t WHERE status IN (...) AND created_at < :due
+              ORDER BY created_at LIMIT :n FOR UPDATE SKIP LOCKED) AS due
+        WHERE t.id = due.id AND t.status IN (...)
+        RETURNING t.*, due.status
+
+    SKIP LOCKED: строки, которые держит другой сборщик или эндпоинт, пропускаются без ожидания.
+    """
+    model = rule.machine.model
+    statuses = list(rule.statuses)
+    due = (
+        select(model.id, model.status.label("old_status"))
+        .where(model.status.in_(statuses), model.created_at < due_before)
+        .order_by(model.created_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .subquery("due")
+    )
+    return (
+        update(model)
+        .where(model.id == due.c.id, model.status.in_(statuses))
+        .values(status=OrderStatus.canceled, version=model.version + 1, updated_at=datetime.utcnow())
+        .returning(model, due.c.old_status)
+        .execution_options(synchronize_session=False, populate_existing=True)
+    )
+
+
+class OrderExpirySweeper:
+    """
+    Фоновая отмена заявок, зависших в pending/processing дольше TTL своего вида.
+    Каждая пачка — отдельная короткая транзакция, поэтому несколько сборщиков
+    (процессы приложения и order_expiry_worker.py) работают параллельно без долгих блокировок.
+    """
+
+    def __init__(
+        self,
+        rules: List[ExpiryRule],
+        interval: float = ORDER_EXPIRY_INTERVAL_SECONDS,
+        batch_size: int = ORDER_EXPIRY_BATCH_SIZE,
+        max_batches: int = ORDER_EXPIRY_MAX_BATCHES,
+    ):
+        self.rules = [rule for rule in rules if rule.ttl_seconds > 0]
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    async def expire_batch(self, db: AsyncSession, rule: ExpiryRule) -> int:
+        due_before = datetime.utcnow() - timedelta(seconds=rule.ttl_seconds)
+        rows = (await db.execute(expire_statement(rule, due_before, self.batch_size))).all()
+        transitions = [Transition(order=row[0], old_status=row.old_status) for row in rows]
+        if rule.side_effects is not None:
+            for transition in transitions:
+                await rule.side_effects(db, transition)
+        await db.commit()
+        for transition in transitions:
+            await rule.publish(transition)
+        return len(transitions)
+
+    async def sweep(self) -> int:
+        """Один проход по всем видам заявок; возвращает число отменённых."""
+        total = 0
+        for rule in self.rules:
+            expired = 0
+            for _ in range(self.max_batches):
+                async with AsyncSessionLocal() as db:
+                    count = await self.expire_batch(db, rule)
+                expired += count
+                if count < self.batch_size:
+                    break
+            if expired:
+                logger.info(f"Истёк срок {expired} заявок ({rule.name}), статус изменён на canceled")
+            total += expired
+        return total
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.sweep()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка отмены истёкших заявок: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def start(self) -> None:
+        if self._task is None and self.rules:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+# Общий экземпляр сборщика
+order_expiry = OrderExpirySweeper([
+    ExpiryRule("exchange_orders", exchange_orders, settings.exchange_order_ttl_seconds, publish_exchange_transition),
+    ExpiryRule(
+        "trader_orders", trader_orders, settings.trader_order_ttl_seconds, publish_trader_transition,
+        side_effects=apply_trader_side_effects
+    ),
+])
@@ -0,0 +1,280 @@
+# api/services/order_state_machine.py
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, FrozenSet, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from sqlalchemy import ColumnElement, Integer, column, update, values
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.sql.dml import ReturningUpdate
+
+from api.enums import OrderStatus
+from api.services.balance_ledger import BalanceChange, apply_order_status
+from api.services.order_events import OrderEvent, order_events
+from api.services.trader_routing import trader_routing
+from api.services.trader_stats import record_status_change
+from database.init_db import ExchangeOrder, TraderOrder
+
+S = OrderStatus
+
+# Допустимые переходы заявок пользователей (прежняя таблица из user_orders_routers.py)
+EXCHANGE_ORDER_TRANSITIONS: Mapping[OrderStatus, FrozenSet[OrderStatus]] = {
+    S.pending: frozenset({S.processing, S.canceled, S.completed}),
+    S.processing: frozenset({S.completed, S.arbitrage, S.waiting_confirmation}),
+    S.waiting_confirmation: frozenset({S.completed, S.arbitrage}),
+    S.completed: frozenset({S.canceled, S.processing, S.pending, S.arbitrage, S.waiting_confirmation}),
+    S.canceled: frozenset({S.completed, S.processing, S.pending, S.arbitrage, S.waiting_confirmation}),
+}
+
+# Отмена заявки самим пользователем — из любого незавершённого статуса
+EXCHANGE_ORDER_USER_CANCELLABLE: FrozenSet[OrderStatus] = frozenset(set(S) - {S.completed, S.canceled})
+
+# Ордера трейдеров: completed и canceled — конечные (по ним уже списан или освобождён баланс)
+TRADER_ORDER_TRANSITIONS: Mapping[OrderStatus, FrozenSet[OrderStatus]] = {
+    S.pending: frozenset({S.processing, S.canceled}),
+    S.processing: frozenset({S.waiting_confirmation, S.completed, S.arbitrage, S.canceled}),
+    S.waiting_confirmation: frozenset({S.completed, S.arbitrage, S.canceled}),
+    S.arbitrage: frozenset({S.completed, S.canceled}),
+    S.completed: frozenset(),
+    S.canceled: frozenset(),
+}
+
+# Причины отказа в переходе
+NOT_FOUND = "not_found"
+VERSION_CONFLICT = "version_conflict"
+INVALID_TRANSITION = "invalid_transition"
+
+# Результаты элементов пакетного перехода (вместе с NOT_FOUND и INVALID_TRANSITION)
+UPDATED = "updated"
+DUPLICATE = "duplicate"
+STATUS_MISMATCH = "status_mismatch"
+
+# (order_id, expected_status, new_status)
+BatchItem = Tuple[int, OrderStatus, OrderStatus]
+
+
+class TransitionRejected(Exception):
+    """Переход не выполнен; эндпоинт превращает причину в HTTP-ответ."""
+
+    def __init__(self, reason: str, current_status: Optional[OrderStatus] = None):
+        super().__init__(reason)
+        self.reason = reason
+        self.current_status = current_status
+
+
+@dataclass
+class Transition:
+    order: Any
+    old_status: OrderStatus
+    balance_change: Optional[BalanceChange] = None
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.order.status != self.old_status)
+
+
+@dataclass
+class BatchItemResult:
+    order_id: int
+    result: str
+    status: Optional[OrderStatus] = None  # Статус заявки после обработки (если она найдена)
+    version: Optional[int] = None
+
+
+class OrderStateMachine:
+    """
+    Переходы статуса одним запросом (compare-and-set):
+
+        UPDATE t SET status = :new, version = version + 1, updated_at = :now
+        FROM (SELECT id, status FROM t WHERE id = :id FOR UPDATE) AS locked
+        WHERE t.id = locked.id AND t.status IN (:sources) [AND t.version = :expected]
+        RETURNING t.*, locked.status
+
+    Подзапрос блокирует строку и отдаёт статус до изменения; конкурирующий переход
+    ждёт блокировку и перепроверяет условие на свежей версии строки.
+    """
+
+    def __init__(self, model: Any, transitions: Mapping[OrderStatus, Iterable[OrderStatus]]) -> None:
+        self.model = model
+        self.transitions: Dict[OrderStatus, FrozenSet[OrderStatus]] = {
+            status: frozenset(targets) for status, targets in transitions.items()
+        }
+        # Обратная таблица: из каких статусов можно попасть в данный
+        self.sources: Dict[OrderStatus, FrozenSet[OrderStatus]] = {
+            target: frozenset(status for status, targets in self.transitions.items() if target in targets)
+            for target in OrderStatus
+        }
+
+    def can_transition(self, current: OrderStatus, new: OrderStatus) -> bool:
+        return new in self.transitions.get(current, frozenset())
+
+    def statement(self, order_id: int, new_status: OrderStatus, sources: FrozenSet[OrderStatus],
+                  expected_version: Optional[int] = None,
+                  *filters: ColumnElement[bool]) -> ReturningUpdate[Any, OrderStatus]:
+        model = self.model
+        locked = (
+            select(model.id, model.status.label("old_status"))
+            .where(model.id == order_id, *filters)
+            .with_for_update()
+            .subquery("locked")
+        )
+        conditions = [model.id == locked.c.id, model.status.in_(list(sources))]
+        if expected_version is not None:
+            conditions.append(model.version == expected_version)
+        return (
+            update(model)
+            .where(*conditions)
+            .values(status=new_status, version=model.version + 1, updated_at=datetime.utcnow())
+            .returning(model, locked.c.old_status)
+            .execution_options(synchronize_session=False, populate_existing=True)
+        )
+
+    async def transition(
+        self,
+        db: AsyncSession,
+        order_id: int,
+        new_status: OrderStatus,
+        *filters: ColumnElement[bool],
+        expected_version: Optional[int] = None,
+        sources: Optional[FrozenSet[OrderStatus]] = None,
+    ) -> Transition:
+        """
+        Переход в new_status из sources (по умолчанию — по таблице переходов).
+        filters ограничивают владельца (например, TraderOrder.trader_id == ...).
+        Коммит — на вызывающей стороне.
+        """
+        sources = self.sources[new_status] if sources is None else sources
+        row = (await db.execute(self.statement(order_id, new_status, sources, expected_version, *filters))).first()
+        if row is not None:
+            return Transition(order=row[0], old_status=row.old_status)
+        return await self._rejected(db, order_id, new_status, expected_version, filters)
+
+    async def _rejected(self, db: AsyncSession, order_id: int, new_status: OrderStatus,
+                        expected_version: Optional[int], filters: Tuple[ColumnElement[bool], ...]) -> Transition:
+        """Причина отказа — отдельный запрос только на неуспешном пути."""
+        current = (await db.execute(select(self.model).where(self.model.id == order_id, *filters))).scalar_one_or_none()
+        if current is None:
+            raise TransitionRejected(NOT_FOUND)
+        if expected_version is not None and current.version != expected_version:
+            raise TransitionRejected(VERSION_CONFLICT, current.status)
+        # Переход в текущий статус, как и раньше, недопустим (400)
+        raise TransitionRejected(INVALID_TRANSITION, current.status)
+
+
+    def plan_batch(self, items: Sequence[BatchItem]) -> Tuple[Dict[int, BatchItemResult], List[BatchItem]]:
+        """
+        Проверка пакета по таблице переходов без обращения к БД.
+        Возвращает отклонённые элементы и элементы для UPDATE; повтор order_id отклоняется.
+        """
+        rejected: Dict[int, BatchItemResult] = {}
+        accepted: List[BatchItem] = []
+        seen = set()
+        for index, (order_id, expected_status, new_status) in enumerate(items):
+            if order_id in seen:
+                rejected[index] = BatchItemResult(order_id, DUPLICATE)
+            elif not self.can_transition(expected_status, new_status):
+                rejected[index] = BatchItemResult(order_id, INVALID_TRANSITION)
+            else:
+                accepted.append((order_id, expected_status, new_status))
+            seen.add(order_id)
+        return rejected, accepted
+
+    def batch_statement(self, items: Sequence[BatchItem]) -> ReturningUpdate[Any]:
+        """
+        Все переходы пакета одним запросом:
+
+            UPDATE t SET status = batch.new_status, version = version + 1, updated_at = :now
+            FROM (VALUES (:id, :expected, :new), ...) AS batch (id, expected_status, new_status)
+            WHERE t.id = batch.id AND t.status = batch.expected_status
+            RETURNING t.*
+
+        UPDATE сам блокирует строки и перепроверяет условие после ожидания блокировки,
+        поэтому статус до изменения — это expected_status обновлённого элемента.
+        """
+        model = self.model
+        status_type = model.__table__.c.status.type
+        batch = values(
+            column("id", Integer),
+            column("expected_status", status_type),
+            column("new_status", status_type),
+            name="batch"
+        ).data(list(items))
+        return (
+            update(model)
+            .where(model.id == batch.c.id, model.status == batch.c.expected_status)
+            .values(status=batch.c.new_status, version=model.version + 1, updated_at=datetime.utcnow())
+            .returning(model)
+            .execution_options(synchronize_session=False, populate_existing=True)
+        )
+
+    async def transition_many(self, db: AsyncSession, items: Sequence[BatchItem]) -> Tuple[List[BatchItemResult], List[Any]]:
+        """
+        Пакетный переход: результат по каждому элементу (в порядке запроса) и обновлённые заявки.
+        Не больше двух запросов: UPDATE ... FROM (VALUES ...) и SELECT текущих статусов для неудачных.
+        Коммит — на вызывающей стороне.
+        """
+        results, accepted = self.plan_batch(items)
+        updated: Dict[int, Any] = {}
+        if accepted:
+            updated = {order.id: order for order in (await db.execute(self.batch_statement(accepted))).scalars().all()}
+
+        missing = [order_id for order_id, _, _ in accepted if order_id not in updated]
+        current: Dict[int, Tuple[OrderStatus, int]] = {}
+        if missing:
+            rows = await db.execute(
+                select(self.model.id, self.model.status, self.model.version).where(self.model.id.in_(missing))
+            )
+            current = {row.id: (row.status, row.version) for row in rows}
+
+        accepted_iter = iter(accepted)
+        for index in range(len(items)):
+            if index in results:
+                continue
+            order_id = next(accepted_iter)[0]
+            if order_id in updated:
+                order = updated[order_id]
+                results[index] = BatchItemResult(order_id, UPDATED, order.status, order.version)
+            elif order_id in current:
+                results[index] = BatchItemResult(order_id, STATUS_MISMATCH, *current[order_id])
+            else:
+                results[index] = BatchItemResult(order_id, NOT_FOUND)
+        return [results[index] for index in range(len(items))], list(updated.values())
+
+
+exchange_orders = OrderStateMachine(ExchangeOrder, EXCHANGE_ORDER_TRANSITIONS)
+trader_orders = OrderStateMachine(TraderOrder, TRADER_ORDER_TRANSITIONS)
+
+
+async def transition_trader_order(
+    db: AsyncSession,
+    order_id: int,
+    new_status: OrderStatus,
+    *filters: ColumnElement[bool],
+    expected_version: Optional[int] = None,
+) -> Transition:
+    """Переход ордера трейдера вместе с побочными эффектами в той же транзакции: баланс и статистика."""
+    result = await trader_orders.transition(db, order_id, new_status, *filters, expected_version=expected_version)
+    await apply_trader_side_effects(db, result)
+    return result
+
+
+async def apply_trader_side_effects(db: AsyncSession, result: Transition) -> None:
+    """Движение баланса и счётчики трейдера для уже выполненного перехода (до коммита)."""
+    if result.changed:
+        result.balance_change = await apply_order_status(db, result.order)
+        await record_status_change(db, result.order, result.old_status)
+
+
+async def publish_trader_transition(result: Transition) -> None:
+    """После коммита: доступный баланс в индексе маршрутизации и событие для WebSocket."""
+    change = result.balance_change
+    if change is not None:
+        trader_routing.set_balance(change.trader_id, change.fiat, change.available)
+    if result.changed:
+        await order_events.publish(OrderEvent.trader_order(result.order))
+
+
+async def publish_exchange_transition(result: Transition) -> None:
+    if result.changed:
+        await order_events.publish(OrderEvent.exchange_order(result.order))
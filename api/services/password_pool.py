@@ -0,0 +1,80 @@
+# api/services/password_pool.py
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, TypeVar
+
+from constants import PASSWORD_POOL_MAX_WORKERS, PASSWORD_POOL_MAX_PENDING
+
+T = TypeVar("T")
+
+
+class PasswordPoolBusyError(Exception):
+    """Очередь на хэширование паролей переполнена."""
+
+
+class PasswordHashPool:
+    """
+    Ограниченный пул потоков для bcrypt.
+
+    bcrypt отпускает GIL, поэтому хэширование в потоках не блокирует цикл событий.
+    Одновременно выполняется не больше max_workers операций, в очереди ждут не
+    больше max_pending — лишние запросы сразу получают PasswordPoolBusyError.
+    """
+
+    def __init__(self, max_workers: int = PASSWORD_POOL_MAX_WORKERS, max_pending: int = PASSWORD_POOL_MAX_PENDING):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bcrypt")
+        self._semaphore = asyncio.Semaphore(max_workers)
+        self.in_flight = 0
+        self.waiting = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    async def run(self, func: Callable[..., T], *args: Any) -> T:
+        if self.waiting >= self.max_pending:
+            self.rejected += 1
+            raise PasswordPoolBusyError("Слишком много одновременных запросов на проверку пароля")
+
+        queued_at = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        wait = time.perf_counter() - queued_at
+        self.total_wait_seconds += wait
+        self.max_wait_seconds = max(self.max_wait_seconds, wait)
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, func, *args)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self._semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """Метрики пула: загрузка, глубина очереди и время ожидания."""
+        return {
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_wait_seconds": self.total_wait_seconds / self.completed if self.completed else 0.0,
+            "max_wait_seconds": self.max_wait_seconds,
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+# Общий пул для хэширования паролей
+password_pool = PasswordHashPool()
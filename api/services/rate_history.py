@@ -0,0 +1,190 @@
+# api/services/rate_history.py
+
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, List, Optional, Tuple
+
+from sqlalchemy import Select, func, literal, literal_column
+from sqlalchemy.dialects.postgresql import Insert, aggregate_order_by, insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from api.services.leader_lock import AdvisoryLeaderLock, rates_leader
+from constants import RATE_ROLLUP_INTERVAL_SECONDS, RATE_HISTORY_MINUTE_MAX_RANGE_HOURS
+from database.init_db import AsyncSessionLocal, ExchangeRateBar, ExchangeRateTick
+from config.logging_config import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+RESOLUTIONS = ("1m", "1h")
+
+# Тик коммитится позже своего created_at: пересчитываем и предыдущую минуту (upsert идемпотентен)
+ROLLUP_LOOKBACK = timedelta(minutes=1)
+
+
+def _upsert_bars(select_stmt: "Select[Any]") -> Insert:
+    """INSERT ... SELECT свечей с перезаписью уже существующих интервалов."""
+    stmt = pg_insert(ExchangeRateBar).from_select(
+        ["currency", "resolution", "bucket_start", "open", "high", "low", "close", "tick_count"],
+        select_stmt
+    )
+    return stmt.on_conflict_do_update(
+        constraint="uq_exchange_rate_bars_bucket",
+        set_={
+            "open": stmt.excluded.open,
+            "high": stmt.excluded.high,
+            "low": stmt.excluded.low,
+            "close": stmt.excluded.close,
+            "tick_count": stmt.excluded.tick_count
+        }
+    )
+
+
+def _minute_bars_since(since: Optional[datetime]) -> "Select[Any]":
+    """Минутные свечи из сырых тиков, начиная с границы минуты since."""
+    bucket = func.date_trunc(literal_column("'minute'"), ExchangeRateTick.created_at)
+    stmt = select(
+        ExchangeRateTick.currency,
+        literal("1m"),
+        bucket,
+        func.array_agg(aggregate_order_by(ExchangeRateTick.median_rate, ExchangeRateTick.created_at.asc()))[1],
+        func.max(ExchangeRateTick.median_rate),
+        func.min(ExchangeRateTick.median_rate),
+        func.array_agg(aggregate_order_by(ExchangeRateTick.median_rate, ExchangeRateTick.created_at.desc()))[1],
+        func.count()
+    )
+    if since is not None:
+        stmt = stmt.where(ExchangeRateTick.created_at >= since)
+    return stmt.group_by(ExchangeRateTick.currency, bucket)
+
+
+def _hour_bars_since(since: Optional[datetime]) -> "Select[Any]":
+    """Часовые свечи из минутных, начиная с границы часа since."""
+    bucket = func.date_trunc(literal_column("'hour'"), ExchangeRateBar.bucket_start)
+    stmt = select(
+        ExchangeRateBar.currency,
+        literal("1h"),
+        bucket,
+        func.array_agg(aggregate_order_by(ExchangeRateBar.open, ExchangeRateBar.bucket_start.asc()))[1],
+        func.max(ExchangeRateBar.high),
+        func.min(ExchangeRateBar.low),
+        func.array_agg(aggregate_order_by(ExchangeRateBar.close, ExchangeRateBar.bucket_start.desc()))[1],
+        func.sum(ExchangeRateBar.tick_count)
+    ).where(ExchangeRateBar.resolution == "1m")
+    if since is not None:
+        stmt = stmt.where(ExchangeRateBar.bucket_start >= since)
+    return stmt.group_by(ExchangeRateBar.currency, bucket)
+
+
+def rollup_window(since: Optional[datetime]) -> Tuple[Optional[datetime], Optional[datetime]]:
+    """Начало пересчёта минутных и часовых свечей для прохода после since (None — всё с начала)."""
+    if since is None:
+        return None, None
+    minute_since = since.replace(second=0, microsecond=0) - ROLLUP_LOOKBACK
+    return minute_since, minute_since.replace(minute=0)
+
+
+def _naive_utc(value: datetime) -> datetime:
+    """Столбцы TIMESTAMP без зоны хранят UTC: aware-значения переводятся в UTC и теряют tzinfo."""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def history_bounds(
+    start: Optional[datetime], end: Optional[datetime], now: Optional[datetime] = None
+) -> Tuple[datetime, datetime]:
+    """Границы запроса истории в naive UTC; по умолчанию — последние сутки."""
+    end = _naive_utc(end) if end is not None else (now or datetime.utcnow())
+    start = _naive_utc(start) if start is not None else end - timedelta(days=1)
+    return start, end
+
+
+def pick_resolution(start: datetime, end: datetime) -> str:
+    """Минутные свечи для коротких интервалов, часовые — для длинных."""
+    if end - start <= timedelta(hours=RATE_HISTORY_MINUTE_MAX_RANGE_HOURS):
+        return "1m"
+    return "1h"
+
+
+async def get_rate_bars(
+    db: AsyncSession, currency: str, start: datetime, end: datetime, resolution: str
+) -> List[ExchangeRateBar]:
+    """Свечи за интервал; читается только таблица агрегатов по уникальному индексу."""
+    result = await db.execute(
+        select(ExchangeRateBar)
+        .where(
+            ExchangeRateBar.currency == currency,
+            ExchangeRateBar.resolution == resolution,
+            ExchangeRateBar.bucket_start.between(start, end)
+        )
+        .order_by(ExchangeRateBar.bucket_start)
+    )
+    return list(result.scalars().all())
+
+
+class RateHistoryRollup:
+    """
+    Фоновая агрегация журнала курсов в свечи 1m и 1h.
+    Каждый проход пересчитывает только интервалы, начиная с минуты перед предыдущим проходом.
+    Агрегирует только ведущий процесс — тот же, что получает курсы (rates_leader).
+    """
+
+    def __init__(self, interval: float = RATE_ROLLUP_INTERVAL_SECONDS, leader: AdvisoryLeaderLock = rates_leader):
+        self.interval = interval
+        self.leader = leader
+        self._since: Optional[datetime] = None
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    async def _initial_since(self, db: AsyncSession) -> Optional[datetime]:
+        last_bucket: Optional[datetime] = await db.scalar(
+            select(func.max(ExchangeRateBar.bucket_start)).where(ExchangeRateBar.resolution == "1m")
+        )
+        return last_bucket
+
+    async def rollup(self, db: AsyncSession) -> None:
+        started_at = datetime.utcnow()
+        if self._since is None:
+            self._since = await self._initial_since(db)
+
+        minute_since, hour_since = rollup_window(self._since)
+
+        await db.execute(_upsert_bars(_minute_bars_since(minute_since)))
+        await db.execute(_upsert_bars(_hour_bars_since(hour_since)))
+        await db.commit()
+        self._since = started_at
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                if await self.leader.try_acquire():
+                    async with AsyncSessionLocal() as db:
+                        await self.rollup(db)
+                else:
+                    # Ведущим мог быть другой процесс: после перехвата начать с последней свечи в базе
+                    self._since = None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка агрегации истории курсов: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+# Общий экземпляр фоновой агрегации
+rate_history_rollup = RateHistoryRollup()
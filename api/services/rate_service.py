@@ -0,0 +1,222 @@
+# api/services/rate_service.py
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from api.endpoints.garantex_api import fetch_markets_rates, close_client
+from api.services.leader_lock import AdvisoryLeaderLock, rates_leader
+from api.services.order_book import OrderBookSnapshot
+from constants import GARANTEX_MARKETS, RATES_REFRESH_INTERVAL_SECONDS
+from database.init_db import AsyncSessionLocal, ExchangeRate, ExchangeRateTick
+from config.logging_config import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+
+class RatesUnavailableError(Exception):
+    """Не удалось получить курсы с Garantex."""
+
+
+@dataclass(frozen=True)
+class CachedRate:
+    """Неизменяемый снимок строки ExchangeRate, хранящийся в памяти."""
+    currency: str
+    buy_rate: Decimal
+    sell_rate: Decimal
+    median_rate: Decimal
+    source: str
+    updated_at: datetime
+
+    @classmethod
+    def from_orm(cls, rate: Any) -> "CachedRate":
+        """rate — строка ExchangeRate (модели без аннотаций Mapped, поэтому Any)."""
+        return cls(
+            currency=rate.currency,
+            buy_rate=rate.buy_rate,
+            sell_rate=rate.sell_rate,
+            median_rate=rate.median_rate,
+            source=rate.source,
+            updated_at=rate.updated_at
+        )
+
+
+class RateService:
+    """
+    Кэш последних курсов обмена в памяти процесса.
+
+    Курсы с Garantex получает только ведущий процесс (advisory lock): он
+    сохраняет их вместе со стаканом в exchange_rates и в журнал
+    exchange_rate_ticks. Остальные воркеры с тем же интервалом перечитывают
+    exchange_rates. Снимок подменяется целиком, поэтому читатели никогда не
+    видят частично обновлённые данные и не ходят в базу.
+    """
+
+    def __init__(
+        self,
+        refresh_interval: float = RATES_REFRESH_INTERVAL_SECONDS,
+        leader: AdvisoryLeaderLock = rates_leader
+    ):
+        self.refresh_interval = refresh_interval
+        self.leader = leader
+        self._rates: Dict[str, CachedRate] = {}
+        self._order_books: Dict[str, OrderBookSnapshot] = {}
+        self._version = 0
+        self._updated_at: Optional[datetime] = None
+        self._lock = asyncio.Lock()
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    @property
+    def version(self) -> int:
+        """Монотонно растущий номер снимка курсов."""
+        return self._version
+
+    @property
+    def updated_at(self) -> Optional[datetime]:
+        """Время последнего обновления снимка."""
+        return self._updated_at
+
+    def get(self, currency: str) -> Optional[CachedRate]:
+        return self._rates.get(currency)
+
+    def all(self) -> List[CachedRate]:
+        return list(self._rates.values())
+
+    def get_order_book(self, currency: str) -> Optional[OrderBookSnapshot]:
+        """Последний полученный стакан; None, если курсы загружены только из базы."""
+        return self._order_books.get(currency)
+
+    def _replace_snapshot(self, rates: List[CachedRate]) -> None:
+        self._rates = {rate.currency: rate for rate in rates}
+        self._version += 1
+        self._updated_at = datetime.utcnow()
+
+    async def load_from_db(self, db: AsyncSession) -> bool:
+        """Заполняет кэш последними сохранёнными курсами; False — в базе нет новых."""
+        result = await db.execute(select(ExchangeRate))
+        stored: List[Any] = list(result.scalars().all())
+        rates = {rate.currency: CachedRate.from_orm(rate) for rate in stored}
+        if not rates or rates == self._rates:
+            return False
+        self._order_books = {
+            rate.currency: OrderBookSnapshot.from_depth(rate.order_book) for rate in stored if rate.order_book
+        }
+        self._replace_snapshot(list(rates.values()))
+        logger.info(f"Кэш курсов загружен из базы: {len(rates)} валют, версия {self._version}")
+        return True
+
+    async def refresh(self, db: AsyncSession) -> List[CachedRate]:
+        """Получает курсы с Garantex, сохраняет их в базе и обновляет кэш."""
+        async with self._lock:
+            fetched = await fetch_markets_rates(GARANTEX_MARKETS.values())
+            currencies: List[Tuple[str, Dict[str, Any]]] = []
+            for currency, market in GARANTEX_MARKETS.items():
+                market_rates = fetched.get(market)
+                if not market_rates:
+                    raise RatesUnavailableError("Не удалось получить курсы с Garantex")
+                currencies.append((currency, market_rates))
+
+            now = datetime.utcnow()
+            rows = []
+            for currency, rates in currencies:
+                buy_rate = Decimal(str(rates["buy_rate"]))
+                sell_rate = Decimal(str(rates["sell_rate"]))
+                order_book = rates.get("order_book")
+                rows.append({
+                    "currency": currency,
+                    "buy_rate": buy_rate,
+                    "sell_rate": sell_rate,
+                    "median_rate": (buy_rate + sell_rate) / 2,  # Вычисляем средний курс
+                    "source": rates.get("source", "Garantex"),
+                    "order_book": order_book.to_depth() if order_book is not None else None,
+                    "updated_at": now
+                })
+
+            # Одна команда: INSERT ... ON CONFLICT (currency) DO UPDATE для всех валют
+            # и запись тех же строк в журнал exchange_rate_ticks
+            values = pg_insert(ExchangeRate).values(rows)
+            upsert = values.on_conflict_do_update(
+                index_elements=[ExchangeRate.currency],
+                set_={
+                    "buy_rate": values.excluded.buy_rate,
+                    "sell_rate": values.excluded.sell_rate,
+                    "median_rate": values.excluded.median_rate,
+                    "source": values.excluded.source,
+                    "order_book": values.excluded.order_book,
+                    "updated_at": values.excluded.updated_at
+                }
+            ).returning(
+                ExchangeRate.currency,
+                ExchangeRate.buy_rate,
+                ExchangeRate.sell_rate,
+                ExchangeRate.median_rate,
+                ExchangeRate.source,
+                ExchangeRate.updated_at
+            ).cte("upserted")
+
+            tick_columns = ["currency", "buy_rate", "sell_rate", "median_rate", "source", "created_at"]
+            stmt = insert(ExchangeRateTick).from_select(
+                tick_columns, select(*upsert.c)
+            ).returning(*(getattr(ExchangeRateTick, column) for column in tick_columns))
+            result = await db.execute(stmt)
+            snapshot = [CachedRate(*row) for row in result.all()]
+            await db.commit()
+
+            self._order_books = {
+                currency: rates["order_book"] for currency, rates in currencies if rates.get("order_book") is not None
+            }
+            self._replace_snapshot(snapshot)
+            logger.info(f"Курсы обновлены, версия {self._version}")
+            return snapshot
+
+    async def sync(self, db: AsyncSession) -> None:
+        """Один проход фоновой задачи: ведущий получает курсы с Garantex, остальные читают их из базы."""
+        if await self.leader.try_acquire():
+            await self.refresh(db)
+        else:
+            await self.load_from_db(db)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                async with AsyncSessionLocal() as db:
+                    await self.sync(db)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка фонового обновления курсов: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+    async def start(self) -> None:
+        """Загружает курсы из базы и запускает фоновое обновление (или чтение из базы на ведомых)."""
+        if self._task is not None:
+            return
+        try:
+            async with AsyncSessionLocal() as db:
+                await self.load_from_db(db)
+        except Exception as e:
+            logger.error(f"Не удалось загрузить курсы из базы: {e}")
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await close_client()
+
+
+# Общий экземпляр сервиса курсов
+rate_service = RateService()
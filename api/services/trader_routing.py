@@ -0,0 +1,317 @@
+# api/services/trader_routing.py
+
+import asyncio
+import itertools
+import logging
+import random
+from dataclasses import dataclass, replace
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy.engine import Result
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from api.enums import OrderStatus, TraderOrderTypeEnum, TraderPaymentMethodEnum, TraderReqStatus
+from api.services.order_events import DELETE, TRADER_ORDER, OrderEvent, order_events
+from config.logging_config import setup_logging
+from config.settings import settings
+from constants import TRADER_ROUTING_RELOAD_SECONDS
+from database.init_db import (
+    AsyncSessionLocal,
+    BalanceTrader,
+    FiatCurrencyTrader,
+    PaymentMethodTrader,
+    ReqTrader,
+    Trader,
+    TraderOrder,
+)
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Статусы, при которых ордер занимает трейдера (для политики least_loaded)
+OPEN_STATUSES = frozenset({OrderStatus.pending.value, OrderStatus.processing.value})
+
+# (тип ордера, фиат, способ оплаты, банк); банк None — «любой банк»
+RouteKey = Tuple[str, str, str, Optional[str]]
+
+
+@dataclass(frozen=True)
+class TraderState:
+    """Поля трейдера, влияющие на приём ордеров."""
+    trader_id: int
+    fiat: str
+    access: bool
+    pay_in: bool
+    pay_out: bool
+
+
+@dataclass(frozen=True)
+class Requisite:
+    """Одобренный реквизит трейдера в индексе маршрутизации."""
+    req_id: int
+    trader_id: int
+    payment_method: str  # Имя TraderPaymentMethodEnum (SBP, CARD, ...)
+    bank: str
+    can_buy: bool
+    can_sell: bool
+    fee_percentage: Decimal
+
+
+def _payment_method_name(value: Any) -> str:
+    """Имя TraderPaymentMethodEnum: в реквизитах встречаются и имя (BANK_TRANSFER), и значение (SCHET)."""
+    if isinstance(value, TraderPaymentMethodEnum):
+        return value.name
+    if value in TraderPaymentMethodEnum.__members__:
+        return str(value)
+    try:
+        return TraderPaymentMethodEnum(value).name
+    except ValueError:
+        return str(value)
+
+
+def _route_keys(req: Requisite, trader: TraderState) -> List[RouteKey]:
+    """Ключи, под которыми реквизит доступен; пусто, если он сейчас не может принять ордер."""
+    keys: List[RouteKey] = []
+    for order_type, allowed in (
+        (TraderOrderTypeEnum.pay_in.value, trader.pay_in and req.can_sell),
+        (TraderOrderTypeEnum.pay_out.value, trader.pay_out and req.can_buy),
+    ):
+        if trader.access and allowed:
+            keys.append((order_type, trader.fiat, req.payment_method, req.bank))
+            keys.append((order_type, trader.fiat, req.payment_method, None))
+    return keys
+
+
+# Политики выбора: порядок предпочтения кандидатов. Кандидаты без достаточного баланса отсеиваются позже.
+Policy = Callable[["TraderRouter", RouteKey, Sequence[Requisite]], Iterable[Requisite]]
+
+
+def round_robin(router: "TraderRouter", key: RouteKey, candidates: Sequence[Requisite]) -> Iterable[Requisite]:
+    start = next(router._cursors.setdefault(key, itertools.count())) % len(candidates)
+    return itertools.chain(candidates[start:], candidates[:start])
+
+
+def least_loaded(router: "TraderRouter", key: RouteKey, candidates: Sequence[Requisite]) -> Iterable[Requisite]:
+    return sorted(candidates, key=lambda req: len(router._open_orders.get(req.trader_id, ())))
+
+
+def fee_weighted(router: "TraderRouter", key: RouteKey, candidates: Sequence[Requisite]) -> Iterable[Requisite]:
+    """Случайный порядок с весом 1 / (1 + комиссия %): дешёвые реквизиты выбираются чаще."""
+    pool = list(candidates)
+    weights = [1.0 / (1.0 + float(req.fee_percentage)) for req in pool]
+    while pool:
+        i = random.choices(range(len(pool)), weights=weights)[0]
+        yield pool.pop(i)
+        weights.pop(i)
+
+
+POLICIES: Dict[str, Policy] = {
+    "round_robin": round_robin,
+    "least_loaded": least_loaded,
+    "fee_weighted": fee_weighted,
+}
+
+
+class TraderRouter:
+    """
+    Выбор реквизита для мерчантского ордера без запроса к БД.
+
+    Индекс: (тип ордера, фиат, способ оплаты, банк) -> реквизиты, которые сейчас могут
+    принять ордер (реквизит одобрен, трейдер с access и pay_in/pay_out, can_sell/can_buy).
+    Эндпоинты обновляют индекс точечно, фоновая задача периодически перечитывает его целиком
+    (изменения из других процессов). Итоговую проверку делает INSERT ... SELECT при создании ордера.
+    """
+
+    def __init__(self, policy: str = "round_robin", reload_interval: float = TRADER_ROUTING_RELOAD_SECONDS):
+        if policy not in POLICIES:
+            raise ValueError(f"Неизвестная политика маршрутизации: {policy}")
+        self.policy = POLICIES[policy]
+        self.reload_interval = reload_interval
+        self._traders: Dict[int, TraderState] = {}
+        self._requisites: Dict[int, Requisite] = {}
+        self._trader_requisites: Dict[int, Set[int]] = {}
+        self._index: Dict[RouteKey, Dict[int, None]] = {}
+        self._req_keys: Dict[int, List[RouteKey]] = {}
+        self._candidates: Dict[RouteKey, Tuple[Requisite, ...]] = {}  # Кэш упорядоченных кандидатов
+        self._balances: Dict[Tuple[int, str], Decimal] = {}
+        self._open_orders: Dict[int, Set[int]] = {}
+        self._payment_methods: Dict[int, str] = {}
+        self._cursors: Dict[RouteKey, Iterator[int]] = {}
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    # --- выбор ---
+
+    def candidates(
+        self,
+        order_type: TraderOrderTypeEnum,
+        fiat: str,
+        payment_method_id: int,
+        amount: Decimal,
+        bank: Optional[str] = None,
+    ) -> Iterator[int]:
+        """id реквизитов в порядке политики; у трейдера должно хватать баланса в фиате на amount."""
+        payment_method = self._payment_methods.get(payment_method_id)
+        if payment_method is None:
+            return
+        key = (order_type.value, fiat, payment_method, bank)
+        candidates = self._candidates.get(key)
+        if candidates is None:
+            candidates = self._candidates[key] = tuple(
+                self._requisites[req_id] for req_id in self._index.get(key, ())
+            )
+        if not candidates:
+            return
+        for req in self.policy(self, key, candidates):
+            if self._balances.get((req.trader_id, fiat), Decimal("0")) >= amount:
+                yield req.req_id
+
+    # --- точечные обновления ---
+
+    def update_trader(self, trader_id: int, **fields: Any) -> None:
+        """Изменение access/pay_in/pay_out трейдера (например, переключение онлайн-статуса)."""
+        trader = self._traders.get(trader_id)
+        if trader is None:
+            return  # Трейдер появится в индексе при следующей перезагрузке
+        self._traders[trader_id] = replace(trader, **fields)
+        for req_id in self._trader_requisites.get(trader_id, ()):
+            self._reindex(req_id)
+
+    def upsert_requisite(self, req: Any) -> None:
+        """Реквизит (строка ReqTrader) создан или изменён; неодобренные реквизиты убираются из индекса."""
+        if req.status != TraderReqStatus.approve:
+            self.remove_requisite(req.id)
+            return
+        self._requisites[req.id] = Requisite(
+            req_id=req.id,
+            trader_id=req.trader_id,
+            payment_method=_payment_method_name(req.payment_method),
+            bank=req.bank,
+            can_buy=bool(req.can_buy),
+            can_sell=bool(req.can_sell),
+            fee_percentage=req.fee_percentage if req.fee_percentage is not None else Decimal("0"),
+        )
+        self._trader_requisites.setdefault(req.trader_id, set()).add(req.id)
+        self._reindex(req.id)
+
+    def remove_requisite(self, req_id: int) -> None:
+        """Убирает реквизит из индекса (удалён, не одобрен или отклонён при создании ордера)."""
+        self._unindex(req_id)
+        req = self._requisites.pop(req_id, None)
+        if req is not None:
+            self._trader_requisites.get(req.trader_id, set()).discard(req_id)
+
+    def set_balance(self, trader_id: int, fiat: str, available: Decimal) -> None:
+        """Доступный баланс трейдера (balance - reserved) после движения по журналу."""
+        self._balances[(trader_id, fiat)] = available
+
+    async def handle_order_event(self, event: OrderEvent) -> None:
+        """Подписчик шины: открытые ордера трейдера для политики least_loaded."""
+        if event.kind != TRADER_ORDER:
+            return
+        open_orders = self._open_orders.setdefault(event.owner_id, set())
+        if event.action != DELETE and event.status in OPEN_STATUSES:
+            open_orders.add(event.order_id)
+        else:
+            open_orders.discard(event.order_id)
+
+    def _unindex(self, req_id: int) -> None:
+        for key in self._req_keys.pop(req_id, ()):
+            self._index[key].pop(req_id, None)
+            self._candidates.pop(key, None)
+
+    def _reindex(self, req_id: int) -> None:
+        self._unindex(req_id)
+        req = self._requisites.get(req_id)
+        trader = self._traders.get(req.trader_id) if req else None
+        if req is None or trader is None:
+            return
+        keys = _route_keys(req, trader)
+        for key in keys:
+            self._index.setdefault(key, {})[req_id] = None
+            self._candidates.pop(key, None)
+        if keys:
+            self._req_keys[req_id] = keys
+
+    # --- полная перезагрузка ---
+
+    async def reload(self, db: AsyncSession) -> None:
+        """Перечитывает трейдеров, реквизиты, балансы и открытые ордера и подменяет индекс целиком."""
+        methods: Result[int, Any] = await db.execute(select(PaymentMethodTrader.id, PaymentMethodTrader.method_name))
+        payment_methods = {method_id: _payment_method_name(name) for method_id, name in methods.all()}
+
+        traders_result: Result[int, str, Any, Any, Any] = await db.execute(
+            select(Trader.id, FiatCurrencyTrader.currency_name, Trader.access, Trader.pay_in, Trader.pay_out)
+            .join(FiatCurrencyTrader, FiatCurrencyTrader.id == Trader.fiat_currency_id)
+        )
+        traders = {
+            trader_id: TraderState(trader_id, fiat, bool(access), bool(pay_in), bool(pay_out))
+            for trader_id, fiat, access, pay_in, pay_out in traders_result.all()
+        }
+
+        requisites_result = await db.execute(select(ReqTrader).where(ReqTrader.status == TraderReqStatus.approve))
+        balances_result: Result[int, str, Decimal] = await db.execute(
+            select(
+                BalanceTrader.trader_id,
+                FiatCurrencyTrader.currency_name,
+                BalanceTrader.balance - BalanceTrader.reserved
+            )
+            .join(FiatCurrencyTrader, FiatCurrencyTrader.id == BalanceTrader.fiat)
+        )
+        open_result: Result[int, int] = await db.execute(
+            select(TraderOrder.trader_id, TraderOrder.id)
+            .where(TraderOrder.status.in_([OrderStatus.pending, OrderStatus.processing]))
+        )
+
+        fresh = TraderRouter(reload_interval=self.reload_interval)
+        fresh._traders = traders
+        fresh._payment_methods = payment_methods
+        fresh._balances = {(trader_id, fiat): balance for trader_id, fiat, balance in balances_result.all()}
+        for trader_id, order_id in open_result.all():
+            fresh._open_orders.setdefault(trader_id, set()).add(order_id)
+        for req in requisites_result.scalars().all():
+            fresh.upsert_requisite(req)
+
+        # Подмена за один шаг цикла событий: выбор видит либо старый, либо новый индекс
+        self._traders = fresh._traders
+        self._requisites = fresh._requisites
+        self._trader_requisites = fresh._trader_requisites
+        self._index = fresh._index
+        self._req_keys = fresh._req_keys
+        self._candidates = {}
+        self._balances = fresh._balances
+        self._open_orders = fresh._open_orders
+        self._payment_methods = fresh._payment_methods
+        logger.debug(f"Индекс маршрутизации перезагружен: {len(self._requisites)} реквизитов")
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                async with AsyncSessionLocal() as db:
+                    await self.reload(db)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка перезагрузки индекса маршрутизации: {e}")
+            await asyncio.sleep(self.reload_interval)
+
+    async def start(self) -> None:
+        if self._task is None:
+            order_events.subscribe(self.handle_order_event)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        order_events.unsubscribe(self.handle_order_event)
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+# Общий индекс маршрутизации мерчантских ордеров
+trader_routing = TraderRouter(settings.trader_routing_policy)
@@ -0,0 +1,113 @@
+# api/services/trader_stats.py
+
+import asyncio
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, Optional
+
+from sqlalchemy import ColumnElement, case, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from api.enums import OrderStatus
+from database.init_db import AsyncSessionLocal, TraderOrder, TraderStats
+
+# Статусы, в которых ордер считается открытым
+OPEN_STATUSES = frozenset({OrderStatus.pending, OrderStatus.processing})
+
+_COUNTERS = ("orders_total", "orders_open", "orders_completed", "orders_canceled", "turnover_fiat", "turnover_currency")
+
+
+def _contribution(order: Any, status: Optional[OrderStatus]) -> Dict[str, Any]:
+    """Вклад ордера в каждом статусе в счётчики трейдера (без orders_total)."""
+    if status in OPEN_STATUSES:
+        return {"orders_open": 1}
+    if status == OrderStatus.completed:
+        return {"orders_completed": 1, "turnover_fiat": order.total_fiat, "turnover_currency": order.amount_currency}
+    if status == OrderStatus.canceled:
+        return {"orders_canceled": 1}
+    return {}
+
+
+def _delta(order: Any, old_status: Optional[OrderStatus], new_status: Optional[OrderStatus]) -> Dict[str, Any]:
+    delta: Dict[str, Any] = {}
+    for key, value in _contribution(order, new_status).items():
+        delta[key] = delta.get(key, 0) + value
+    for key, value in _contribution(order, old_status).items():
+        delta[key] = delta.get(key, 0) - value
+    return {key: value for key, value in delta.items() if value}
+
+
+async def _apply(db: AsyncSession, trader_id: int, delta: Dict[str, Any]) -> None:
+    """Атомарное приращение счётчиков: INSERT ... ON CONFLICT (trader_id) DO UPDATE SET col = col + delta."""
+    if not delta:
+        return
+    stmt = pg_insert(TraderStats).values(trader_id=trader_id, updated_at=datetime.utcnow(), **delta)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[TraderStats.trader_id],
+        set_={
+            **{key: getattr(TraderStats, key) + getattr(stmt.excluded, key) for key in delta},
+            "updated_at": stmt.excluded.updated_at,
+        }
+    )
+    await db.execute(stmt)
+
+
+async def record_order_created(db: AsyncSession, order: Any) -> None:
+    await _apply(db, order.trader_id, {"orders_total": 1, **_delta(order, None, order.status)})
+
+
+async def record_status_change(db: AsyncSession, order: Any, old_status: OrderStatus) -> None:
+    await _apply(db, order.trader_id, _delta(order, old_status, order.status))
+
+
+async def record_order_deleted(db: AsyncSession, order: Any) -> None:
+    await _apply(db, order.trader_id, {"orders_total": -1, **_delta(order, order.status, None)})
+
+
+def success_rate(stats: Any) -> Optional[float]:
+    """Доля исполненных среди закрытых ордеров; None, пока закрытых нет."""
+    if stats is None:
+        return None
+    closed = stats.orders_completed + stats.orders_canceled
+    return float(stats.orders_completed / closed) if closed else None
+
+
+async def rebuild_trader_stats(db: AsyncSession) -> None:
+    """
+    Полный пересчёт из trader_orders (первичное заполнение или сверка).
+    В рабочем режиме таблица поддерживается приращениями и этот пересчёт не нужен.
+    """
+    completed: ColumnElement[bool] = TraderOrder.status == OrderStatus.completed
+    source = (
+        select(
+            TraderOrder.trader_id,
+            func.count(),
+            func.count().filter(TraderOrder.status.in_(list(OPEN_STATUSES))),
+            func.count().filter(completed),
+            func.count().filter(TraderOrder.status == OrderStatus.canceled),
+            func.coalesce(func.sum(case((completed, TraderOrder.total_fiat))), Decimal("0")),
+            func.coalesce(func.sum(case((completed, TraderOrder.amount_currency))), Decimal("0")),
+            func.timezone("UTC", func.now()),
+        )
+        .group_by(TraderOrder.trader_id)
+    )
+    stmt = pg_insert(TraderStats).from_select(["trader_id", *_COUNTERS, "updated_at"], source)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[TraderStats.trader_id],
+        set_={key: getattr(stmt.excluded, key) for key in (*_COUNTERS, "updated_at")}
+    )
+    await db.execute(stmt)
+    await db.commit()
+
+
+async def _main() -> None:
+    async with AsyncSessionLocal() as db:
+        await rebuild_trader_stats(db)
+    print("Статистика трейдеров пересчитана.")
+
+
+if __name__ == "__main__":
+    # python -m api.services.trader_stats — пересчёт после первого развёртывания
+    asyncio.run(_main())
@@ -0,0 +1,71 @@
+# api/utils/pagination.py
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, Optional, Sequence, Tuple, TypeVar
+
+from fastapi import HTTPException
+from sqlalchemy import ColumnElement, Select, tuple_
+
+# Заголовок ответа с курсором следующей страницы
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+# Заголовок ответа со смещением следующей страницы (сортировка не по created_at)
+NEXT_OFFSET_HEADER = "X-Next-Offset"
+
+RowT = TypeVar("RowT")
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """Непрозрачный курсор на позицию (created_at, id)."""
+    payload = json.dumps({"c": created_at.isoformat(), "i": row_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Разбирает курсор; на некорректный курсор отвечает 400."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(payload["c"]), int(payload["i"])
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+
+
+def keyset_page(stmt: Select[Any], created_col: ColumnElement[Any], id_col: ColumnElement[Any],
+                cursor: Optional[str], limit: int, descending: bool = True) -> Select[Any]:
+    """
+    Добавляет к запросу keyset-условие и сортировку по (created_at, id).
+    Запрашивает limit + 1 строку, чтобы понять, есть ли следующая страница.
+    Строки без created_at в выдачу не попадают: для них нет позиции курсора
+    (database/upgrade_db.py заполняет такие строки в старых базах).
+    """
+    stmt = stmt.where(created_col.isnot(None))
+    if cursor:
+        position = decode_cursor(cursor)
+        key = tuple_(created_col, id_col)
+        stmt = stmt.where(key < position if descending else key > position)
+    if descending:
+        stmt = stmt.order_by(created_col.desc(), id_col.desc())
+    else:
+        stmt = stmt.order_by(created_col.asc(), id_col.asc())
+    return stmt.limit(limit + 1)
+
+
+def offset_page(stmt: Select[Any], sort_col: ColumnElement[Any], id_col: ColumnElement[Any],
+                offset: int, limit: int, descending: bool = False) -> Select[Any]:
+    """Сортировка по произвольному столбцу: OFFSET/LIMIT + 1, id — для устойчивого порядка."""
+    if descending:
+        stmt = stmt.order_by(sort_col.desc(), id_col.desc())
+    else:
+        stmt = stmt.order_by(sort_col.asc(), id_col.asc())
+    return stmt.offset(offset).limit(limit + 1)
+
+
+def split_page(rows: Sequence[RowT], limit: int) -> Tuple[Sequence[RowT], Optional[str]]:
+    """Отрезает лишнюю строку и возвращает (страница, курсор следующей страницы или None)."""
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    last: Any = page[-1]
+    return page, encode_cursor(last.created_at, last.id)
@@ -0,0 +1,24 @@
+# api/utils/request_utils.py
+from starlette.requests import Request
+
+
+def route_template(request: Request) -> str:
+    """
+    Шаблон пути запроса (/api/v1/trader_orders/{order_id}) — метка с ограниченным
+    числом значений для логов и метрик. Берётся из совпавшего маршрута; без маршрута
+    (404) возвращается сам путь, поэтому для меток вызывающий код проверяет scope["route"].
+    """
+    route = request.scope.get("route")
+    if route is None:
+        return request.url.path
+    path: str = getattr(route, "path_format", route.path)
+    return _router_prefix(request) + path
+
+
+def _router_prefix(request: Request) -> str:
+    # FastAPI подключает роутеры лениво: путь маршрута хранится без префикса include_router,
+    # совокупный префикс вложенных подключений лежит в контексте подключения
+    included = (request.scope.get("fastapi") or {}).get("included_router")
+    context = getattr(included, "include_context", None)
+    prefix: str = getattr(context, "prefix", "")
+    return prefix
@@ -2,9 +2,10 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from fastapi import HTTPException
 from database.init_db import User
+from api.services.auth_cache import UserPrincipal
 
-async def get_current_user_info(db: AsyncSession, current_user: User) -> User:
-    """Получает информацию о текущем пользователе."""
+async def get_current_user_info(db: AsyncSession, current_user: UserPrincipal) -> User:
+    """Загружает строку текущего пользователя (нужна для изменения данных)."""
     stmt = select(User).where(User.id == current_user.id)
     result = await db.execute(stmt)
     user = result.scalars().first()
@@ -1,55 +1,372 @@
 # JE/api/websockets/trader_orders_ws.py
-from fastapi import WebSocket, WebSocketDisconnect, Query
-from typing import List, Dict
-import json
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
+from fastapi.encoders import jsonable_encoder
+from collections import OrderedDict, deque
+from typing import Any, Deque, List, Dict, Optional, Set
 import asyncio
+import json
+import logging
+import time
+import uuid
 from sqlalchemy import select
-from api.auth import get_current_trader, create_access_token
+from api.auth import get_current_trader
 from api.schemas import TraderOrderResponse
-from api.endpoints.trader_orders_router import TraderOrder
-from database.init_db import get_async_db  # Убедитесь, что это правильно импортирован
+from api.services.order_events import DELETE, TRADER_ORDER, OrderEvent, order_events
+from database.init_db import AsyncSessionLocal, TraderOrder
 from jose import JWTError, jwt
-from constants import SECRET_KEY, ALGORITHM
+from constants import (
+    SECRET_KEY,
+    ALGORITHM,
+    ORDERS_WS_DELTA_BUFFER_SIZE,
+    ORDERS_WS_MAX_CHANNELS,
+    ORDERS_WS_SEND_QUEUE_SIZE,
+    ORDERS_WS_SEND_TIMEOUT_SECONDS,
+    ORDERS_WS_SLOW_CONSUMER_POLICY,
+    ORDERS_WS_PING_INTERVAL_SECONDS,
+    ORDERS_WS_PING_TIMEOUT_SECONDS,
+)
+
+from config.logging_config import setup_logging
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Маркер в очереди соединения: writer сам загрузит и отправит снимок
+SNAPSHOT = object()
+
+
+async def load_orders_snapshot(trader_id: int) -> List[Dict[str, Any]]:
+    """Текущие ордера трейдера; сессия БД открывается только на время запроса."""
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(TraderOrder).filter(TraderOrder.trader_id == trader_id))
+        orders = result.scalars().all()
+    snapshot: List[Dict[str, Any]] = jsonable_encoder([TraderOrderResponse.model_validate(order) for order in orders])
+    return snapshot
+
+
+async def load_order(order_id: int) -> Optional[Dict[str, Any]]:
+    """Один ордер по id — для событий, пришедших без данных (из LISTEN/NOTIFY)."""
+    async with AsyncSessionLocal() as db:
+        order = await db.get(TraderOrder, order_id)
+    if order is None:
+        return None
+    data: Dict[str, Any] = jsonable_encoder(TraderOrderResponse.model_validate(order))
+    return data
+
+
+class TraderChannel:
+    """Последовательность изменений ордеров одного трейдера и буфер последних дельт."""
+
+    def __init__(self, buffer_size: int = ORDERS_WS_DELTA_BUFFER_SIZE) -> None:
+        self.seq = 0
+        self.deltas: Deque[Dict[str, Any]] = deque(maxlen=buffer_size)
+
+    def deltas_since(self, since: int) -> Optional[List[Dict[str, Any]]]:
+        """Дельты с seq > since или None, если буфер уже не покрывает этот промежуток."""
+        if since == self.seq:
+            return []
+        if since > self.seq or not self.deltas or self.deltas[0]["seq"] > since + 1:
+            return None
+        return [delta for delta in self.deltas if delta["seq"] > since]
+
+
+class Connection:
+    """
+    Одно WebSocket-соединение: ограниченная очередь исходящих кадров и собственный writer.
+    Медленный клиент задерживает только свою очередь, а не рассылку остальным.
+    """
+
+    def __init__(self, manager: "WebSocketManager", websocket: WebSocket, trader_id: str, queue_size: int) -> None:
+        self.manager = manager
+        self.websocket = websocket
+        self.trader_id = trader_id
+        self.queue: "asyncio.Queue[Any]" = asyncio.Queue(maxsize=queue_size)
+        self.last_seen = time.monotonic()
+        self.dropped = 0
+        self.closed = False
+        self.closed_by_manager = False  # Закрыто менеджером (heartbeat, медленный клиент), а не сервером
+        self.reader_task: Optional["asyncio.Task[None]"] = None
+        self.writer_task: Optional["asyncio.Task[None]"] = None
+
+    def send(self, frame: Any) -> bool:
+        """Ставит кадр в очередь без ожидания; при переполнении применяет политику медленного клиента."""
+        if self.closed:
+            return False
+        try:
+            self.queue.put_nowait(frame)
+            return True
+        except asyncio.QueueFull:
+            pass
+
+        self.dropped += self.queue.qsize()
+        self.manager.dropped_frames += self.queue.qsize()
+        if self.manager.slow_consumer_policy == "disconnect":
+            logger.warning(f"Slow consumer disconnected, trader_id: {self.trader_id}")
+            self.manager.close_connection(self, code=1013, reason="Client too slow")
+            return False
+
+        # coalesce: накопленные дельты заменяются одним свежим снимком
+        self._drain()
+        self.queue.put_nowait(SNAPSHOT)
+        self.manager.coalesced += 1
+        return True
+
+    def _drain(self) -> None:
+        while not self.queue.empty():
+            self.queue.get_nowait()
+            self.queue.task_done()
+
+    async def run_writer(self) -> None:
+        while True:
+            frame = await self.queue.get()
+            try:
+                if frame is SNAPSHOT:
+                    frame = await self.manager.snapshot_frame(self.trader_id)
+                await asyncio.wait_for(self.websocket.send_json(frame), self.manager.send_timeout)
+                self.manager.sent_frames += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Error sending to trader_id {self.trader_id}: {e}")
+                self.manager.close_connection(self, code=1011, reason="Send failed")
+                return
+            finally:
+                self.queue.task_done()
 
-# Хранилище активных соединений (временное, для примера)
-active_connections: Dict[str, List[WebSocket]] = {}
 
 class WebSocketManager:
-    def __init__(self):
-        self.active_connections = {}
+    """
+    Протокол канала ордеров:
+      orders_snapshot {epoch, seq, orders}        — полный список (при подключении и при resync с разрывом)
+      orders_delta    {epoch, seq, upserted, removed} — изменения, seq растёт на 1 для каждого трейдера
+      ping                                         — heartbeat; клиент отвечает любым сообщением (pong)
+    Клиент, заметивший пропуск seq, отправляет {"type": "resync", "since": seq, "epoch": epoch}.
+    epoch меняется при перезапуске процесса, тогда seq клиента недействителен и отдаётся снимок.
+    """
+
+    def __init__(
+        self,
+        queue_size: int = ORDERS_WS_SEND_QUEUE_SIZE,
+        send_timeout: float = ORDERS_WS_SEND_TIMEOUT_SECONDS,
+        slow_consumer_policy: str = ORDERS_WS_SLOW_CONSUMER_POLICY,
+        ping_interval: float = ORDERS_WS_PING_INTERVAL_SECONDS,
+        ping_timeout: float = ORDERS_WS_PING_TIMEOUT_SECONDS
+    ) -> None:
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self.slow_consumer_policy = slow_consumer_policy
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+        self.active_connections: Dict[str, Set[Connection]] = {}
+        self.epoch = uuid.uuid4().hex[:12]
+        self._channels: "OrderedDict[str, TraderChannel]" = OrderedDict()
+        self._heartbeat_task: Optional["asyncio.Task[None]"] = None
+        # Метрики
+        self.sent_frames = 0
+        self.dropped_frames = 0
+        self.coalesced = 0
+        self.reaped = 0
 
-    async def connect(self, websocket: WebSocket, trader_id: str):
+    def channel(self, trader_id: str) -> TraderChannel:
+        channel = self._channels.get(trader_id)
+        if channel is None:
+            channel = self._channels[trader_id] = TraderChannel()
+            while len(self._channels) > ORDERS_WS_MAX_CHANNELS:
+                self._channels.popitem(last=False)
+        self._channels.move_to_end(trader_id)
+        return channel
+
+    async def snapshot_frame(self, trader_id: str) -> Dict[str, Any]:
+        # seq берётся до чтения из БД: дельты после него клиент применит поверх снимка
+        seq = self.channel(trader_id).seq
+        orders = await load_orders_snapshot(int(trader_id))
+        return {"type": "orders_snapshot", "epoch": self.epoch, "seq": seq, "orders": orders}
+
+    def resync(self, connection: Connection, since: Optional[int], epoch: Optional[str]) -> None:
+        """Досылает пропущенные дельты из буфера, а если их уже нет — полный снимок."""
+        deltas = None
+        if since is not None and epoch == self.epoch:
+            deltas = self.channel(connection.trader_id).deltas_since(since)
+        if deltas is None:
+            connection.send(SNAPSHOT)
+            return
+        for delta in deltas:
+            connection.send(delta)
+
+    async def connect(self, websocket: WebSocket, trader_id: str) -> Connection:
         await websocket.accept()
-        if trader_id not in self.active_connections:
-            self.active_connections[trader_id] = []
-        self.active_connections[trader_id].append(websocket)
-        print(f"WebSocket connection established for trader_id: {trader_id}")  # Отладочный лог
-
-    def disconnect(self, websocket: WebSocket, trader_id: str):
-        if trader_id in self.active_connections and websocket in self.active_connections[trader_id]:
-            self.active_connections[trader_id].remove(websocket)
-            print(f"WebSocket disconnected for trader_id: {trader_id}")  # Отладочный лог
-            if not self.active_connections[trader_id]:
-                del self.active_connections[trader_id]
-
-    async def broadcast(self, trader_id: str, message: dict):
-        if trader_id in self.active_connections:
-            for connection in self.active_connections[trader_id]:
-                try:
-                    await connection.send_json(message)
-                except Exception as e:
-                    print(f"Error broadcasting to trader_id {trader_id}: {e}")
+        connection = Connection(self, websocket, trader_id, self.queue_size)
+        connection.reader_task = asyncio.current_task()
+        connection.writer_task = asyncio.create_task(connection.run_writer())
+        self.active_connections.setdefault(trader_id, set()).add(connection)
+        logger.info(f"WebSocket connection established for trader_id: {trader_id}")
+        return connection
+
+    def disconnect(self, connection: Connection) -> None:
+        connection.closed = True
+        connections = self.active_connections.get(connection.trader_id)
+        if connections is not None and connection in connections:
+            connections.discard(connection)
+            logger.info(f"WebSocket disconnected for trader_id: {connection.trader_id}")
+            if not connections:
+                del self.active_connections[connection.trader_id]
+        if connection.writer_task is not None and connection.writer_task is not asyncio.current_task():
+            connection.writer_task.cancel()
+
+    def close_connection(self, connection: Connection, code: int, reason: str) -> None:
+        """Принудительно закрывает соединение: снимает его с учёта и останавливает обработчик."""
+        if connection.closed:
+            return
+        connection.closed_by_manager = True
+        self.disconnect(connection)
+        asyncio.get_running_loop().create_task(self._close_socket(connection.websocket, code, reason))
+        if connection.reader_task is not None and connection.reader_task is not asyncio.current_task():
+            connection.reader_task.cancel()
+
+    async def serve(self, connection: Connection, since: Optional[int] = None, epoch: Optional[str] = None) -> None:
+        """Цикл чтения сообщений клиента; возвращается, когда соединение закрыто."""
+        try:
+            # Снимок (или досылка пропущенного при переподключении); дальше — только дельты
+            self.resync(connection, since, epoch)
+
+            while True:
+                data = await connection.websocket.receive_text()
+                connection.last_seen = time.monotonic()
+                message = json.loads(data)
+
+                if message.get("type") == "subscribe":
+                    connection.send(SNAPSHOT)
+                elif message.get("type") == "resync":
+                    self.resync(connection, message.get("since"), message.get("epoch"))
+                # "pong" и прочие сообщения лишь продлевают heartbeat
+
+        except WebSocketDisconnect as e:
+            logger.info(f"WebSocket disconnected for trader_id {connection.trader_id}: {e.code}, {e.reason}")
+        except asyncio.CancelledError:
+            # Гасим только отмену от close_connection; остановка сервера и прочие отмены идут дальше
+            task = asyncio.current_task()
+            if not connection.closed_by_manager or task is None:
+                raise
+            task.uncancel()
+        except Exception as e:
+            logger.error(f"WebSocket error for trader_id {connection.trader_id}: {e}")
+        finally:
+            self.disconnect(connection)
+
+    async def _close_socket(self, websocket: WebSocket, code: int, reason: str) -> None:
+        try:
+            await asyncio.wait_for(websocket.close(code=code, reason=reason), self.send_timeout)
+        except Exception:
+            pass
+
+    def broadcast(self, trader_id: str, message: Dict[str, Any]) -> None:
+        for connection in list(self.active_connections.get(trader_id, ())):
+            connection.send(message)
+
+    async def handle_order_event(self, event: OrderEvent) -> None:
+        """Подписчик шины событий: рассылает изменение ордера сокетам его трейдера."""
+        if event.kind != TRADER_ORDER:
+            return
+        trader_id = str(event.owner_id)
+        connected = trader_id in self.active_connections
+        if not connected and trader_id not in self._channels:
+            return
+
+        channel = self.channel(trader_id)
+        data = event.data
+        if event.action != DELETE and data is None:
+            if not connected:
+                # Событие из другого процесса без данных, а сокетов нет — не ходим в БД,
+                # просто сбрасываем буфер: переподключившийся клиент получит снимок
+                channel.seq += 1
+                channel.deltas.clear()
+                return
+            data = await load_order(event.order_id)
+
+        channel.seq += 1
+        message: Dict[str, Any]
+        if event.action == DELETE or data is None:
+            message = {"type": "orders_delta", "epoch": self.epoch, "seq": channel.seq, "upserted": [], "removed": [event.order_id]}
+        else:
+            message = {"type": "orders_delta", "epoch": self.epoch, "seq": channel.seq, "upserted": [data], "removed": []}
+        channel.deltas.append(message)
+        self.broadcast(trader_id, message)
+
+    def heartbeat(self) -> None:
+        """Один проход heartbeat: закрывает молчащие соединения, остальным шлёт ping."""
+        now = time.monotonic()
+        for connections in list(self.active_connections.values()):
+            for connection in list(connections):
+                if now - connection.last_seen > self.ping_timeout:
+                    logger.info(f"Reaping silent WebSocket for trader_id: {connection.trader_id}")
+                    self.reaped += 1
+                    self.close_connection(connection, code=1001, reason="Heartbeat timeout")
+                else:
+                    connection.send({"type": "ping"})
+
+    async def _run_heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            try:
+                self.heartbeat()
+            except Exception as e:
+                logger.error(f"WebSocket heartbeat error: {e}")
+
+    def start_heartbeat(self) -> None:
+        if self._heartbeat_task is None:
+            self._heartbeat_task = asyncio.create_task(self._run_heartbeat())
+
+    async def stop_heartbeat(self) -> None:
+        if self._heartbeat_task is None:
+            return
+        self._heartbeat_task.cancel()
+        try:
+            await self._heartbeat_task
+        except asyncio.CancelledError:
+            pass
+        self._heartbeat_task = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Метрики менеджера: соединения, глубина очередей, потерянные кадры."""
+        depths = [c.queue.qsize() for connections in self.active_connections.values() for c in connections]
+        return {
+            "connections": len(depths),
+            "traders": len(self.active_connections),
+            "queue_depth_total": sum(depths),
+            "queue_depth_max": max(depths, default=0),
+            "sent_frames": self.sent_frames,
+            "dropped_frames": self.dropped_frames,
+            "coalesced": self.coalesced,
+            "reaped": self.reaped,
+        }
 
 # Создаем экземпляр менеджера WebSocket
 websocket_manager = WebSocketManager()
 
-async def get_websocket_router():
-    from fastapi import APIRouter
 
+async def start_order_updates() -> None:
+    """Подключает менеджер к шине событий ордеров (вызывается при старте приложения)."""
+    order_events.subscribe(websocket_manager.handle_order_event)
+    await order_events.start()
+    websocket_manager.start_heartbeat()
+
+
+async def stop_order_updates() -> None:
+    await websocket_manager.stop_heartbeat()
+    order_events.unsubscribe(websocket_manager.handle_order_event)
+    await order_events.stop()
+
+
+async def get_websocket_router() -> APIRouter:
     router = APIRouter(prefix="/ws", tags=["WebSockets"])
 
     @router.websocket("/orders/{trader_id}")
-    async def websocket_orders(websocket: WebSocket, trader_id: str, token: str = Query(..., description="JWT token for authentication")):
+    async def websocket_orders(
+        websocket: WebSocket,
+        trader_id: str,
+        token: str = Query(..., description="JWT token for authentication"),
+        since: Optional[int] = Query(None, description="Last seq seen by the client, to resume without a snapshot"),
+        epoch: Optional[str] = Query(None, description="Epoch of the server that issued `since`")
+    ) -> None:
         # Авторизация трейдера через токен
         try:
             payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
@@ -57,64 +374,24 @@ async def get_websocket_router():
             if not user_email:
                 await websocket.close(code=1008, reason="Invalid token")  # Policy Violation
                 return
-            print(f"Decoded token for trader_id: {trader_id}, email: {user_email}")  # Отладочный лог
         except JWTError as e:
-            print(f"JWT decoding error for trader_id {trader_id}: {e}")
+            logger.warning(f"JWT decoding error for trader_id {trader_id}: {e}")
             await websocket.close(code=1008, reason="Invalid token")
             return
 
-        # Получаем сессию базы данных
-        async for db in get_async_db():  # Используем асинхронный итератор для правильной работы с get_async_db
-            try:
-                trader = await get_current_trader(token, db)  # Используем get_current_trader для авторизации
-                if not trader or str(trader.id) != trader_id:
-                    await websocket.close(code=1008, reason="Unauthorized trader")
-                    return
-            except Exception as e:
-                print(f"Error authenticating trader_id {trader_id}: {e}")
-                await websocket.close(code=1008, reason="Authentication failed")
+        # Сессия нужна только для проверки трейдера (обычно ответ берётся из кэша токенов)
+        try:
+            async with AsyncSessionLocal() as db:
+                trader = await get_current_trader(token, db)
+            if not trader or str(trader.id) != trader_id:
+                await websocket.close(code=1008, reason="Unauthorized trader")
                 return
+        except Exception as e:
+            logger.warning(f"Error authenticating trader_id {trader_id}: {e}")
+            await websocket.close(code=1008, reason="Authentication failed")
+            return
 
-            await websocket_manager.connect(websocket, trader_id)
-
-            try:
-                # Получаем текущие ордера трейдера
-                result = await db.execute(select(TraderOrder).filter(TraderOrder.trader_id == int(trader_id)))
-                orders = result.scalars().all()
-                orders_response = [TraderOrderResponse.from_orm(order) for order in orders]
-                await websocket_manager.broadcast(trader_id, {"type": "orders_update", "orders": orders_response})
-                print(f"Initial orders broadcast for trader_id: {trader_id}")  # Отладочный лог
-
-                while True:
-                    # Получаем данные от клиента (если есть)
-                    data = await websocket.receive_text()
-                    message = json.loads(data)
-                    print(f"Received message for trader_id {trader_id}: {message}")  # Отладочный лог
-
-                    # Обработка сообщений от клиента (например, подписка)
-                    if message.get("type") == "subscribe":
-                        result = await db.execute(select(TraderOrder).filter(TraderOrder.trader_id == int(trader_id)))
-                        orders = result.scalars().all()
-                        orders_response = [TraderOrderResponse.from_orm(order) for order in orders]
-                        await websocket_manager.broadcast(trader_id, {"type": "orders_update", "orders": orders_response})
-                        print(f"Subscribed and broadcast orders for trader_id: {trader_id}")
-
-                    # Симуляция периодических обновлений (замени на реальную логику)
-                    await asyncio.sleep(5)  # Обновление каждые 5 секунд
-                    result = await db.execute(select(TraderOrder).filter(TraderOrder.trader_id == int(trader_id)))
-                    updated_orders = result.scalars().all()
-                    updated_orders_response = [TraderOrderResponse.from_orm(order) for order in updated_orders]
-                    await websocket_manager.broadcast(trader_id, {"type": "orders_update", "orders": updated_orders_response})
-                    print(f"Periodic update broadcast for trader_id: {trader_id}")
-
-            except WebSocketDisconnect as e:
-                print(f"WebSocket disconnected for trader_id {trader_id}: {e.code}, {e.reason}")
-                websocket_manager.disconnect(websocket, trader_id)
-            except Exception as e:
-                print(f"WebSocket error for trader_id {trader_id}: {e}")
-                await websocket_manager.broadcast(trader_id, {"type": "error", "message": str(e)})
-                websocket_manager.disconnect(websocket, trader_id)
-            finally:
-                await db.close()  # Закрываем сессию базы данных
+        connection = await websocket_manager.connect(websocket, trader_id)
+        await websocket_manager.serve(connection, since, epoch)
 
-    return router
\ No newline at end of file
+    return router
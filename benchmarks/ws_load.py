@@ -0,0 +1,402 @@
+# benchmarks/ws_load.py
+"""
+Нагрузочный тест канала /api/v1/ws/orders/{trader_id}.
+
+Фазы:
+  1. seed      — N трейдеров с M ордерами в локальной БД (DATABASE_URL);
+  2. connect   — C аутентифицированных сокетов, скорость установки соединений;
+  3. idle      — запросы к БД в секунду, пока сокеты просто подключены;
+  4. mutate    — изменения ордеров через REST API и задержка доставки дельт по сокетам.
+
+Каждый ордер проходит MUTATION_PATH (pending -> processing -> waiting_confirmation -> completed),
+поэтому ордер даёт не больше трёх изменений; seed каждый раз дополняет трейдеров свежими
+pending-ордерами до --orders.
+
+Память на соединение считается по VmRSS процесса WebSocket-сервера (--ws-pid),
+запросы к БД — по pg_stat_database (xact_commit + xact_rollback).
+
+Пример:
+    python websocket_server.py &   # ORDER_EVENTS_BACKEND=postgres, если API — отдельный процесс
+    python server.py &
+    python benchmarks/ws_load.py --traders 200 --orders 50 --connections 2000 --mutations 500 --ws-pid <pid>
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import timedelta
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import httpx
+from sqlalchemy import Result, delete, func, insert, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from api.auth import create_access_token
+from api.enums import OrderStatus, TraderFiatEnum, TraderOrderTypeEnum, TraderPaymentMethodEnum
+from database.init_db import (
+    AsyncSessionLocal,
+    BanksTrader,
+    FiatCurrencyTrader,
+    PaymentMethodTrader,
+    ReqTrader,
+    TimeZone,
+    Trader,
+    TraderOrder,
+    engine,
+)
+
+try:
+    import websockets
+except ImportError:  # websockets нужен только для этого инструмента
+    websockets = None
+
+EMAIL_TEMPLATE = "ws-bench-{}@bench.local"
+EMAIL_PATTERN = "ws-bench-%@bench.local"
+BENCH_BANK = "ws-bench-bank"
+
+# Допустимые по TRADER_ORDER_TRANSITIONS шаги ордера; каждый меняет статус и публикует событие
+MUTATION_PATH = (OrderStatus.processing, OrderStatus.waiting_confirmation, OrderStatus.completed)
+
+# (trader_id, email, [id pending-ордера, ...])
+BenchTrader = Tuple[int, str, List[int]]
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def rss_kb(pid: Optional[int]) -> Optional[int]:
+    if pid is None:
+        return None
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return None
+
+
+async def db_transactions() -> int:
+    async with engine.connect() as conn:
+        result = await conn.execute(text(
+            "SELECT xact_commit + xact_rollback FROM pg_stat_database WHERE datname = current_database()"
+        ))
+        return int(result.scalar())
+
+
+async def _get_or_create(db: AsyncSession, model: Any, lookup: Dict[str, Any], defaults: Dict[str, Any]) -> Any:
+    result = await db.execute(select(model).filter_by(**lookup))
+    row = result.scalars().first()
+    if row is None:
+        row = model(**lookup, **defaults)
+        db.add(row)
+        await db.flush()
+    return row
+
+
+async def seed(traders: int, orders: int) -> List[BenchTrader]:
+    """
+    Создаёт (или переиспользует) трейдеров стенда и дополняет их pending-ордерами до `orders`;
+    возвращает [(trader_id, email, [id pending-ордера, ...])].
+    """
+    async with AsyncSessionLocal() as db:
+        time_zone = await _get_or_create(
+            db, TimeZone, {"name": "Etc/UTC"}, {"display_name": "(UTC+00:00) UTC", "utc_offset": 0}
+        )
+        fiat = await _get_or_create(db, FiatCurrencyTrader, {"currency_name": "RUB"}, {})
+        method = await _get_or_create(db, PaymentMethodTrader, {"method_name": TraderPaymentMethodEnum.CARD}, {})
+        await _get_or_create(db, BanksTrader, {"bank_name": BENCH_BANK}, {"method_name": TraderPaymentMethodEnum.CARD})
+
+        existing: Result[Any] = await db.execute(select(Trader.email).where(Trader.email.like(EMAIL_PATTERN)))
+        existing_emails = set(existing.scalars().all())
+        new_rows = [
+            {
+                "email": EMAIL_TEMPLATE.format(i),
+                "password_hash": "!",  # вход по паролю стенду не нужен
+                "time_zone_id": time_zone.id,
+                "fiat_currency_id": fiat.id,
+                "pay_in": True,
+                "pay_out": True,
+            }
+            for i in range(traders) if EMAIL_TEMPLATE.format(i) not in existing_emails
+        ]
+        if new_rows:
+            await db.execute(insert(Trader), new_rows)
+
+        emails = [EMAIL_TEMPLATE.format(i) for i in range(traders)]
+        result = await db.execute(select(Trader.id, Trader.email).where(Trader.email.in_(emails)))
+        id_by_email = {email: trader_id for trader_id, email in result.all()}
+        trader_ids = list(id_by_email.values())
+
+        # Реквизит и ордера — только для трейдеров, у которых не хватает pending-ордеров
+        # (ордера прошлых запусков уже прошли MUTATION_PATH)
+        result = await db.execute(
+            select(TraderOrder.trader_id, func.count())
+            .where(TraderOrder.trader_id.in_(trader_ids), TraderOrder.status == OrderStatus.pending)
+            .group_by(TraderOrder.trader_id)
+        )
+        seeded = dict(result.all())
+        to_seed = [trader_id for trader_id in trader_ids if seeded.get(trader_id, 0) < orders]
+        if to_seed:
+            result = await db.execute(
+                insert(ReqTrader).returning(ReqTrader.id, ReqTrader.trader_id),
+                [
+                    {"trader_id": trader_id, "payment_method": "CARD", "bank": BENCH_BANK,
+                     "req_number": f"2200{trader_id:012d}", "fio": "Bench Trader", "can_buy": True, "can_sell": True}
+                    for trader_id in to_seed
+                ]
+            )
+            req_by_trader = {trader_id: req_id for req_id, trader_id in result.all()}
+            order_rows = [
+                {
+                    "trader_id": trader_id,
+                    "trader_req_id": req_by_trader[trader_id],
+                    "order_type": random.choice(list(TraderOrderTypeEnum)),
+                    "currency": "USDT",
+                    "fiat": TraderFiatEnum.RUB,
+                    "amount_currency": Decimal("10"),
+                    "total_fiat": Decimal("1000"),
+                    "median_rate": Decimal("100"),
+                    "status": OrderStatus.pending,
+                    "payment_method_id": method.id,
+                }
+                for trader_id in to_seed
+                for _ in range(orders - seeded.get(trader_id, 0))
+            ]
+            for start in range(0, len(order_rows), 5000):
+                await db.execute(insert(TraderOrder), order_rows[start:start + 5000])
+        await db.commit()
+
+        result = await db.execute(
+            select(TraderOrder.trader_id, TraderOrder.id)
+            .where(TraderOrder.trader_id.in_(trader_ids), TraderOrder.status == OrderStatus.pending)
+        )
+        orders_by_trader: Dict[int, List[int]] = {}
+        for trader_id, order_id in result.all():
+            orders_by_trader.setdefault(trader_id, []).append(order_id)
+
+    return [(trader_id, email, orders_by_trader.get(trader_id, [])) for email, trader_id in id_by_email.items()]
+
+
+async def cleanup() -> None:
+    async with AsyncSessionLocal() as db:
+        ids = select(Trader.id).where(Trader.email.like(EMAIL_PATTERN)).scalar_subquery()
+        await db.execute(delete(TraderOrder).where(TraderOrder.trader_id.in_(ids)))
+        await db.execute(delete(ReqTrader).where(ReqTrader.trader_id.in_(ids)))
+        await db.execute(delete(Trader).where(Trader.email.like(EMAIL_PATTERN)))
+        await db.commit()
+
+
+class BenchClient:
+    """Один сокет: считает кадры и время доставки ожидаемых изменений."""
+
+    def __init__(self, trader_id: int, pending: Dict[int, float], latencies: List[float]):
+        self.trader_id = trader_id
+        self.pending = pending
+        self.latencies = latencies
+        self.frames = 0
+        self.ws: Any = None
+        self.task: Optional["asyncio.Task[None]"] = None
+
+    async def open(self, ws_url: str, token: str) -> float:
+        started = time.perf_counter()
+        self.ws = await websockets.connect(f"{ws_url}/{self.trader_id}?token={token}", max_queue=None)
+        # Соединение готово, когда пришёл первый снимок
+        json.loads(await self.ws.recv())
+        elapsed = time.perf_counter() - started
+        self.task = asyncio.create_task(self._read())
+        return elapsed
+
+    async def _read(self) -> None:
+        async for raw in self.ws:
+            received_at = time.perf_counter()
+            self.frames += 1
+            frame = json.loads(raw)
+            if frame.get("type") == "ping":
+                await self.ws.send(json.dumps({"type": "pong"}))
+            elif frame.get("type") == "orders_delta":
+                for order in frame.get("upserted", []):
+                    sent_at = self.pending.get(order["id"])
+                    if sent_at is not None:
+                        self.latencies.append(received_at - sent_at)
+
+    async def close(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+        if self.ws is not None:
+            await self.ws.close()
+
+
+async def open_connections(
+    args: argparse.Namespace,
+    traders: List[BenchTrader],
+    tokens: Dict[int, str],
+    pending: Dict[int, float],
+    latencies: List[float],
+) -> Tuple[List[BenchClient], List[float], float]:
+    semaphore = asyncio.Semaphore(args.connect_concurrency)
+    clients = [BenchClient(traders[i % len(traders)][0], pending, latencies) for i in range(args.connections)]
+    setup_times: List[float] = []
+    failures = 0
+
+    async def open_one(client: BenchClient) -> None:
+        nonlocal failures
+        async with semaphore:
+            try:
+                setup_times.append(await client.open(args.ws_url, tokens[client.trader_id]))
+            except Exception as e:
+                failures += 1
+                if failures <= 5:
+                    print(f"  connect failed for trader {client.trader_id}: {e}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(open_one(client) for client in clients))
+    elapsed = time.perf_counter() - started
+    if failures:
+        print(f"  {failures} connections failed")
+    return [c for c in clients if c.task is not None], setup_times, elapsed
+
+
+async def mutate(
+    args: argparse.Namespace, traders: List[BenchTrader], tokens: Dict[int, str], pending: Dict[int, float]
+) -> Tuple[int, int, float]:
+    """
+    Проводит pending-ордера по MUTATION_PATH через REST API с ограниченной параллельностью.
+    Шаги одного ордера идут последовательно, поэтому каждый запрос — допустимый переход.
+    Возвращает (отправлено, ошибок, секунд).
+    """
+    orders = [(trader_id, order_id) for trader_id, _, order_ids in traders for order_id in order_ids]
+    random.shuffle(orders)
+    capacity = len(orders) * len(MUTATION_PATH)
+    if capacity < args.mutations:
+        print(f"  only {len(orders)} pending orders: sending {capacity} mutations (raise --orders or --traders)")
+
+    semaphore = asyncio.Semaphore(args.mutation_concurrency)
+    sent = 0
+    errors = 0
+
+    async with httpx.AsyncClient(base_url=args.api_url, timeout=30.0) as client:
+        async def walk(trader_id: int, order_id: int, steps: int) -> None:
+            nonlocal sent, errors
+            for status in MUTATION_PATH[:steps]:
+                async with semaphore:
+                    pending[order_id] = time.perf_counter()
+                    response = await client.put(
+                        f"/api/v1/trader_orders/{order_id}",
+                        json={"status": status.value},
+                        headers={"Authorization": f"Bearer {tokens[trader_id]}"}
+                    )
+                    sent += 1
+                    if response.status_code != 200:
+                        errors += 1
+                if args.mutation_interval:
+                    await asyncio.sleep(args.mutation_interval)
+
+        walks = []
+        remaining = args.mutations
+        for trader_id, order_id in orders:
+            if remaining <= 0:
+                break
+            steps = min(len(MUTATION_PATH), remaining)
+            walks.append(walk(trader_id, order_id, steps))
+            remaining -= steps
+
+        started = time.perf_counter()
+        await asyncio.gather(*walks)
+        return sent, errors, time.perf_counter() - started
+
+
+def report_latencies(title: str, values: List[float]) -> None:
+    if not values:
+        print(f"{title}: no samples")
+        return
+    ms = [v * 1000 for v in values]
+    print(
+        f"{title}: n={len(ms)} mean={statistics.mean(ms):.1f}ms "
+        f"p50={percentile(ms, 50):.1f}ms p95={percentile(ms, 95):.1f}ms "
+        f"p99={percentile(ms, 99):.1f}ms max={max(ms):.1f}ms"
+    )
+
+
+async def run(args: argparse.Namespace) -> None:
+    if args.cleanup:
+        await cleanup()
+        print("Bench traders removed")
+        return
+    if websockets is None:
+        sys.exit("The `websockets` package is required: pip install websockets")
+
+    print(f"Seeding {args.traders} traders x {args.orders} orders...")
+    started = time.perf_counter()
+    traders = await seed(args.traders, args.orders)
+    print(f"  done in {time.perf_counter() - started:.1f}s")
+
+    tokens = {
+        trader_id: create_access_token({"sub": email, "type": "trader"}, expires_delta=timedelta(hours=2))
+        for trader_id, email, _ in traders
+    }
+    pending: Dict[int, float] = {}
+    latencies: List[float] = []
+
+    rss_before = rss_kb(args.ws_pid)
+    print(f"Opening {args.connections} sockets (concurrency {args.connect_concurrency})...")
+    clients, setup_times, elapsed = await open_connections(args, traders, tokens, pending, latencies)
+    print(f"  {len(clients)} connected in {elapsed:.1f}s, {len(clients) / elapsed:.0f} conn/s")
+    report_latencies("  setup (connect + snapshot)", setup_times)
+
+    rss_after = rss_kb(args.ws_pid)
+    if rss_before is not None and rss_after is not None and clients:
+        print(f"  ws server RSS {rss_before / 1024:.0f}MB -> {rss_after / 1024:.0f}MB, "
+              f"{(rss_after - rss_before) / len(clients):.1f}KB per connection")
+
+    if args.idle_seconds:
+        before = await db_transactions()
+        await asyncio.sleep(args.idle_seconds)
+        idle_rate = (await db_transactions() - before - 1) / args.idle_seconds
+        print(f"Idle for {args.idle_seconds}s: {idle_rate:.1f} db transactions/s")
+
+    print(f"Sending {args.mutations} order mutations (concurrency {args.mutation_concurrency})...")
+    before = await db_transactions()
+    sent, errors, elapsed = await mutate(args, traders, tokens, pending)
+    await asyncio.sleep(args.drain_seconds)  # даём дельтам дойти
+    transactions = await db_transactions() - before - 1
+    print(f"  {sent - errors} ok, {errors} failed in {elapsed:.1f}s ({sent / elapsed:.0f} req/s)")
+    print(f"  {transactions / (elapsed + args.drain_seconds):.1f} db transactions/s during the mutation phase")
+    report_latencies("  request-to-delivery", latencies)
+    print(f"  frames received: {sum(c.frames for c in clients)}")
+
+    await asyncio.gather(*(c.close() for c in clients), return_exceptions=True)
+    await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test for the trader orders WebSocket channel")
+    parser.add_argument("--traders", type=int, default=100, help="traders to seed")
+    parser.add_argument("--orders", type=int, default=50, help="orders per trader")
+    parser.add_argument("--connections", type=int, default=1000, help="sockets to open, spread over traders")
+    parser.add_argument("--connect-concurrency", type=int, default=200)
+    parser.add_argument("--mutations", type=int, default=500, help="order updates to send through the REST API")
+    parser.add_argument("--mutation-concurrency", type=int, default=20)
+    parser.add_argument("--mutation-interval", type=float, default=0.0, help="pause after each mutation, seconds")
+    parser.add_argument("--idle-seconds", type=float, default=5.0, help="measure DB load with idle sockets (0 to skip)")
+    parser.add_argument("--drain-seconds", type=float, default=2.0, help="wait for in-flight deltas after mutations")
+    parser.add_argument("--api-url", default="http://localhost:8000")
+    parser.add_argument("--ws-url", default="ws://localhost:8001/api/v1/ws/orders")
+    parser.add_argument("--ws-pid", type=int, default=None, help="pid of the WebSocket server, for RSS per connection")
+    parser.add_argument("--cleanup", action="store_true", help="delete bench traders and their orders, then exit")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,111 @@
 # config/logging_config.py
+import atexit
+import json
 import logging
-from logging.handlers import RotatingFileHandler
+import queue
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Optional
 
+from config.settings import settings
 
-def setup_logging():
-    """Настройка логирования для приложения."""
-    # Создание логгера
+# Идентификатор текущего HTTP-запроса (выставляется middleware в server.py)
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# Стандартные атрибуты LogRecord — всё остальное считается полями из extra
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id"}
+
+_listener: Optional[QueueListener] = None
+
+
+class RequestIdFilter(logging.Filter):
+    """Добавляет request_id из контекста к каждой записи."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "request_id"):
+            record.request_id = request_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON-строка на запись: время, уровень, логгер, сообщение, request_id и поля из extra."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def _make_formatter() -> logging.Formatter:
+    if settings.log_format == "json":
+        return JsonFormatter()
+    return logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+
+def _stop_listener() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def setup_logging() -> logging.Logger:
+    """
+    Настройка логирования для приложения. Повторные вызовы ничего не меняют.
+
+    Логгеры пишут в очередь через QueueHandler, а запись в консоль и файл
+    выполняет поток QueueListener — ввод-вывод не блокирует цикл событий.
+    """
+    global _listener
     logger = logging.getLogger("JE")  # Название логгера может быть любым
-    logger.setLevel(logging.INFO)  # Уровень логирования
+    if _listener is not None:
+        return logger
+
+    formatter = _make_formatter()
 
     # Обработчик для консоли
     console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.INFO)
+    console_handler.setLevel(settings.log_level)
+    console_handler.setFormatter(formatter)
+
+    handlers: list[logging.Handler] = [console_handler]
 
     # Обработчик для файла с ротацией
-    file_handler = RotatingFileHandler("app.log", maxBytes=10**6, backupCount=3)
-    file_handler.setLevel(logging.ERROR)  # Логировать только ошибки в файл
+    if settings.log_file:
+        file_handler = RotatingFileHandler(settings.log_file, maxBytes=10**6, backupCount=3)
+        file_handler.setLevel(logging.ERROR)  # Логировать только ошибки в файл
+        file_handler.setFormatter(formatter)
+        handlers.append(file_handler)
 
-    # Форматтер
-    formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
-    console_handler.setFormatter(formatter)
-    file_handler.setFormatter(formatter)
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(RequestIdFilter())
+
+    # "JE" и его потомки (JE.requests) — уровень из настроек; логгеры модулей
+    # идут через корневой логгер с уровнем по умолчанию (WARNING)
+    logger.setLevel(settings.log_level)
+    logger.addHandler(queue_handler)
+    logger.propagate = False
+    logging.getLogger().addHandler(queue_handler)
 
-    # Добавление обработчиков к логгеру
-    logger.addHandler(console_handler)
-    logger.addHandler(file_handler)
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_stop_listener)
 
     return logger
 
 # Инициализация логирования при импорте этого модуля
-logger = setup_logging()
\ No newline at end of file
+logger = setup_logging()
@@ -1,8 +1,11 @@
 import asyncio
 from typing import AsyncGenerator
 from decimal import Decimal
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
-from constants import DATABASE_URL
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession, async_sessionmaker
+from config.settings import settings
+from database.pool_metrics import TimedAsyncAdaptedQueuePool
+from database.read_routing import read_marker, replica_router
+from fastapi import Request
 from sqlalchemy.orm import (
     declarative_base,
     relationship,
@@ -13,6 +16,7 @@ from contextlib import asynccontextmanager
 from sqlalchemy import (
     Column,
     Integer,
+    BigInteger,
     String,
     ForeignKey,
     Boolean,
@@ -20,6 +24,10 @@ from sqlalchemy import (
     DECIMAL,
     TIMESTAMP,
     Enum,
+    JSON,
+    Index,
+    UniqueConstraint,
+    CheckConstraint,
 )
 from datetime import datetime
 from api.enums import (
@@ -34,11 +42,33 @@ from api.enums import (
     TraderVerificationLevelEnum,
     TraderAddressStatusEnum,
     TraderOrderTypeEnum,
-    TraderFiatEnum
+    TraderFiatEnum,
+    BalanceLedgerEntryType
 )
 
-# Создание асинхронного движка SQLAlchemy
-engine = create_async_engine(DATABASE_URL, echo=True, future=True)
+def _create_engine(url: str) -> AsyncEngine:
+    return create_async_engine(
+        url,
+        echo=settings.db_echo,
+        future=True,
+        poolclass=TimedAsyncAdaptedQueuePool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        pool_pre_ping=settings.db_pool_pre_ping,
+        connect_args={
+            "prepared_statement_cache_size": settings.db_prepared_statement_cache_size,
+            "statement_cache_size": settings.db_asyncpg_statement_cache_size,
+        },
+    )
+
+
+# Создание асинхронного движка SQLAlchemy (параметры пула — из config/settings.py)
+engine = _create_engine(settings.database_url)
+
+# Движок реплики для чтения; без DATABASE_REPLICA_URL используется основной
+replica_engine = _create_engine(settings.database_replica_url) if settings.database_replica_url else engine
 
 # Базовый класс для моделей
 Base = declarative_base()
@@ -52,6 +82,15 @@ AsyncSessionLocal = async_sessionmaker(
     autoflush=False
 )
 
+# Фабрика сессий только для чтения (реплика)
+AsyncReplicaSessionLocal = async_sessionmaker(
+    replica_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+    autocommit=False,
+    autoflush=False
+)
+
 # Определение моделей
 
 class Role(Base):
@@ -205,14 +244,52 @@ class ExchangeRate(Base):
     __tablename__ = "exchange_rates"
 
     id = Column(Integer, primary_key=True, index=True)
-    currency = Column(String(10), nullable=False)
+    currency = Column(String(10), unique=True, nullable=False)  # Нужен для ON CONFLICT (currency)
     buy_rate = Column(DECIMAL(20, 8), nullable=False)
     sell_rate = Column(DECIMAL(20, 8), nullable=False)
     median_rate = Column(DECIMAL(20, 8), nullable=False)
     source = Column(String(255), nullable=False)
+    # Стакан Garantex на момент обновления: процессы, не получающие курсы сами, читают его отсюда
+    order_book = Column(JSON, nullable=True)
     updated_at = Column(TIMESTAMP, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 
+class ExchangeRateTick(Base):
+    """Журнал всех полученных курсов (только вставка), по одной строке на валюту за обновление."""
+    __tablename__ = "exchange_rate_ticks"
+
+    id = Column(BigInteger, primary_key=True)
+    currency = Column(String(10), nullable=False)
+    buy_rate = Column(DECIMAL(20, 8), nullable=False)
+    sell_rate = Column(DECIMAL(20, 8), nullable=False)
+    median_rate = Column(DECIMAL(20, 8), nullable=False)
+    source = Column(String(255), nullable=False)
+    created_at = Column(TIMESTAMP, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_exchange_rate_ticks_currency_created_at", "currency", "created_at"),
+    )
+
+
+class ExchangeRateBar(Base):
+    """OHLC-свечи по median_rate, агрегированные из exchange_rate_ticks (1m) и из минутных свечей (1h)."""
+    __tablename__ = "exchange_rate_bars"
+
+    id = Column(BigInteger, primary_key=True)
+    currency = Column(String(10), nullable=False)
+    resolution = Column(String(4), nullable=False)  # "1m" или "1h"
+    bucket_start = Column(TIMESTAMP, nullable=False)
+    open = Column(DECIMAL(20, 8), nullable=False)
+    high = Column(DECIMAL(20, 8), nullable=False)
+    low = Column(DECIMAL(20, 8), nullable=False)
+    close = Column(DECIMAL(20, 8), nullable=False)
+    tick_count = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("currency", "resolution", "bucket_start", name="uq_exchange_rate_bars_bucket"),
+    )
+
+
 class ExchangeOrder(Base):
     __tablename__ = "exchange_orders"
 
@@ -224,6 +301,7 @@ class ExchangeOrder(Base):
     total_rub = Column(DECIMAL(20, 2), nullable=False)
     median_rate = Column(DECIMAL(20, 8), nullable=False)
     status = Column(Enum(OrderStatus, name='orderstatus'), nullable=False, default=OrderStatus.pending)
+    version = Column(Integer, nullable=False, default=1, server_default="1")  # Растёт при каждом переходе статуса
     created_at = Column(TIMESTAMP, default=datetime.utcnow)
     updated_at = Column(TIMESTAMP, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -240,6 +318,15 @@ class ExchangeOrder(Base):
     payments = relationship("Payment", back_populates="order", cascade="all, delete-orphan")
     payment_method = relationship("PaymentMethod", back_populates="orders")
 
+    __table_args__ = (
+        Index("ix_exchange_orders_user_created_id", "user_id", "created_at", "id"),
+        # Поиск просроченных заявок сборщиком истёкших (api/services/order_expiry.py)
+        Index(
+            "ix_exchange_orders_open_status_created", "status", "created_at",
+            postgresql_where=status.in_([OrderStatus.pending, OrderStatus.processing])
+        ),
+    )
+
 
 class Payment(Base):
     __tablename__ = "payments"
@@ -286,6 +373,7 @@ class TraderOrder(Base):
     total_fiat = Column(DECIMAL(20, 2), nullable=False)
     median_rate = Column(DECIMAL(20, 8), nullable=False)
     status = Column(Enum(OrderStatus, name='orderstatus'), nullable=False, default=OrderStatus.pending)
+    version = Column(Integer, nullable=False, default=1, server_default="1")  # Растёт при каждом переходе статуса
     created_at = Column(TIMESTAMP, default=datetime.utcnow)
     updated_at = Column(TIMESTAMP, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -296,7 +384,15 @@ class TraderOrder(Base):
     trader = relationship("Trader", back_populates="orders")
     payment_method = relationship("PaymentMethodTrader", back_populates="orders")
     trader_req = relationship('ReqTrader', back_populates='orders')  # Relationship with trader's requisite
-    
+
+    __table_args__ = (
+        Index("ix_trader_orders_trader_created_id", "trader_id", "created_at", "id"),
+        # Поиск просроченных ордеров сборщиком истёкших (api/services/order_expiry.py)
+        Index(
+            "ix_trader_orders_open_status_created", "status", "created_at",
+            postgresql_where=status.in_([OrderStatus.pending, OrderStatus.processing])
+        ),
+    )
 
 
 class PaymentMethodTrader(Base):
@@ -373,11 +469,60 @@ class BalanceTrader(Base):
     trader_id = Column(Integer, ForeignKey("traders.id"), nullable=False)
     fiat = Column(Integer, ForeignKey("fiat_currencies_trader.id"), nullable=False)
     balance = Column(DECIMAL(20, 2), nullable=False)
+    # Заблокировано под незавершённые ордера; доступно balance - reserved
+    reserved = Column(DECIMAL(20, 2), nullable=False, default=Decimal('0.00'), server_default="0")
     
     # Связь с трейдерами
     traders = relationship("Trader", back_populates="balance_trader")
     fiat_currency = relationship("FiatCurrencyTrader", back_populates="balance_trader")
 
+    __table_args__ = (
+        UniqueConstraint("trader_id", "fiat", name="uq_balances_traders_trader_fiat"),
+        CheckConstraint("reserved >= 0 AND reserved <= balance", name="ck_balances_traders_reserved"),
+    )
+
+
+class TraderStats(Base):
+    """Счётчики ордеров трейдера; обновляются в той же транзакции, что и ордер."""
+    __tablename__ = "trader_stats"
+
+    trader_id = Column(Integer, ForeignKey("traders.id", ondelete="CASCADE"), primary_key=True)
+    orders_total = Column(Integer, nullable=False, default=0, server_default="0")
+    orders_open = Column(Integer, nullable=False, default=0, server_default="0")  # pending + processing
+    orders_completed = Column(Integer, nullable=False, default=0, server_default="0")
+    orders_canceled = Column(Integer, nullable=False, default=0, server_default="0")
+    turnover_fiat = Column(DECIMAL(20, 2), nullable=False, default=Decimal('0.00'), server_default="0")  # Сумма исполненных
+    turnover_currency = Column(DECIMAL(20, 8), nullable=False, default=Decimal('0'), server_default="0")
+    updated_at = Column(TIMESTAMP, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class BalanceLedgerEntry(Base):
+    """Журнал движений баланса трейдера: записи только добавляются."""
+    __tablename__ = "balance_ledger_traders"
+
+    id = Column(BigInteger, primary_key=True)
+    trader_id = Column(Integer, ForeignKey("traders.id"), nullable=False)
+    fiat = Column(Integer, ForeignKey("fiat_currencies_trader.id"), nullable=False)
+    order_id = Column(Integer, ForeignKey("trader_orders.id", ondelete="SET NULL"), nullable=True)
+    entry_type = Column(Enum(BalanceLedgerEntryType, name="balanceledgerentrytype"), nullable=False)
+    amount = Column(DECIMAL(20, 2), nullable=False)
+    balance_after = Column(DECIMAL(20, 2), nullable=False)
+    reserved_after = Column(DECIMAL(20, 2), nullable=False)
+    created_at = Column(TIMESTAMP, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index("ix_balance_ledger_traders_trader_created", "trader_id", "created_at"),
+        # Не больше одной блокировки и одного закрытия (списание или снятие) на ордер
+        Index(
+            "uq_balance_ledger_traders_order_reserve", "order_id", unique=True,
+            postgresql_where=entry_type == BalanceLedgerEntryType.reserve
+        ),
+        Index(
+            "uq_balance_ledger_traders_order_close", "order_id", unique=True,
+            postgresql_where=entry_type.in_([BalanceLedgerEntryType.settle, BalanceLedgerEntryType.release])
+        ),
+    )
+
 
 class TimeZone(Base):
     __tablename__ = "time_zones"
@@ -429,5 +574,19 @@ async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
             raise
 
 
+# Dependency для читающих эндпоинтов: реплика, кроме окна после собственной записи клиента
+async def get_async_read_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    if replica_router.use_primary(read_marker(request)):
+        session_factory = AsyncSessionLocal
+    else:
+        session_factory = AsyncReplicaSessionLocal
+    async with session_factory() as session:
+        try:
+            yield session
+        except Exception:
+            await session.rollback()
+            raise
+
+
 if __name__ == "__main__":
     asyncio.run(init_db())
\ No newline at end of file
@@ -0,0 +1,79 @@
+# database/pool_metrics.py
+import bisect
+import time
+from typing import Any, Dict, List, cast
+
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, ConnectionPoolEntry, QueuePool
+
+# Границы гистограммы ожидания соединения, в секундах
+CHECKOUT_WAIT_BUCKETS: List[float] = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0]
+
+
+class CheckoutWaitStats:
+    """Статистика времени получения соединения из пула."""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.timeouts = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.bucket_counts = [0] * (len(CHECKOUT_WAIT_BUCKETS) + 1)
+
+    def observe(self, seconds: float) -> None:
+        self.count += 1
+        self.total_seconds += seconds
+        if seconds > self.max_seconds:
+            self.max_seconds = seconds
+        self.bucket_counts[bisect.bisect_left(CHECKOUT_WAIT_BUCKETS, seconds)] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "timeouts": self.timeouts,
+            "avg_seconds": self.total_seconds / self.count if self.count else 0.0,
+            "max_seconds": self.max_seconds,
+            "buckets": dict(zip([str(b) for b in CHECKOUT_WAIT_BUCKETS] + ["+Inf"], self.bucket_counts)),
+        }
+
+
+class TimedAsyncAdaptedQueuePool(AsyncAdaptedQueuePool):
+    """
+    AsyncAdaptedQueuePool, который измеряет ожидание соединения при checkout
+    (включая открытие нового соединения, если пул ещё не заполнен).
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.checkout_wait = CheckoutWaitStats()
+
+    def _do_get(self) -> ConnectionPoolEntry:
+        started = time.perf_counter()
+        try:
+            entry = super()._do_get()
+        except Exception:
+            self.checkout_wait.timeouts += 1
+            raise
+        self.checkout_wait.observe(time.perf_counter() - started)
+        return entry
+
+    def recreate(self) -> "TimedAsyncAdaptedQueuePool":
+        pool = cast(TimedAsyncAdaptedQueuePool, super().recreate())
+        pool.checkout_wait = self.checkout_wait
+        return pool
+
+
+def pool_stats(engine: AsyncEngine) -> Dict[str, Any]:
+    """Текущее состояние пула и статистика ожидания для async-движка."""
+    # Движки создаются с TimedAsyncAdaptedQueuePool (database/init_db.py)
+    pool = cast(QueuePool, engine.sync_engine.pool)
+    stats: Dict[str, Any] = {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        "checked_in": pool.checkedin(),
+    }
+    checkout_wait = getattr(pool, "checkout_wait", None)
+    if checkout_wait is not None:
+        stats["checkout_wait"] = checkout_wait.snapshot()
+    return stats
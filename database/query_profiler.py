@@ -0,0 +1,113 @@
+# database/query_profiler.py
+import logging
+import re
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from sqlalchemy import Engine, event
+from sqlalchemy.engine.interfaces import DBAPICursor
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from config.logging_config import setup_logging
+from config.settings import settings
+
+setup_logging()
+logger = logging.getLogger("JE.sql")
+
+# Длина текста запроса в отчёте
+_STATEMENT_PREVIEW = 300
+
+_WHITESPACE = re.compile(r"\s+")
+# Списки параметров IN (...) разной длины — одна и та же форма запроса
+_PARAM_LIST = re.compile(r"\(\s*(?:\$\d+|\?|%\(\w+\)s)(?:\s*,\s*(?:\$\d+|\?|%\(\w+\)s))*\s*\)")
+_PARAM = re.compile(r"\$\d+|%\(\w+\)s")
+
+
+def statement_shape(statement: str) -> str:
+    """Форма запроса без значений параметров: одинаковые формы в одном запросе — признак N+1."""
+    shape = _WHITESPACE.sub(" ", statement).strip()
+    shape = _PARAM_LIST.sub("(?)", shape)
+    return _PARAM.sub("?", shape)
+
+
+class RequestProfile:
+    """Все SQL-выражения одного HTTP-запроса с длительностью."""
+
+    def __init__(self) -> None:
+        self.statements: List[Tuple[str, float]] = []
+
+    def record(self, statement: str, seconds: float) -> None:
+        self.statements.append((statement, seconds))
+
+    def report(self, slow_ms: float, repeat_threshold: int) -> Dict[str, Any]:
+        counts: Dict[str, int] = {}
+        for statement, _ in self.statements:
+            shape = statement_shape(statement)
+            counts[shape] = counts.get(shape, 0) + 1
+        repeated = [
+            {"count": count, "statement": shape[:_STATEMENT_PREVIEW]}
+            for shape, count in sorted(counts.items(), key=lambda item: -item[1])
+            if count >= repeat_threshold
+        ]
+        slow = [
+            {"ms": round(seconds * 1000, 2), "statement": _preview(statement)}
+            for statement, seconds in self.statements
+            if seconds * 1000 >= slow_ms
+        ]
+        return {
+            "statements": len(self.statements),
+            "db_ms": round(sum(seconds for _, seconds in self.statements) * 1000, 2),
+            "repeated": repeated,
+            "slow": slow,
+        }
+
+
+# Профиль текущего HTTP-запроса (выставляется middleware в server.py, если профилировщик включён)
+profile_var: ContextVar[Optional[RequestProfile]] = ContextVar("sql_profile", default=None)
+
+
+def _preview(statement: str) -> str:
+    return _WHITESPACE.sub(" ", statement).strip()[:_STATEMENT_PREVIEW]
+
+
+def _before_cursor_execute(conn: Any, cursor: DBAPICursor, statement: str, parameters: Any,
+                           context: Any, executemany: bool) -> None:
+    if context is not None:
+        context._profiler_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn: Any, cursor: DBAPICursor, statement: str, parameters: Any,
+                          context: Any, executemany: bool) -> None:
+    started = getattr(context, "_profiler_started", None)
+    if started is None:
+        return
+    seconds = time.perf_counter() - started
+    profile = profile_var.get()
+    if profile is not None:
+        profile.record(statement, seconds)
+    elif seconds * 1000 >= settings.sql_slow_query_ms:
+        # Вне HTTP-запроса (фоновые задачи) медленные выражения пишем сразу
+        logger.warning("slow statement", extra={"ms": round(seconds * 1000, 2), "statement": _preview(statement)})
+
+
+def install_profiler(engine: Union[AsyncEngine, Engine]) -> None:
+    """Подключает профилировщик к движку (AsyncEngine или Engine). Повторный вызов безопасен."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    if not event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def log_report(method: str, route: str, report: Dict[str, Any]) -> None:
+    """Отчёт по запросу: WARNING при найденных N+1 или медленных выражениях, иначе DEBUG."""
+    level = logging.WARNING if report["repeated"] or report["slow"] else logging.DEBUG
+    logger.log(level, "sql profile", extra={"method": method, "path": route, **report})
+
+
+def report_header(report: Dict[str, Any]) -> str:
+    """Краткая сводка для заголовка ответа X-SQL-Profile."""
+    return (
+        f"statements={report['statements']}; db_ms={report['db_ms']}; "
+        f"repeated={len(report['repeated'])}; slow={len(report['slow'])}"
+    )
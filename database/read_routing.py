@@ -0,0 +1,69 @@
+# database/read_routing.py
+import math
+import time
+from typing import Optional
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+from config.settings import settings
+
+# Метка «читать с основной базы до» хранится у клиента, а не в памяти процесса:
+# следующий запрос может попасть на любой воркер или узел. Браузер возвращает cookie сам,
+# API-клиенты без cookie повторяют заголовок из ответа на запись.
+PRIMARY_UNTIL_COOKIE = "je_primary_until"
+PRIMARY_UNTIL_HEADER = "X-Primary-Until"
+
+# Методы, которые не меняют данные и не включают привязку к основной базе
+READ_ONLY_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+def read_marker(request: Request) -> Optional[str]:
+    """Метка последней записи клиента: заголовок или cookie (None — записей не было)."""
+    return request.headers.get(PRIMARY_UNTIL_HEADER) or request.cookies.get(PRIMARY_UNTIL_COOKIE)
+
+
+class ReplicaRouter:
+    """
+    Выбор базы для читающих эндпоинтов.
+
+    По умолчанию чтение идёт на реплику. После успешного изменяющего запроса
+    клиент получает метку (unix-время окончания окна) и на sticky_seconds
+    привязывается к основной базе, чтобы видеть собственные записи, даже если
+    реплика отстаёт. Часы узлов должны быть синхронизированы (NTP).
+    """
+
+    def __init__(self, sticky_seconds: float = settings.replica_sticky_seconds):
+        self.sticky_seconds = sticky_seconds
+
+    def write_marker(self, now: Optional[float] = None) -> Optional[str]:
+        """Значение метки после успешной записи (None — привязка выключена)."""
+        if self.sticky_seconds <= 0:
+            return None
+        now = time.time() if now is None else now
+        # Округление вниз: иначе метка может оказаться длиннее окна и будет отвергнута
+        return f"{math.floor((now + self.sticky_seconds) * 1000) / 1000:.3f}"
+
+    def mark_write(self, response: Response) -> None:
+        marker = self.write_marker()
+        if marker is None:
+            return
+        response.headers[PRIMARY_UNTIL_HEADER] = marker
+        response.set_cookie(
+            PRIMARY_UNTIL_COOKIE, marker, max_age=math.ceil(self.sticky_seconds), httponly=True, samesite="lax"
+        )
+
+    def use_primary(self, marker: Optional[str], now: Optional[float] = None) -> bool:
+        if not marker or self.sticky_seconds <= 0:
+            return False
+        try:
+            until = float(marker)
+        except ValueError:
+            return False
+        now = time.time() if now is None else now
+        # Метку присылает клиент: окно длиннее sticky_seconds не принимается
+        return now < until <= now + self.sticky_seconds
+
+
+# Общий маршрутизатор процесса
+replica_router = ReplicaRouter()
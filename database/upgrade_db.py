@@ -0,0 +1,122 @@
+# database/upgrade_db.py
+"""
+Обновление существующей базы до текущих моделей: python -m database.upgrade_db
+
+create_all (init_db) создаёт только недостающие таблицы и не меняет уже
+существующие. Скрипт добавляет новые столбцы, ограничения и индексы к старым
+таблицам, затем заполняет trader_stats по trader_orders. Все шаги идемпотентны,
+DDL выполняется одной транзакцией. Индексы строятся без CONCURRENTLY и на время
+построения блокируют запись в таблицу — запускать в окно обслуживания.
+"""
+import asyncio
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.schema import CreateIndex
+
+from api.services.trader_stats import rebuild_trader_stats
+from database.init_db import AsyncSessionLocal, Base, engine
+
+# Таблицы, к индексам которых добавились новые (создаются с IF NOT EXISTS)
+_INDEXED_TABLES = ("exchange_orders", "trader_orders", "balances_traders")
+
+# Новые столбцы существующих таблиц
+_ADD_COLUMNS = [
+    "ALTER TABLE exchange_orders ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1",
+    "ALTER TABLE trader_orders ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1",
+    "ALTER TABLE balances_traders ADD COLUMN IF NOT EXISTS reserved DECIMAL(20, 2) NOT NULL DEFAULT 0",
+    "ALTER TABLE exchange_rates ADD COLUMN IF NOT EXISTS order_book JSON",
+]
+
+# Keyset-пагинация не выдаёт строки без created_at (api/utils/pagination.py)
+_BACKFILL_CREATED_AT = [
+    f"UPDATE {table} SET created_at = COALESCE(updated_at, timezone('UTC', now())) WHERE created_at IS NULL"
+    for table in ("exchange_orders", "trader_orders")
+]
+
+# ON CONFLICT (currency) требует уникальности: из дублей остаётся самый свежий курс
+_DEDUPLICATE_EXCHANGE_RATES = """
+DELETE FROM exchange_rates
+WHERE id NOT IN (
+    SELECT DISTINCT ON (currency) id
+    FROM exchange_rates
+    ORDER BY currency, updated_at DESC NULLS LAST, id DESC
+)
+"""
+
+# Имя совпадает с тем, что даёт PostgreSQL для unique=True в CREATE TABLE
+_UNIQUE_EXCHANGE_RATES = (
+    "CREATE UNIQUE INDEX IF NOT EXISTS exchange_rates_currency_key ON exchange_rates (currency)"
+)
+
+# Дубли балансов не сливаются автоматически: их нужно разобрать вручную
+_DUPLICATE_BALANCES = """
+SELECT trader_id, fiat, count(*) FROM balances_traders
+GROUP BY trader_id, fiat HAVING count(*) > 1
+"""
+
+_UNIQUE_BALANCES = (
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_balances_traders_trader_fiat ON balances_traders (trader_id, fiat)"
+)
+
+_CHECK_RESERVED = """
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'ck_balances_traders_reserved') THEN
+        ALTER TABLE balances_traders
+            ADD CONSTRAINT ck_balances_traders_reserved CHECK (reserved >= 0 AND reserved <= balance);
+    END IF;
+END
+$$
+"""
+
+
+def index_statements() -> List[str]:
+    """CREATE INDEX IF NOT EXISTS для всех индексов моделей старых таблиц (включая частичные)."""
+    statements = []
+    for name in _INDEXED_TABLES:
+        for index in sorted(Base.metadata.tables[name].indexes, key=lambda i: i.name or ""):
+            ddl = CreateIndex(index, if_not_exists=True).compile(dialect=engine.dialect)
+            statements.append(str(ddl))
+    return statements
+
+
+def upgrade_statements() -> List[str]:
+    """DDL для существующих таблиц в порядке выполнения (после create_all)."""
+    return [
+        *_ADD_COLUMNS,
+        *_BACKFILL_CREATED_AT,
+        _DEDUPLICATE_EXCHANGE_RATES,
+        _UNIQUE_EXCHANGE_RATES,
+        _UNIQUE_BALANCES,
+        _CHECK_RESERVED,
+        *index_statements(),
+    ]
+
+
+async def upgrade_db() -> None:
+    async with engine.begin() as conn:
+        # Новые таблицы, типы и их индексы
+        await conn.run_sync(Base.metadata.create_all)
+
+        duplicates = (await conn.execute(text(_DUPLICATE_BALANCES))).all()
+        if duplicates:
+            raise RuntimeError(f"Несколько балансов на одну пару (trader_id, fiat): {duplicates}")
+
+        for statement in upgrade_statements():
+            await conn.execute(text(statement))
+
+    async with AsyncSessionLocal() as db:
+        await rebuild_trader_stats(db)
+
+
+async def main() -> None:
+    try:
+        await upgrade_db()
+        print("База данных обновлена.")
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -6,6 +6,15 @@ class OrdersSocket {
   private maxReconnectAttempts: number = 5;
   private reconnectInterval: number = 2000; // 2 секунды между попытками
   private connectionParams: { url: string; traderId: string; token: string } | null = null;
+  // Локальная копия ордеров: снимок с сервера + применённые изменения
+  private orders: any[] = [];
+  // Позиция в потоке изменений: seq последней применённой дельты и epoch сервера
+  private seq: number | null = null;
+  private epoch: string | null = null;
+  private stateTraderId: string | null = null;
+  // Дельты, пришедшие раньше снимка
+  private pendingDeltas: any[] = [];
+  private resyncRequested: boolean = false;
 
   connect({ url, traderId, token }: { url: string; traderId: string; token: string }) {
     // Сохраняем параметры подключения для возможного переподключения
@@ -17,7 +26,18 @@ class OrdersSocket {
       return;
     }
 
-    const wsUrl = `${url}/${traderId}?token=${encodeURIComponent(token)}`;
+    if (this.stateTraderId !== traderId) {
+      this.resetState();
+      this.stateTraderId = traderId;
+    }
+
+    // При переподключении просим только пропущенные изменения, а не полный снимок
+    let wsUrl = `${url}/${traderId}?token=${encodeURIComponent(token)}`;
+    if (this.seq !== null && this.epoch) {
+      wsUrl += `&since=${this.seq}&epoch=${encodeURIComponent(this.epoch)}`;
+    }
+    this.pendingDeltas = [];
+    this.resyncRequested = false;
     console.log(`Connecting to WebSocket: ${wsUrl}`);
     
     try {
@@ -33,8 +53,12 @@ class OrdersSocket {
         try {
           const data = JSON.parse(event.data);
           this.emit('message', data);
-          if (data.type === 'orders_update') {
-            this.emit('orders_update', data.orders);
+          if (data.type === 'ping') {
+            this.ws?.send(JSON.stringify({ type: 'pong' }));
+          } else if (data.type === 'orders_snapshot') {
+            this.applySnapshot(data);
+          } else if (data.type === 'orders_delta') {
+            this.handleDelta(data);
           } else if (data.type === 'error') {
             this.emit('error', data.message);
           }
@@ -66,6 +90,62 @@ class OrdersSocket {
     }
   }
 
+  private applySnapshot(data: { epoch: string; seq: number; orders: any[] }) {
+    this.orders = data.orders;
+    this.epoch = data.epoch;
+    this.seq = data.seq;
+    this.resyncRequested = false;
+    const pending = this.pendingDeltas;
+    this.pendingDeltas = [];
+    pending.forEach((delta) => this.handleDelta(delta, false));
+    this.emit('orders_update', this.orders);
+  }
+
+  private handleDelta(data: any, notify: boolean = true) {
+    // Снимка ещё нет — откладываем дельту до его прихода
+    if (this.seq === null) {
+      this.pendingDeltas.push(data);
+      return;
+    }
+    if (data.epoch !== this.epoch || data.seq > this.seq + 1) {
+      this.requestResync();
+      return;
+    }
+    if (data.seq <= this.seq) return; // уже применена
+    this.applyDelta(data.upserted || [], data.removed || []);
+    this.seq = data.seq;
+    this.resyncRequested = false;
+    if (notify) this.emit('orders_update', this.orders);
+  }
+
+  private requestResync() {
+    if (this.resyncRequested || !this.ws || this.ws.readyState !== WebSocket.OPEN) return;
+    this.resyncRequested = true;
+    this.ws.send(JSON.stringify({ type: 'resync', since: this.seq, epoch: this.epoch }));
+  }
+
+  private resetState() {
+    this.orders = [];
+    this.seq = null;
+    this.epoch = null;
+    this.pendingDeltas = [];
+    this.resyncRequested = false;
+  }
+
+  private applyDelta(upserted: any[], removed: number[]) {
+    const removedIds = new Set(removed);
+    const upsertedById = new Map(upserted.map((order) => [order.id, order]));
+    const updated = this.orders
+      .filter((order) => !removedIds.has(order.id))
+      .map((order) => {
+        const next = upsertedById.get(order.id);
+        if (next) upsertedById.delete(order.id);
+        return next || order;
+      });
+    // Новые ордера — в начало списка
+    this.orders = [...Array.from(upsertedById.values()), ...updated];
+  }
+
   private handleReconnect() {
     if (!this.connectionParams) return;
     
@@ -98,6 +178,8 @@ class OrdersSocket {
     
     // Сбрасываем параметры подключения
     this.connectionParams = null;
+    this.resetState();
+    this.stateTraderId = null;
     this.reconnectAttempts = 0;
   }
 
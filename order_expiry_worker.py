@@ -0,0 +1,51 @@
+# JE/order_expiry_worker.py
+"""
+Отдельный процесс сборщика истёкших заявок: python order_expiry_worker.py
+
+Можно запускать несколько экземпляров и вместе с процессами приложения — пачки берутся
+через FOR UPDATE SKIP LOCKED. Чтобы сборщик работал только здесь, в приложении задаётся
+ORDER_EXPIRY_IN_APP=False. События об отменённых заявках доходят до WebSocket-серверов
+других процессов только при ORDER_EVENTS_BACKEND=postgres.
+
+Сборщик выключен, пока EXCHANGE_ORDER_TTL_SECONDS и TRADER_ORDER_TTL_SECONDS равны 0
+(значения по умолчанию). Порядок включения: сначала большой TTL и проверка отменённых
+заявок в журнале, затем рабочее значение.
+
+Снятая при отмене блокировка баланса сразу попадает в индекс маршрутизации только
+этого процесса (trader_routing.set_balance). Процессы приложения увидят освободившийся
+баланс при следующей полной перезагрузке индекса — до TRADER_ROUTING_RELOAD_SECONDS (30 с).
+"""
+import asyncio
+import logging
+import signal
+
+from api.services.order_events import order_events
+from api.services.order_expiry import order_expiry
+from config.logging_config import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+
+async def main() -> None:
+    if not order_expiry.rules:
+        logger.warning("EXCHANGE_ORDER_TTL_SECONDS и TRADER_ORDER_TTL_SECONDS равны 0 — истекать нечему")
+        return
+
+    stopped = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopped.set)
+
+    logger.info("Order expiry worker starting...")
+    await order_expiry.start()
+    try:
+        await stopped.wait()
+    finally:
+        logger.info("Order expiry worker shutting down...")
+        await order_expiry.stop()
+        await order_events.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
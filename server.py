@@ -1,5 +1,10 @@
 import logging
-from fastapi import FastAPI, Request
+import random
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import PlainTextResponse
 from fastapi.openapi.utils import get_openapi
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -18,6 +23,22 @@ from api.endpoints.merchant_orders_routers import router as merchant_orders_rout
 from api.endpoints.trader_req_routers import router as trader_req_routers
 from api.endpoints.banks_trader_routers import router as banks_trader_router
 from api.endpoints.trader_fiat_routers import router as trader_fiat_router
+from api.services.rate_service import rate_service
+from api.services.rate_history import rate_history_rollup
+from api.services.leader_lock import rates_leader
+from api.services.password_pool import password_pool
+from api.services.trader_routing import trader_routing
+from api.services.order_expiry import order_expiry
+from api.services.metrics import (
+    UNMATCHED_ROUTE, QueryStats, instrument_engine, query_stats_var, render_gauges, request_metrics
+)
+from api.websockets.trader_orders_ws import get_websocket_router, start_order_updates, stop_order_updates, websocket_manager
+from database.init_db import engine, replica_engine
+from database.pool_metrics import pool_stats
+from database.query_profiler import RequestProfile, install_profiler, log_report, profile_var, report_header
+from database.read_routing import PRIMARY_UNTIL_HEADER, READ_ONLY_METHODS, replica_router
+from config.settings import settings
+from api.utils.request_utils import route_template
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -38,12 +59,14 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Next-Offset", "X-Rates-Version", "X-Request-ID", "X-SQL-Profile", PRIMARY_UNTIL_HEADER],
 )
 
 # Logging Configuration
-from config.logging_config import setup_logging
+from config.logging_config import request_id_var, setup_logging
 setup_logging()
 logger = logging.getLogger(__name__)
+request_logger = logging.getLogger("JE.requests")
 
 # Include Routers
 app.include_router(exchange_router, prefix="/api/v1/exchange", tags=["Exchange"])
@@ -62,15 +85,139 @@ app.include_router(trader_req_routers, prefix="/api/v1/trader_req", tags=["Trade
 app.include_router(banks_trader_router, prefix="/api/v1/banks_trader", tags=["BanksTrader"])
 app.include_router(trader_fiat_router, prefix="/api/v1/trader_fiat", tags=["Trader Fiat"])
 
+# Background services
+@app.on_event("startup")
+async def startup_event() -> None:
+    logger.info("Starting exchange rate refresher...")
+    await rate_service.start()
+    await rate_history_rollup.start()
+    await trader_routing.start()
+    if settings.order_expiry_in_app:
+        await order_expiry.start()
+    # WebSocket-канал ордеров в том же процессе получает события из шины напрямую
+    app.include_router(await get_websocket_router(), prefix="/api/v1")
+    await start_order_updates()
+
+@app.on_event("shutdown")
+async def shutdown_event() -> None:
+    logger.info("Stopping exchange rate refresher...")
+    await stop_order_updates()
+    await order_expiry.stop()
+    await trader_routing.stop()
+    await rate_history_rollup.stop()
+    await rate_service.stop()
+    await rates_leader.close()
+    password_pool.shutdown()
+
+# Database pool diagnostics
+@app.get("/api/v1/health/db_pool", tags=["Health"])
+async def db_pool_health() -> Dict[str, Dict[str, Any]]:
+    """Connection pool state and checkout wait statistics for this worker."""
+    stats = {"primary": pool_stats(engine)}
+    if replica_engine is not engine:
+        stats["replica"] = pool_stats(replica_engine)
+    return stats
+
+# Prometheus metrics
+instrument_engine(engine)
+if replica_engine is not engine:
+    instrument_engine(replica_engine)
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics() -> PlainTextResponse:
+    """Request, DB pool, password pool and WebSocket metrics of this worker in text exposition format."""
+    pools = [({"engine": "primary"}, pool_stats(engine))]
+    if replica_engine is not engine:
+        pools.append(({"engine": "replica"}, pool_stats(replica_engine)))
+    body = (
+        request_metrics.render()
+        + render_gauges("db_pool", pools, "SQLAlchemy connection pool state.")
+        + render_gauges("password_pool", [({}, password_pool.stats())], "Password hashing pool state.")
+        + render_gauges("orders_ws", [({}, websocket_manager.stats())], "Trader orders WebSocket state.")
+    )
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
 # Middleware for Logging Requests
 @app.middleware("http")
-async def log_requests(request: Request, call_next):
-    """Log incoming requests and outgoing responses."""
-    logger.info(f"Received request: {request.method} {request.url}")
+async def log_requests(request: Request, call_next: Callable[[Request], Awaitable[Response]]) -> Response:
+    """
+    Per-request metrics (latency, SQL statements, DB time) and one structured record per request;
+    successful fast requests are sampled in the log.
+    """
+    request_id = request.headers.get("x-request-id") or uuid.uuid4().hex
+    token = request_id_var.set(request_id)
+    queries = QueryStats()
+    queries_token = query_stats_var.set(queries)
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    except Exception:
+        elapsed = time.perf_counter() - started
+        route = _metrics_route(request)
+        request_metrics.observe(request.method, route, 500, elapsed, queries)
+        request_logger.exception(
+            "request failed",
+            extra={"method": request.method, "path": route, "latency_ms": round(elapsed * 1000, 2)},
+        )
+        raise
+    finally:
+        query_stats_var.reset(queries_token)
+        request_id_var.reset(token)
+
+    elapsed = time.perf_counter() - started
+    latency_ms = elapsed * 1000
+    route = _metrics_route(request)
+    status = response.status_code
+    request_metrics.observe(request.method, route, status, elapsed, queries)
+    response.headers["X-Request-ID"] = request_id
+    if status >= 400 or latency_ms >= settings.log_slow_request_ms or random.random() < settings.log_sample_rate:
+        request_logger.log(
+            logging.WARNING if status >= 500 else logging.INFO,
+            "request",
+            extra={
+                "request_id": request_id,
+                "method": request.method,
+                "path": route,
+                "status": status,
+                "latency_ms": round(latency_ms, 2),
+                "db_statements": queries.statements,
+                "db_ms": round(queries.seconds * 1000, 2),
+            },
+        )
+    return response
+
+def _metrics_route(request: Request) -> str:
+    # Несовпавшие URL (404 сканеров и т.п.) сводим в одну метку
+    return route_template(request) if request.scope.get("route") is not None else UNMATCHED_ROUTE
+
+# Read-your-writes: after a successful write the client reads from the primary for a short window.
+# The marker travels with the client (cookie / X-Primary-Until), so it holds across workers and nodes.
+@app.middleware("http")
+async def mark_replica_sticky(request: Request, call_next: Callable[[Request], Awaitable[Response]]) -> Response:
     response = await call_next(request)
-    logger.info(f"Response: {response.status_code}")
+    if replica_engine is not engine and request.method not in READ_ONLY_METHODS and response.status_code < 400:
+        replica_router.mark_write(response)
     return response
 
+# SQL profiler: every statement of the request, repeated shapes (N+1) and slow statements
+async def profile_sql(request: Request, call_next: Callable[[Request], Awaitable[Response]]) -> Response:
+    profile = RequestProfile()
+    token = profile_var.set(profile)
+    try:
+        response = await call_next(request)
+    finally:
+        profile_var.reset(token)
+    report = profile.report(settings.sql_slow_query_ms, settings.sql_repeat_threshold)
+    log_report(request.method, _metrics_route(request), report)
+    response.headers["X-SQL-Profile"] = report_header(report)
+    return response
+
+if settings.sql_profiler_enabled:
+    install_profiler(engine)
+    if replica_engine is not engine:
+        install_profiler(replica_engine)
+    app.middleware("http")(profile_sql)
+
 # Custom OpenAPI
 def custom_openapi():
     """Customize OpenAPI schema."""
@@ -0,0 +1,5 @@
+import os
+
+# Тесты не должны писать ошибки в app.log в корне репозитория: модули настраивают
+# логирование при импорте, поэтому переменная выставляется до сбора тестов
+os.environ.setdefault("LOG_FILE", "")
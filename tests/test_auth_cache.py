@@ -0,0 +1,39 @@
+import os
+import sys
+import time
+
+# Добавляем путь к корню проекта
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from api.services.auth_cache import TokenCache, UserPrincipal
+
+
+def make_principal(user_id: int, email: str) -> UserPrincipal:
+    return UserPrincipal(id=user_id, email=email, full_name=None, role_id=3, is_superuser=False, referral_code=None)
+
+
+def test_invalidate_drops_every_token_of_subject():
+    cache = TokenCache(max_size=10, ttl=60)
+    alice = make_principal(1, "alice@example.com")
+    cache.put("user", "token-1", alice.email, alice)
+    cache.put("user", "token-2", alice.email, alice)
+    cache.put("trader", "token-1", alice.email, alice)
+
+    cache.invalidate("user", alice.email)
+
+    assert cache.get("user", "token-1") is None
+    assert cache.get("user", "token-2") is None
+    assert cache.get("trader", "token-1") == alice
+
+
+def test_lru_eviction_and_token_expiry():
+    cache = TokenCache(max_size=2, ttl=60)
+    for i in range(3):
+        principal = make_principal(i, f"user{i}@example.com")
+        cache.put("user", f"token-{i}", principal.email, principal)
+    assert len(cache) == 2
+    assert cache.get("user", "token-0") is None
+
+    expired = make_principal(9, "expired@example.com")
+    cache.put("user", "token-expired", expired.email, expired, token_exp=time.time() - 1)
+    assert cache.get("user", "token-expired") is None
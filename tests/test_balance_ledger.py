@@ -0,0 +1,50 @@
+import asyncio
+import os
+import sys
+from decimal import Decimal
+from types import SimpleNamespace
+
+from sqlalchemy.dialects import postgresql
+
+# Добавляем путь к корню проекта
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from api.enums import TraderFiatEnum, TraderOrderTypeEnum
+from api.services import balance_ledger
+
+ORDER = SimpleNamespace(
+    id=42, trader_id=7, fiat=TraderFiatEnum.RUB, order_type=TraderOrderTypeEnum.pay_out, total_fiat=Decimal("1500.00")
+)
+
+
+class _CaptureSession:
+    """Сессия, которая только запоминает выполненный запрос."""
+
+    def __init__(self):
+        self.statements = []
+
+    async def execute(self, statement):
+        self.statements.append(str(statement.compile(dialect=postgresql.dialect())))
+        return SimpleNamespace(first=lambda: None)
+
+
+def _compiled(operation) -> str:
+    db = _CaptureSession()
+    assert asyncio.run(operation(db, ORDER)) is None
+    assert len(db.statements) == 1  # Один запрос, без чтения баланса в Python
+    return db.statements[0]
+
+
+def test_reserve_is_one_conditional_update_feeding_the_ledger_insert():
+    sql = _compiled(balance_ledger.reserve_for_order)
+    assert sql.startswith("WITH balance_change AS \n(UPDATE balances_traders SET reserved=")
+    assert "balances_traders.balance - balances_traders.reserved >= " in sql
+    assert "INSERT INTO balance_ledger_traders" in sql
+    assert "FROM balance_change RETURNING" in sql
+
+
+def test_settle_and_release_require_a_reserve_and_no_earlier_close():
+    for operation in (balance_ledger.settle_order, balance_ledger.release_order):
+        sql = _compiled(operation)
+        assert "AND (EXISTS (SELECT * \nFROM balance_ledger_traders" in sql
+        assert "AND NOT (EXISTS (SELECT * \nFROM balance_ledger_traders" in sql
@@ -0,0 +1,68 @@
+import asyncio
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Добавляем путь к корню проекта
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from api.endpoints import garantex_api
+
+RATES_FILE = os.path.join(os.path.dirname(__file__), '..', 'rates.json')
+
+
+class GarantexStubHandler(BaseHTTPRequestHandler):
+    """Локальная заглушка /api/v2/depth: отдаёт rates.json для usdtrub и 404 для остальных рынков."""
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        market = parse_qs(urlparse(self.path).query).get("market", [None])[0]
+        self.server.requests.append(market)
+        if market == "usdtrub":
+            with open(RATES_FILE, "rb") as f:
+                body = f.read()
+            self.send_response(200)
+        else:
+            body = json.dumps({"error": "market not found"}).encode()
+            self.send_response(404)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def test_fetch_markets_rates_against_stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), GarantexStubHandler)
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/api/v2/depth"
+
+    async def run():
+        try:
+            first = await garantex_api.fetch_markets_rates(["usdtrub", "btcrub"], url=url)
+            client = garantex_api.get_client()
+            second = await garantex_api.fetch_markets_rates(["usdtrub"], url=url)
+            # Клиент общий и не пересоздаётся между обновлениями
+            assert garantex_api.get_client() is client
+            return first, second
+        finally:
+            await garantex_api.close_client()
+
+    try:
+        first, second = asyncio.run(run())
+    finally:
+        server.shutdown()
+
+    usdt_rates = first["usdtrub"]
+    assert (usdt_rates["buy_rate"], usdt_rates["sell_rate"], usdt_rates["source"]) == (105.23, 105.2, "Garantex")
+    assert len(usdt_rates["order_book"].asks.prices) == 207
+    assert first["btcrub"] is None
+    assert second["usdtrub"]["buy_rate"] == usdt_rates["buy_rate"]
+    assert sorted(server.requests) == ["btcrub", "usdtrub", "usdtrub"]
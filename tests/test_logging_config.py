@@ -0,0 +1,39 @@
+import json
+import logging
+import os
+import sys
+
+# Добавляем путь к корню проекта
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config.logging_config import JsonFormatter, RequestIdFilter, request_id_var, setup_logging
+
+
+def test_setup_logging_is_idempotent():
+    setup_logging()
+    handlers = list(logging.getLogger("JE").handlers)
+    root_handlers = list(logging.getLogger().handlers)
+
+    for _ in range(3):
+        setup_logging()
+
+    assert logging.getLogger("JE").handlers == handlers
+    assert logging.getLogger().handlers == root_handlers
+
+
+def test_json_formatter_includes_request_id_and_extra_fields():
+    record = logging.makeLogRecord({
+        "name": "JE.requests", "levelno": logging.INFO, "levelname": "INFO",
+        "msg": "request", "status": 200, "latency_ms": 1.5,
+    })
+    token = request_id_var.set("abc123")
+    try:
+        RequestIdFilter().filter(record)
+    finally:
+        request_id_var.reset(token)
+
+    entry = json.loads(JsonFormatter().format(record))
+
+    assert entry["message"] == "request"
+    assert entry["request_id"] == "abc123"
+    assert entry["status"] == 200 and entry["latency_ms"] == 1.5
@@ -0,0 +1,54 @@
+import os
+import sys
+from decimal import Decimal
+
+from sqlalchemy.dialects import postgresql
+
+# Добавляем путь к корню проекта
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from api.endpoints.merchant_orders_routers import _insert_eligible_order, _rejection
+from api.enums import TraderOrderTypeEnum
+from api.schemas import TraderOrderCreate
+from database.init_db import ReqTrader, Trader
+
+
+def _compiled(order_type: str) -> str:
+    order = TraderOrderCreate(
+        order_type=order_type, currency="USDT", fiat="RUB", amount_currency=Decimal("10"),
+        total_fiat=Decimal("950"), payment_method_id=1
+    )
+    return str(_insert_eligible_order(order, 7, Decimal("95")).compile(dialect=postgresql.dialect()))
+
+
+def test_merchant_order_is_a_single_insert_select_with_returning():
+    sql = _compiled("pay_in")
+    assert sql.startswith("INSERT INTO trader_orders")
+    assert "FROM req_traders JOIN traders ON traders.id = req_traders.trader_id" in sql
+    assert "traders.access = true" in sql
+    assert "RETURNING trader_orders.id" in sql
+    # Значения приводятся к типам колонок — иначе Postgres выведет text для параметров SELECT
+    assert "AS traderordertypeenum" in sql
+
+
+def test_eligibility_maps_order_type_to_trader_and_requisite_flags():
+    pay_in = _compiled("pay_in")
+    assert "traders.pay_in = true AND req_traders.can_sell = true" in pay_in
+
+    pay_out = _compiled("pay_out")
+    assert "traders.pay_out = true AND req_traders.can_buy = true" in pay_out
+
+
+def test_rejection_reason_names_the_failing_flag_or_reports_a_race():
+    trader = Trader(pay_in=True, pay_out=True)
+    pay_out = TraderOrderTypeEnum.pay_out
+
+    no_buy = _rejection(pay_out, ReqTrader(can_buy=False, can_sell=True), trader)
+    assert (no_buy.status_code, no_buy.detail) == (400, "This requisite cannot be used for pay-out orders")
+
+    # Повторное чтение показывает подходящий реквизит — вставка проиграла гонку
+    for order_type in TraderOrderTypeEnum:
+        raced = _rejection(order_type, ReqTrader(can_buy=True, can_sell=True), trader)
+        assert raced.status_code == 409
+
+    assert _rejection(pay_out, ReqTrader(can_buy=True), None).status_code == 400
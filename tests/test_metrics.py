@@ -0,0 +1,88 @@
+import os
+import sys
+
+from fastapi import APIRouter, FastAPI, Request
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+# Добавляем путь к корню проекта
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from api.services.metrics import (
+    QueryStats, RequestMetrics, instrument_engine, query_stats_var, render_gauges
+)
+from api.utils.request_utils import route_template
+
+
+def test_histogram_buckets_are_cumulative_per_route_template():
+    metrics = RequestMetrics(buckets=[0.01, 0.1])
+    metrics.observe("GET", "/api/v1/trader_orders/{order_id}", 200, 0.005)
+    metrics.observe("GET", "/api/v1/trader_orders/{order_id}", 404, 0.05)
+    metrics.observe("GET", "/api/v1/trader_orders/{order_id}", 200, 1.0)
+
+    body = metrics.render()
+    route = 'method="GET",route="/api/v1/trader_orders/{order_id}"'
+    assert f'http_requests_total{{{route},status="2xx"}} 2' in body
+    assert f'http_requests_total{{{route},status="4xx"}} 1' in body
+    assert f'http_request_duration_seconds_bucket{{{route},le="0.01"}} 1' in body
+    assert f'http_request_duration_seconds_bucket{{{route},le="0.1"}} 2' in body
+    assert f'http_request_duration_seconds_bucket{{{route},le="+Inf"}} 3' in body
+    assert f'http_request_duration_seconds_count{{{route}}} 3' in body
+
+
+def test_engine_events_count_statements_only_inside_request_context():
+    engine = create_engine("sqlite://")
+    instrument_engine(engine)
+    instrument_engine(engine)  # повторный вызов не удваивает счётчики
+
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))  # вне запроса — не учитывается
+
+        queries = QueryStats()
+        token = query_stats_var.set(queries)
+        try:
+            conn.execute(text("SELECT 1"))
+            conn.execute(text("SELECT 2"))
+        finally:
+            query_stats_var.reset(token)
+
+    assert queries.statements == 2
+    assert queries.seconds > 0
+
+    metrics = RequestMetrics()
+    metrics.observe("POST", "/api/v1/orders/", 201, 0.02, queries)
+    assert 'http_request_db_statements_total{method="POST",route="/api/v1/orders/"} 2' in metrics.render()
+
+
+def test_render_gauges_shares_header_between_label_sets():
+    body = render_gauges("db_pool", [
+        ({"engine": "primary"}, {"size": 20, "checkout_wait": {"count": 1}}),
+        ({"engine": "replica"}, {"size": 10}),
+    ])
+    assert body.count("# TYPE db_pool_size gauge") == 1
+    assert 'db_pool_size{engine="primary"} 20' in body
+    assert 'db_pool_size{engine="replica"} 10' in body
+    assert "checkout_wait" not in body
+
+
+def test_route_template_comes_from_the_matched_route():
+    router = APIRouter()
+
+    @router.get("/{section}/items/{item_id:int}")
+    async def item(section: str, item_id: int, request: Request):
+        return route_template(request)
+
+    @router.get("/health")
+    async def health(request: Request):
+        return route_template(request)
+
+    outer = APIRouter()
+    outer.include_router(router, prefix="/v1")
+    app = FastAPI()
+    app.include_router(outer, prefix="/api")
+    client = TestClient(app)
+
+    # Значение параметра совпадает с более ранним сегментом пути
+    assert client.get("/api/v1/api/items/1").json() == "/api/v1/{section}/items/{item_id}"
+    assert client.get("/api/v1/items/items/7").json() == "/api/v1/{section}/items/{item_id}"
+    assert client.get("/api/v1/health").json() == "/api/v1/health"
@@ -0,0 +1,47 @@
+import json
+import os
+import sys
+
+import pytest
+
+# Добавляем путь к корню проекта
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from api.services.order_book import OrderBookSnapshot
+
+RATES_FILE = os.path.join(os.path.dirname(__file__), '..', 'rates.json')
+
+
+@pytest.fixture(scope="module")
+def book():
+    with open(RATES_FILE) as f:
+        return OrderBookSnapshot.from_depth(json.load(f))
+
+
+def test_small_order_fills_at_best_price(book):
+    quote = book.quote("buy", amount=100)
+    assert quote.vwap == pytest.approx(105.23)
+    assert quote.worst_price == pytest.approx(105.23)
+    assert quote.levels == 1
+
+
+def test_large_buy_walks_the_asks(book):
+    # 14542.95 по 105.23 + 5457.05 по 105.24
+    quote = book.quote("buy", amount=20000)
+    expected_total = 14542.95 * 105.23 + (20000 - 14542.95) * 105.24
+    assert quote.total == pytest.approx(expected_total)
+    assert quote.vwap == pytest.approx(expected_total / 20000)
+    assert quote.worst_price == pytest.approx(105.24)
+    assert quote.levels == 2
+
+
+def test_sell_by_total_walks_the_bids(book):
+    total = 1003.01 * 105.2 + 1000 * 105.16
+    quote = book.quote("sell", total=total)
+    assert quote.amount == pytest.approx(2003.01)
+    assert quote.worst_price == pytest.approx(105.16)
+
+
+def test_insufficient_depth_returns_none(book):
+    assert book.quote("buy", amount=book.asks.depth * 2) is None
+    assert book.quote("buy", amount=0) is None
@@ -0,0 +1,198 @@
+import asyncio
+import os
+import sys
+
+# Добавляем путь к корню проекта
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from api.services.order_events import DELETE, TRADER_ORDER, UPSERT, OrderEvent, OrderEventBus
+from api.websockets.trader_orders_ws import WebSocketManager
+
+
+class FakeSocket:
+    def __init__(self, block=None):
+        self.sent = []
+        self.accepted = False
+        self.closed_with = None
+        self.block = block
+
+    async def accept(self):
+        self.accepted = True
+
+    async def send_json(self, message):
+        if self.block is not None:
+            await self.block.wait()
+        self.sent.append(message)
+
+    async def close(self, code=1000, reason=None):
+        self.closed_with = code
+
+    async def receive_text(self):
+        await asyncio.Event().wait()  # клиент молчит
+
+
+def test_bus_delivers_to_subscribers_and_survives_failing_ones():
+    bus = OrderEventBus()
+    received = []
+
+    async def good(event):
+        received.append(event)
+
+    async def bad(event):
+        raise RuntimeError("boom")
+
+    bus.subscribe(bad)
+    bus.subscribe(good)
+    event = OrderEvent(kind=TRADER_ORDER, action=UPSERT, order_id=1, owner_id=7, status="pending", data={"id": 1})
+    asyncio.run(bus.publish(event))
+
+    assert received == [event]
+
+
+def test_manager_sends_deltas_only_to_the_owning_trader():
+    manager = WebSocketManager()
+    mine, other = FakeSocket(), FakeSocket()
+
+    async def scenario():
+        mine_conn = await manager.connect(mine, "7")
+        other_conn = await manager.connect(other, "8")
+        await manager.handle_order_event(
+            OrderEvent(kind=TRADER_ORDER, action=UPSERT, order_id=1, owner_id=7, status="pending", data={"id": 1})
+        )
+        await manager.handle_order_event(OrderEvent(kind=TRADER_ORDER, action=DELETE, order_id=2, owner_id=7))
+        await mine_conn.queue.join()
+        await other_conn.queue.join()
+        manager.disconnect(mine_conn)
+        manager.disconnect(other_conn)
+
+    asyncio.run(scenario())
+
+    epoch = manager.epoch
+    assert mine.sent == [
+        {"type": "orders_delta", "epoch": epoch, "seq": 1, "upserted": [{"id": 1}], "removed": []},
+        {"type": "orders_delta", "epoch": epoch, "seq": 2, "upserted": [], "removed": [2]},
+    ]
+    assert other.sent == []
+
+
+def test_resync_replays_buffered_deltas_or_falls_back_to_snapshot(monkeypatch):
+    async def fake_snapshot(trader_id):
+        return [{"id": 1}, {"id": 2}, {"id": 3}]
+
+    monkeypatch.setattr("api.websockets.trader_orders_ws.load_orders_snapshot", fake_snapshot)
+    manager = WebSocketManager()
+    replay, fresh = FakeSocket(), FakeSocket()
+
+    async def scenario():
+        for order_id in (1, 2, 3):
+            manager.channel("7")
+            await manager.handle_order_event(
+                OrderEvent(kind=TRADER_ORDER, action=UPSERT, order_id=order_id, owner_id=7, data={"id": order_id})
+            )
+        for socket, epoch in ((replay, manager.epoch), (fresh, "other-process")):
+            conn = await manager.connect(socket, "7")
+            manager.resync(conn, since=1, epoch=epoch)
+            await conn.queue.join()
+            manager.disconnect(conn)
+
+    asyncio.run(scenario())
+
+    assert [frame["seq"] for frame in replay.sent] == [2, 3]
+    assert fresh.sent == [{"type": "orders_snapshot", "epoch": manager.epoch, "seq": 3, "orders": [{"id": 1}, {"id": 2}, {"id": 3}]}]
+
+
+def test_slow_consumer_is_coalesced_into_a_snapshot_without_blocking_others(monkeypatch):
+    async def fake_snapshot(trader_id):
+        return [{"id": 99}]
+
+    monkeypatch.setattr("api.websockets.trader_orders_ws.load_orders_snapshot", fake_snapshot)
+    manager = WebSocketManager(queue_size=2)
+    release = None
+    slow, fast = None, FakeSocket()
+
+    async def scenario():
+        nonlocal release, slow
+        release = asyncio.Event()
+        slow = FakeSocket(block=release)
+        slow_conn = await manager.connect(slow, "7")
+        fast_conn = await manager.connect(fast, "7")
+        for order_id in range(1, 6):
+            await manager.handle_order_event(
+                OrderEvent(kind=TRADER_ORDER, action=UPSERT, order_id=order_id, owner_id=7, data={"id": order_id})
+            )
+            await fast_conn.queue.join()
+        assert len(fast.sent) == 5
+        release.set()
+        await slow_conn.queue.join()
+        manager.disconnect(slow_conn)
+        manager.disconnect(fast_conn)
+
+    asyncio.run(scenario())
+
+    # delta 1 was in flight, deltas 2-4 were replaced by one snapshot, delta 5 queued after it
+    assert [frame["type"] for frame in slow.sent] == ["orders_delta", "orders_snapshot", "orders_delta"]
+    assert manager.dropped_frames > 0 and manager.coalesced > 0
+
+
+def test_heartbeat_reaps_silent_connections():
+    manager = WebSocketManager(ping_timeout=0)
+    socket = FakeSocket()
+
+    async def scenario():
+        conn = await manager.connect(socket, "7")
+        conn.last_seen -= 1
+        manager.heartbeat()
+        await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+
+    assert manager.stats()["connections"] == 0
+    assert manager.reaped == 1 and socket.closed_with == 1001
+
+
+def test_serve_swallows_only_cancellation_from_the_manager():
+    manager = WebSocketManager(ping_timeout=0)
+
+    async def scenario():
+        reaped = await manager.connect(FakeSocket(), "7")
+        reader = asyncio.create_task(manager.serve(reaped))
+        reaped.reader_task = reader
+        await asyncio.sleep(0)
+        reaped.last_seen -= 1
+        manager.heartbeat()
+        await reader  # закрыто менеджером — обработчик завершается штатно
+
+        other = await manager.connect(FakeSocket(), "8")
+        server_shutdown = asyncio.create_task(manager.serve(other))
+        await asyncio.sleep(0)
+        server_shutdown.cancel()
+        try:
+            await server_shutdown
+        except asyncio.CancelledError:
+            return True
+        return False
+
+    assert asyncio.run(scenario())
+    assert manager.stats()["connections"] == 0
+
+
+def test_notify_payload_round_trip_drops_order_data():
+    from api.services.order_events_pg import PostgresNotifyBackend
+
+    event = OrderEvent(kind=TRADER_ORDER, action=UPSERT, order_id=5, owner_id=7, status="processing",
+                       version="2024-01-01T00:00:00", data={"id": 5})
+    received = []
+
+    async def deliver(e):
+        received.append(e)
+
+    async def scenario():
+        backend = PostgresNotifyBackend(dsn="postgresql://unused")
+        backend._deliver = deliver
+        backend._on_notification(None, 1, backend.channel, event.to_payload())
+        await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+
+    assert received == [OrderEvent(kind=TRADER_ORDER, action=UPSERT, order_id=5, owner_id=7,
+                                   status="processing", version="2024-01-01T00:00:00")]
@@ -0,0 +1,43 @@
+import os
+import sys
+from datetime import datetime
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateIndex
+
+# Добавляем путь к корню проекта
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from api.enums import OrderStatus
+from api.services.order_expiry import ExpiryRule, OrderExpirySweeper, expire_statement
+from api.services.order_state_machine import (
+    exchange_orders,
+    publish_exchange_transition,
+    publish_trader_transition,
+    trader_orders,
+)
+from database.init_db import TraderOrder
+
+
+def test_rules_expire_only_statuses_the_transition_table_can_cancel():
+    exchange = ExpiryRule("exchange_orders", exchange_orders, 60, publish_exchange_transition)
+    trader = ExpiryRule("trader_orders", trader_orders, 60, publish_trader_transition)
+    assert exchange.statuses == {OrderStatus.pending}  # processing -> canceled для заявок пользователей запрещён
+    assert trader.statuses == {OrderStatus.pending, OrderStatus.processing}
+
+    disabled = ExpiryRule("exchange_orders", exchange_orders, 0, publish_exchange_transition)
+    assert OrderExpirySweeper([disabled, trader]).rules == [trader]
+
+
+def test_expiry_batch_is_one_update_over_skip_locked_rows_and_uses_partial_index():
+    rule = ExpiryRule("trader_orders", trader_orders, 60, publish_trader_transition)
+    sql = str(expire_statement(rule, datetime(2024, 1, 1), 100).compile(dialect=postgresql.dialect()))
+
+    assert sql.startswith("UPDATE trader_orders SET status=")
+    assert "ORDER BY trader_orders.created_at" in sql
+    assert "FOR UPDATE SKIP LOCKED) AS due" in sql
+    assert "RETURNING" in sql and "due.old_status" in sql
+
+    index = next(i for i in TraderOrder.__table__.indexes if i.name == "ix_trader_orders_open_status_created")
+    ddl = str(CreateIndex(index).compile(dialect=postgresql.dialect()))
+    assert "(status, created_at) WHERE status IN ('pending', 'processing')" in ddl
@@ -0,0 +1,101 @@
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+from pydantic import ValidationError
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import asyncpg
+
+# Добавляем путь к корню проекта
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from api.enums import OrderStatus
+from api.services.order_state_machine import (
+    DUPLICATE,
+    EXCHANGE_ORDER_USER_CANCELLABLE,
+    INVALID_TRANSITION,
+    TransitionRejected,
+    exchange_orders,
+    trader_orders,
+)
+from api.schemas import TraderOrderUpdate
+from database.init_db import TraderOrder
+
+
+def test_transition_tables_and_reverse_sources():
+    assert exchange_orders.can_transition(OrderStatus.pending, OrderStatus.completed)
+    assert not exchange_orders.can_transition(OrderStatus.arbitrage, OrderStatus.completed)
+    assert OrderStatus.canceled not in EXCHANGE_ORDER_USER_CANCELLABLE
+
+    # Конечные статусы ордеров трейдера не возвращаются обратно
+    assert not trader_orders.can_transition(OrderStatus.completed, OrderStatus.canceled)
+    assert trader_orders.sources[OrderStatus.completed] == {
+        OrderStatus.processing, OrderStatus.waiting_confirmation, OrderStatus.arbitrage
+    }
+    assert trader_orders.sources[OrderStatus.pending] == frozenset()
+
+
+def test_transition_is_a_single_compare_and_set_update():
+    stmt = trader_orders.statement(
+        7, OrderStatus.completed, trader_orders.sources[OrderStatus.completed], 3, TraderOrder.trader_id == 2
+    )
+    sql = str(stmt.compile(dialect=postgresql.dialect()))
+
+    assert sql.startswith("UPDATE trader_orders SET status=")
+    assert "version=(trader_orders.version +" in sql
+    assert "FOR UPDATE) AS locked" in sql
+    assert "trader_orders.status IN (__[POSTCOMPILE_status_1])" in sql
+    assert "AND trader_orders.version = %(version_2)s" in sql
+    assert "RETURNING" in sql and "locked.old_status" in sql
+
+
+def test_batch_plan_rejects_invalid_and_duplicate_items_without_the_database():
+    rejected, accepted = exchange_orders.plan_batch([
+        (1, OrderStatus.pending, OrderStatus.completed),
+        (2, OrderStatus.arbitrage, OrderStatus.completed),
+        (1, OrderStatus.processing, OrderStatus.completed),
+        (3, OrderStatus.processing, OrderStatus.waiting_confirmation),
+    ])
+    assert {index: result.result for index, result in rejected.items()} == {1: INVALID_TRANSITION, 2: DUPLICATE}
+    assert [order_id for order_id, _, _ in accepted] == [1, 3]
+
+
+def test_batch_is_one_update_from_typed_values():
+    stmt = exchange_orders.batch_statement([
+        (1, OrderStatus.pending, OrderStatus.completed),
+        (2, OrderStatus.processing, OrderStatus.completed),
+    ])
+    sql = str(stmt.compile(dialect=asyncpg.dialect()))
+
+    assert sql.startswith("UPDATE exchange_orders SET status=batch.new_status")
+    assert "FROM (VALUES ($3::INTEGER, $4::orderstatus, $5::orderstatus), ($6::INTEGER" in sql
+    assert "WHERE exchange_orders.id = batch.id AND exchange_orders.status = batch.expected_status" in sql
+
+
+def test_trader_order_update_rejects_fields_it_cannot_apply():
+    assert TraderOrderUpdate(status=OrderStatus.processing, version=2).version == 2
+    with pytest.raises(ValidationError):
+        TraderOrderUpdate(status=OrderStatus.processing, aml_status="passed")
+
+
+class OneRowSession:
+    """Сессия, в которой UPDATE ничего не обновил, а диагностический SELECT нашёл заявку."""
+
+    def __init__(self, order):
+        self.order = order
+        self.calls = 0
+
+    async def execute(self, stmt):
+        self.calls += 1
+        if self.calls == 1:
+            return SimpleNamespace(first=lambda: None)
+        return SimpleNamespace(scalar_one_or_none=lambda: self.order)
+
+
+def test_transition_to_the_current_status_is_rejected():
+    order = SimpleNamespace(id=1, status=OrderStatus.pending, version=1)
+    with pytest.raises(TransitionRejected) as rejected:
+        asyncio.run(exchange_orders.transition(OneRowSession(order), 1, OrderStatus.pending))
+    assert (rejected.value.reason, rejected.value.current_status) == (INVALID_TRANSITION, OrderStatus.pending)
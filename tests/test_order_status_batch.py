@@ -0,0 +1,36 @@
+import os
+import sys
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# Добавляем путь к корню проекта
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from api.auth import get_current_user
+from api.endpoints.user_orders_routers import router
+from api.services.auth_cache import UserPrincipal
+
+BATCH_URL = "/api/v1/orders/orders/change_status/batch"
+BATCH = {"items": [{"order_id": 1, "expected_status": "pending", "new_status": "completed"}]}
+
+
+def make_app() -> FastAPI:
+    app = FastAPI()
+    app.include_router(router, prefix="/api/v1/orders")
+    return app
+
+
+def test_batch_rejects_unauthenticated_calls():
+    client = TestClient(make_app())
+    assert client.post(BATCH_URL, json=BATCH).status_code == 401
+
+
+def test_batch_rejects_users_without_operator_role():
+    app = make_app()
+    app.dependency_overrides[get_current_user] = lambda: UserPrincipal(
+        id=1, email="user@example.com", full_name=None, role_id=3, is_superuser=False,
+        referral_code=None, role_name="user"
+    )
+    response = TestClient(app).post(BATCH_URL, json=BATCH)
+    assert response.status_code == 403
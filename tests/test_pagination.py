@@ -0,0 +1,51 @@
+import os
+import sys
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.future import select
+
+# Добавляем путь к корню проекта
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from api.utils.pagination import decode_cursor, encode_cursor, keyset_page, offset_page, split_page
+from database.init_db import ExchangeOrder
+
+
+def test_cursor_round_trip_keeps_microseconds():
+    created_at = datetime(2024, 5, 1, 12, 30, 15, 123456)
+    assert decode_cursor(encode_cursor(created_at, 7)) == (created_at, 7)
+
+
+def test_invalid_cursor_is_rejected():
+    with pytest.raises(HTTPException) as exc:
+        decode_cursor("not-a-cursor")
+    assert exc.value.status_code == 400
+
+
+def test_split_page_returns_cursor_of_last_row_only_when_more_rows_exist():
+    rows = [SimpleNamespace(id=i, created_at=datetime(2024, 1, 1, 0, 0, i)) for i in range(3, 0, -1)]
+
+    page, next_cursor = split_page(rows, 2)
+    assert [r.id for r in page] == [3, 2]
+    assert decode_cursor(next_cursor) == (rows[1].created_at, 2)
+
+    page, next_cursor = split_page(rows, 3)
+    assert len(page) == 3 and next_cursor is None
+
+
+def test_keyset_page_skips_rows_without_created_at():
+    stmt = keyset_page(select(ExchangeOrder), ExchangeOrder.created_at, ExchangeOrder.id, None, 10)
+    sql = str(stmt.compile(dialect=postgresql.dialect()))
+    assert "WHERE exchange_orders.created_at IS NOT NULL" in sql
+    assert "ORDER BY exchange_orders.created_at DESC, exchange_orders.id DESC" in sql
+
+
+def test_offset_page_keeps_other_sort_columns_with_a_stable_tiebreaker():
+    stmt = offset_page(select(ExchangeOrder), ExchangeOrder.total_rub, ExchangeOrder.id, 20, 10, descending=True)
+    sql = str(stmt.compile(dialect=postgresql.dialect()))
+    assert "ORDER BY exchange_orders.total_rub DESC, exchange_orders.id DESC" in sql
+    assert "LIMIT %(param_1)s::INTEGER OFFSET %(param_2)s::INTEGER" in sql
@@ -0,0 +1,89 @@
+import asyncio
+import os
+import sys
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+# Добавляем путь к корню проекта
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import api.auth
+from api.services.password_pool import PasswordHashPool
+
+
+def test_overflow_returns_503_and_counters_drain_back_to_zero(monkeypatch):
+    pool = PasswordHashPool(max_workers=1, max_pending=1)
+    monkeypatch.setattr(api.auth, "password_pool", pool)
+    release = threading.Event()
+
+    def blocked_verify(plain, hashed):
+        release.wait(5)
+        return True
+
+    monkeypatch.setattr(api.auth, "verify_password", blocked_verify)
+
+    async def scenario():
+        running = asyncio.create_task(api.auth.verify_password_async("a", "hash"))
+        queued = asyncio.create_task(api.auth.verify_password_async("b", "hash"))
+        await asyncio.sleep(0.05)
+        assert (pool.stats()["in_flight"], pool.stats()["queue_depth"]) == (1, 1)
+
+        with pytest.raises(HTTPException) as overflow:
+            await api.auth.verify_password_async("c", "hash")
+        assert overflow.value.status_code == 503
+
+        release.set()
+        return await asyncio.gather(running, queued)
+
+    try:
+        assert asyncio.run(scenario()) == [True, True]
+    finally:
+        release.set()
+        pool.shutdown()
+
+    stats = pool.stats()
+    assert (stats["in_flight"], stats["queue_depth"]) == (0, 0)
+    assert (stats["completed"], stats["rejected"]) == (2, 1)
+
+
+def test_semaphore_is_released_after_errors_and_cancelled_waits():
+    pool = PasswordHashPool(max_workers=1, max_pending=1)
+    release = threading.Event()
+
+    def fail():
+        raise ValueError("bad hash")
+
+    async def scenario():
+        with pytest.raises(ValueError):
+            await pool.run(fail)
+
+        # Слот освобождён: следующая операция выполняется, а не ждёт вечно
+        assert await asyncio.wait_for(pool.run(lambda: "ok"), timeout=1) == "ok"
+
+        running = asyncio.create_task(pool.run(release.wait, 5))
+        await asyncio.sleep(0.05)
+        queued = asyncio.create_task(pool.run(lambda: "never"))
+        await asyncio.sleep(0)
+        queued.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+        assert pool.stats()["queue_depth"] == 0
+
+        # Отменённое ожидание тоже освободило место в очереди
+        extra = asyncio.create_task(pool.run(lambda: "queued"))
+        await asyncio.sleep(0)
+        release.set()
+        assert await running is True
+        assert await extra == "queued"
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        release.set()
+        pool.shutdown()
+
+    stats = pool.stats()
+    assert (stats["in_flight"], stats["queue_depth"]) == (0, 0)
+    assert (stats["completed"], stats["rejected"]) == (4, 0)
@@ -0,0 +1,40 @@
+import os
+import sys
+
+from sqlalchemy import create_engine, text
+
+# Добавляем путь к корню проекта
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from database.query_profiler import RequestProfile, install_profiler, profile_var, statement_shape
+
+
+def test_statement_shape_ignores_parameter_values_and_in_list_length():
+    first = statement_shape("SELECT orders.id FROM orders\n WHERE orders.user_id IN ($1, $2, $3)")
+    second = statement_shape("SELECT orders.id FROM orders WHERE orders.user_id IN ($1)")
+    assert first == second == "SELECT orders.id FROM orders WHERE orders.user_id IN (?)"
+
+
+def test_profile_flags_repeated_shapes_and_slow_statements():
+    engine = create_engine("sqlite://")
+    install_profiler(engine)
+    install_profiler(engine)  # повторный вызов не дублирует записи
+
+    profile = RequestProfile()
+    token = profile_var.set(profile)
+    try:
+        with engine.connect() as conn:
+            for user_id in range(4):
+                conn.execute(text("SELECT :user_id AS id"), {"user_id": user_id})
+            conn.execute(text("SELECT 'other'"))
+    finally:
+        profile_var.reset(token)
+
+    report = profile.report(slow_ms=0, repeat_threshold=3)
+    assert report["statements"] == 5
+    assert len(report["repeated"]) == 1
+    assert report["repeated"][0]["count"] == 4
+    assert len(report["slow"]) == 5
+
+    quiet = profile.report(slow_ms=10_000, repeat_threshold=5)
+    assert quiet["repeated"] == [] and quiet["slow"] == []
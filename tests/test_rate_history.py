@@ -0,0 +1,70 @@
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from sqlalchemy.dialects import postgresql
+
+# Добавляем путь к корню проекта
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import api.endpoints.exchange_routers as exchange_routers
+from api.services.rate_history import _minute_bars_since, _upsert_bars, history_bounds, pick_resolution, rollup_window
+from database.init_db import get_async_db
+from constants import RATE_HISTORY_MINUTE_MAX_RANGE_HOURS
+
+
+def test_pick_resolution_switches_to_hours_for_long_ranges():
+    start = datetime(2024, 1, 1)
+    assert pick_resolution(start, start + timedelta(hours=RATE_HISTORY_MINUTE_MAX_RANGE_HOURS)) == "1m"
+    assert pick_resolution(start, start + timedelta(hours=RATE_HISTORY_MINUTE_MAX_RANGE_HOURS, seconds=1)) == "1h"
+
+
+def test_rollup_window_reaggregates_the_previous_minute():
+    # Тик из 12:00:59, закоммиченный после прохода в 12:01:00.5, попадает в следующий проход
+    minute_since, hour_since = rollup_window(datetime(2024, 1, 1, 12, 1, 0, 500000))
+    assert minute_since == datetime(2024, 1, 1, 12, 0)
+    assert hour_since == datetime(2024, 1, 1, 12, 0)
+
+    assert rollup_window(datetime(2024, 1, 1, 12, 0, 30)) == (datetime(2024, 1, 1, 11, 59), datetime(2024, 1, 1, 11, 0))
+    assert rollup_window(None) == (None, None)
+
+
+def test_minute_rollup_is_an_idempotent_upsert():
+    stmt = _upsert_bars(_minute_bars_since(datetime(2024, 1, 1, 12, 0)))
+    sql = str(stmt.compile(dialect=postgresql.dialect()))
+
+    assert sql.startswith("INSERT INTO exchange_rate_bars (currency, resolution, bucket_start, open, high, low, close, tick_count)")
+    assert "WHERE exchange_rate_ticks.created_at >= %(created_at_1)s" in sql
+    assert "ON CONFLICT ON CONSTRAINT uq_exchange_rate_bars_bucket DO UPDATE SET open = excluded.open" in sql
+
+
+def test_history_bounds_are_naive_utc():
+    msk = timezone(timedelta(hours=3))
+    start, end = history_bounds(datetime(2024, 1, 1, 15, 0, tzinfo=msk), None, now=datetime(2024, 1, 2))
+    assert (start, end) == (datetime(2024, 1, 1, 12, 0), datetime(2024, 1, 2))
+    assert history_bounds(None, datetime(2024, 1, 2, tzinfo=timezone.utc)) == (datetime(2024, 1, 1), datetime(2024, 1, 2))
+
+
+def test_rates_history_accepts_tz_aware_start_without_end(monkeypatch):
+    captured = {}
+
+    async def fake_get_rate_bars(db, currency, start, end, resolution):
+        captured.update(start=start, end=end)
+        return []
+
+    monkeypatch.setattr(exchange_routers, "get_rate_bars", fake_get_rate_bars)
+    app = FastAPI()
+    app.include_router(exchange_routers.router)
+    app.dependency_overrides[get_async_db] = lambda: None
+    client = TestClient(app)
+
+    start = (datetime.now(timezone.utc) - timedelta(hours=1)).isoformat()
+    response = client.get("/rates_history", params={"currency": "USDT", "start": start})
+    assert response.status_code == 200
+    assert captured["start"].tzinfo is None and captured["end"].tzinfo is None
+
+    future = (datetime.now(timezone.utc) + timedelta(hours=1)).isoformat()
+    assert client.get("/rates_history", params={"currency": "USDT", "start": future}).status_code == 400
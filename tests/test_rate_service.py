@@ -0,0 +1,152 @@
+import asyncio
+import os
+import sys
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+# Добавляем путь к корню проекта
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import api.services.rate_service as rate_service_module
+from api.services.leader_lock import AdvisoryLeaderLock
+from api.services.order_book import OrderBookSnapshot
+from api.services.rate_history import RateHistoryRollup
+from api.services.rate_service import RateService, RatesUnavailableError
+from database.init_db import ExchangeRate
+
+DEPTH = {
+    "asks": [{"price": "101", "volume": "1"}, {"price": "102", "volume": "2"}],
+    "bids": [{"price": "99", "volume": "3"}],
+    "timestamp": 1700000000,
+}
+
+
+class FakeLeader:
+    def __init__(self, leader: bool):
+        self.leader = leader
+        self.calls = 0
+
+    async def try_acquire(self) -> bool:
+        self.calls += 1
+        return self.leader
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def all(self):
+        return self.rows
+
+    def scalars(self):
+        return self
+
+
+class FakeSession:
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+        self.statements = []
+        self.commits = 0
+
+    async def execute(self, stmt):
+        self.statements.append(stmt)
+        return FakeResult(self.rows)
+
+    async def commit(self):
+        self.commits += 1
+
+
+def garantex_rates(market):
+    book = OrderBookSnapshot.from_depth(DEPTH)
+    return {"buy_rate": 101.0, "sell_rate": 99.0, "source": "Garantex", "order_book": book}
+
+
+def stored_rate(currency, median, order_book=None):
+    return ExchangeRate(
+        currency=currency, buy_rate=median, sell_rate=median, median_rate=median,
+        source="Garantex", order_book=order_book, updated_at=datetime(2024, 1, 1)
+    )
+
+
+def test_leader_fetches_from_garantex_and_stores_rates_with_order_book(monkeypatch):
+    async def fake_fetch(markets):
+        return {market: garantex_rates(market) for market in markets}
+
+    monkeypatch.setattr(rate_service_module, "fetch_markets_rates", fake_fetch)
+    now = datetime(2024, 1, 1)
+    db = FakeSession(rows=[
+        ("USDT", Decimal("101"), Decimal("99"), Decimal("100"), "Garantex", now),
+        ("BTC", Decimal("101"), Decimal("99"), Decimal("100"), "Garantex", now),
+    ])
+    service = RateService(leader=FakeLeader(True))
+
+    asyncio.run(service.sync(db))
+
+    sql = str(db.statements[0].compile(dialect=postgresql.dialect()))
+    assert "ON CONFLICT (currency) DO UPDATE" in sql and "order_book = excluded.order_book" in sql
+    assert db.commits == 1
+    assert service.version == 1 and service.get("USDT").median_rate == Decimal("100")
+    assert service.get_order_book("USDT").quote("buy", amount=2).vwap == pytest.approx(101.5)
+
+
+def test_follower_reads_rates_and_order_book_from_db_instead_of_garantex(monkeypatch):
+    async def fail_fetch(markets):
+        raise AssertionError("ведомый процесс не должен ходить в Garantex")
+
+    monkeypatch.setattr(rate_service_module, "fetch_markets_rates", fail_fetch)
+    depth = OrderBookSnapshot.from_depth(DEPTH).to_depth()
+    db = FakeSession(rows=[stored_rate("USDT", Decimal("100"), depth), stored_rate("BTC", Decimal("5000000"))])
+    service = RateService(leader=FakeLeader(False))
+
+    asyncio.run(service.sync(db))
+    assert service.version == 1 and service.get("BTC").median_rate == Decimal("5000000")
+    assert service.get_order_book("USDT").quote("sell", amount=3).vwap == pytest.approx(99.0)
+    assert service.get_order_book("BTC") is None
+
+    # Без изменений в базе версия снимка не растёт
+    asyncio.run(service.sync(db))
+    assert service.version == 1
+
+
+def test_failed_refresh_keeps_serving_the_last_snapshot(monkeypatch):
+    async def partial_fetch(markets):
+        return {market: None for market in markets}
+
+    monkeypatch.setattr(rate_service_module, "fetch_markets_rates", partial_fetch)
+    service = RateService(leader=FakeLeader(True))
+    asyncio.run(service.load_from_db(FakeSession(rows=[stored_rate("USDT", Decimal("100"))])))
+
+    with pytest.raises(RatesUnavailableError):
+        asyncio.run(service.sync(FakeSession()))
+
+    assert service.version == 1
+    assert service.get("USDT").median_rate == Decimal("100")
+
+
+@pytest.mark.parametrize("is_leader, expected", [(True, True), (False, False)])
+def test_rollup_runs_only_in_the_leader_process(is_leader, expected):
+    rollup = RateHistoryRollup(interval=0, leader=FakeLeader(is_leader))
+    ran = []
+
+    async def fake_rollup(db):
+        ran.append(db)
+
+    rollup.rollup = fake_rollup
+
+    async def scenario():
+        await rollup.start()
+        await asyncio.sleep(0.05)
+        await rollup.stop()
+
+    asyncio.run(scenario())
+    assert bool(ran) is expected
+    assert rollup.leader.calls > 0
+
+
+def test_leader_lock_reports_follower_when_database_is_unreachable():
+    lock = AdvisoryLeaderLock(1, dsn="postgresql://postgres@127.0.0.1:1/none")
+    assert asyncio.run(lock.try_acquire()) is False
+    assert not lock.is_leader
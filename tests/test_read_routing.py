@@ -0,0 +1,52 @@
+import os
+import sys
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+# Добавляем путь к корню проекта
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from database.read_routing import PRIMARY_UNTIL_COOKIE, PRIMARY_UNTIL_HEADER, ReplicaRouter, read_marker
+
+
+def make_request(headers) -> Request:
+    raw = [(name.lower().encode(), value.encode()) for name, value in headers.items()]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": raw})
+
+
+def test_write_marker_pins_client_to_primary_until_window_expires():
+    router = ReplicaRouter(sticky_seconds=5)
+    marker = router.write_marker(now=1000.0)
+
+    assert router.use_primary(marker, now=1000.0)
+    assert router.use_primary(marker, now=1004.9)
+    assert not router.use_primary(marker, now=1005.0)
+    assert not router.use_primary(None, now=1000.0)
+
+
+def test_marker_is_rounded_down_so_fresh_markers_are_accepted():
+    router = ReplicaRouter(sticky_seconds=5)
+    marker = router.write_marker(now=1000.0009)
+    assert marker == "1005.000"
+    assert router.use_primary(marker, now=1000.0009)
+
+
+def test_forged_or_malformed_markers_are_ignored():
+    router = ReplicaRouter(sticky_seconds=5)
+    assert not router.use_primary("1100.0", now=1000.0)  # окно длиннее sticky_seconds
+    assert not router.use_primary("not-a-number", now=1000.0)
+    assert ReplicaRouter(sticky_seconds=0).write_marker(now=1000.0) is None
+
+
+def test_marker_round_trips_through_cookie_and_header():
+    router = ReplicaRouter(sticky_seconds=5)
+    response = Response()
+    router.mark_write(response)
+
+    marker = response.headers[PRIMARY_UNTIL_HEADER]
+    assert f"{PRIMARY_UNTIL_COOKIE}={marker}" in response.headers["set-cookie"]
+    assert read_marker(make_request({"Cookie": f"{PRIMARY_UNTIL_COOKIE}={marker}"})) == marker
+    assert read_marker(make_request({PRIMARY_UNTIL_HEADER: marker})) == marker
+    assert router.use_primary(read_marker(make_request({PRIMARY_UNTIL_HEADER: marker})))
+    assert read_marker(make_request({"Authorization": "Bearer x"})) is None
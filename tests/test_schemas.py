@@ -0,0 +1,20 @@
+import os
+import sys
+from datetime import datetime
+from decimal import Decimal
+
+# Добавляем путь к корню проекта
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from api.enums import OrderStatus, TraderOrderTypeEnum
+from api.schemas import TraderOrderResponse
+
+
+def test_trader_order_response_accepts_trader_order_types():
+    order = TraderOrderResponse.model_validate({
+        "id": 1, "trader_id": 2, "order_type": "pay_out", "currency": "USDT", "fiat": "RUB",
+        "amount_currency": Decimal("10"), "total_fiat": Decimal("1000.00"), "median_rate": Decimal("100"),
+        "status": OrderStatus.pending, "created_at": datetime(2024, 1, 1), "updated_at": datetime(2024, 1, 1),
+        "payment_method_id": 3, "trader_req_id": 4,
+    })
+    assert order.order_type is TraderOrderTypeEnum.pay_out
@@ -0,0 +1,91 @@
+import asyncio
+import os
+import sys
+from decimal import Decimal
+from types import SimpleNamespace
+
+# Добавляем путь к корню проекта
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from api.enums import TraderOrderTypeEnum, TraderReqStatus
+from api.services.order_events import DELETE, OrderEvent, TRADER_ORDER, UPSERT
+from api.services.trader_routing import TraderRouter, TraderState
+
+SBP = 1
+
+
+def _requisite(req_id, trader_id, bank="sber", can_buy=True, can_sell=True, fee="0", status=TraderReqStatus.approve):
+    return SimpleNamespace(
+        id=req_id, trader_id=trader_id, payment_method="SBP", bank=bank, status=status,
+        can_buy=can_buy, can_sell=can_sell, fee_percentage=Decimal(fee)
+    )
+
+
+def _router(policy="round_robin", traders=(1, 2)):
+    router = TraderRouter(policy)
+    router._payment_methods = {SBP: "SBP"}
+    for trader_id in traders:
+        router._traders[trader_id] = TraderState(trader_id, "RUB", access=True, pay_in=True, pay_out=True)
+        router.set_balance(trader_id, "RUB", Decimal("10000"))
+    return router
+
+
+def _pick(router, order_type=TraderOrderTypeEnum.pay_in, amount="100", bank=None):
+    return list(router.candidates(order_type, "RUB", SBP, Decimal(amount), bank))
+
+
+def test_index_follows_requisite_flags_bank_and_trader_toggles():
+    router = _router()
+    router.upsert_requisite(_requisite(10, 1, bank="sber", can_sell=False))
+    router.upsert_requisite(_requisite(20, 2, bank="tinkoff"))
+
+    assert _pick(router) == [20]  # 10 не может принимать pay_in (can_sell=False)
+    assert sorted(_pick(router, TraderOrderTypeEnum.pay_out)) == [10, 20]
+    assert _pick(router, TraderOrderTypeEnum.pay_out, bank="sber") == [10]
+
+    router.update_trader(2, pay_in=False)
+    assert _pick(router) == []
+    router.update_trader(2, pay_in=True)
+    assert _pick(router) == [20]
+
+    router.upsert_requisite(_requisite(20, 2, status=TraderReqStatus.check))
+    assert _pick(router) == []
+
+
+def test_candidates_without_enough_balance_are_skipped():
+    router = _router()
+    router.upsert_requisite(_requisite(10, 1))
+    router.upsert_requisite(_requisite(20, 2))
+    router.set_balance(1, "RUB", Decimal("50"))
+
+    assert _pick(router, amount="100") == [20]
+
+
+def test_round_robin_rotates_and_least_loaded_prefers_idle_traders():
+    router = _router()
+    router.upsert_requisite(_requisite(10, 1))
+    router.upsert_requisite(_requisite(20, 2))
+    first = [next(router.candidates(TraderOrderTypeEnum.pay_in, "RUB", SBP, Decimal("1"))) for _ in range(4)]
+    assert first == [10, 20, 10, 20]
+
+    router = _router("least_loaded")
+    router.upsert_requisite(_requisite(10, 1))
+    router.upsert_requisite(_requisite(20, 2))
+
+    def event(order_id, action=UPSERT, status="pending"):
+        return OrderEvent(kind=TRADER_ORDER, action=action, order_id=order_id, owner_id=1, status=status)
+
+    asyncio.run(router.handle_order_event(event(100)))
+    assert _pick(router)[0] == 20
+
+    asyncio.run(router.handle_order_event(event(100, status="completed")))
+    asyncio.run(router.handle_order_event(event(101, action=DELETE)))
+    assert router._open_orders[1] == set()
+
+
+def test_fee_weighted_returns_every_candidate_once():
+    router = _router("fee_weighted")
+    router.upsert_requisite(_requisite(10, 1, fee="0.5"))
+    router.upsert_requisite(_requisite(20, 2, fee="3"))
+
+    assert sorted(_pick(router)) == [10, 20]
@@ -0,0 +1,63 @@
+import os
+import sys
+from decimal import Decimal
+from types import SimpleNamespace
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+# Добавляем путь к корню проекта
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from api.endpoints.trader_routers import _stats_response, _trader_profile_query
+from api.enums import OrderStatus
+from api.services.trader_stats import _delta
+from database.init_db import Base, BalanceTrader, FiatCurrencyTrader, TimeZone, Trader, TraderStats
+from database.query_profiler import RequestProfile, install_profiler, profile_var
+
+ORDER = SimpleNamespace(total_fiat=Decimal("950.00"), amount_currency=Decimal("10"))
+
+
+def test_status_transitions_move_counters_between_buckets():
+    assert _delta(ORDER, None, OrderStatus.pending) == {"orders_open": 1}
+    assert _delta(ORDER, OrderStatus.pending, OrderStatus.processing) == {}
+    assert _delta(ORDER, OrderStatus.processing, OrderStatus.completed) == {
+        "orders_open": -1, "orders_completed": 1,
+        "turnover_fiat": Decimal("950.00"), "turnover_currency": Decimal("10"),
+    }
+    assert _delta(ORDER, OrderStatus.completed, OrderStatus.canceled) == {
+        "orders_completed": -1, "orders_canceled": 1,
+        "turnover_fiat": Decimal("-950.00"), "turnover_currency": Decimal("-10"),
+    }
+
+
+def test_profile_is_a_single_statement_with_stats():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    install_profiler(engine)
+
+    with Session(engine) as db:
+        db.add_all([
+            TimeZone(id=1, name="Europe/Moscow", display_name="(UTC+03:00) Moscow", utc_offset=180),
+            FiatCurrencyTrader(id=1, currency_name="RUB"),
+            Trader(id=1, email="t@example.com", password_hash="x", time_zone_id=1, fiat_currency_id=1),
+            Trader(id=2, email="r@example.com", password_hash="x", time_zone_id=1, fiat_currency_id=1, referrer_id=1),
+            BalanceTrader(trader_id=1, fiat=1, balance=Decimal("1000.00"), reserved=Decimal("250.00")),
+            TraderStats(trader_id=1, orders_total=4, orders_completed=3, orders_canceled=1),
+        ])
+        db.commit()
+        db.expunge_all()
+
+        profile = RequestProfile()
+        token = profile_var.set(profile)
+        try:
+            row = db.execute(_trader_profile_query().filter(Trader.id == 1)).first()
+        finally:
+            profile_var.reset(token)
+
+    assert len(profile.statements) == 1
+    assert row.BalanceTrader.reserved == Decimal("250.00")
+    assert row.TimeZone.utc_offset == 180
+    stats = _stats_response(row.TraderStats)
+    assert stats.orders_completed == 3
+    assert stats.success_rate == 0.75
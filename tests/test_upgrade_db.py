@@ -0,0 +1,26 @@
+import os
+import sys
+
+# Добавляем путь к корню проекта
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from database.upgrade_db import index_statements, upgrade_statements
+
+
+def test_upgrade_adds_columns_and_unique_keys_used_by_upserts():
+    statements = upgrade_statements()
+    assert "ALTER TABLE trader_orders ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1" in statements
+    assert any("ADD COLUMN IF NOT EXISTS reserved" in s for s in statements)
+
+    # Дубли курсов удаляются до создания уникального индекса под ON CONFLICT (currency)
+    dedup = next(i for i, s in enumerate(statements) if "DELETE FROM exchange_rates" in s)
+    unique = next(i for i, s in enumerate(statements) if "exchange_rates_currency_key" in s)
+    assert dedup < unique
+
+
+def test_index_statements_are_idempotent_and_keep_partial_predicates():
+    statements = index_statements()
+    assert all(s.startswith(("CREATE INDEX IF NOT EXISTS", "CREATE UNIQUE INDEX IF NOT EXISTS")) for s in statements)
+    partial = next(s for s in statements if "ix_trader_orders_open_status_created" in s)
+    assert "WHERE status IN ('pending', 'processing')" in partial
+    assert any("ix_exchange_orders_user_created_id" in s for s in statements)
@@ -1,8 +1,9 @@
 # JE/websocket_server.py
 import logging
+from typing import Any, Dict
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from api.websockets.trader_orders_ws import get_websocket_router
+from api.websockets.trader_orders_ws import get_websocket_router, start_order_updates, stop_order_updates, websocket_manager
 
 # Initialize FastAPI app for WebSocket
 app = FastAPI(
@@ -32,34 +33,47 @@ logger = logging.getLogger(__name__)
 
 # Include WebSocket Router
 @app.on_event("startup")
-async def startup_event():
+async def startup_event() -> None:
     logger.info("WebSocket server starting...")
     router = await get_websocket_router()
     app.include_router(router, prefix="/api/v1")  # Убедитесь, что префикс правильный
+    await start_order_updates()
 
 @app.on_event("shutdown")
-async def shutdown_event():
+async def shutdown_event() -> None:
     logger.info("WebSocket server shutting down...")
+    await stop_order_updates()
 
 # Custom endpoint for WebSocket documentation (without trader_id dependency)
 @app.get("/ws/docs", response_model=dict)
-async def get_websocket_docs():
+async def get_websocket_docs() -> Dict[str, Any]:
     return {
         "endpoint": "/api/v1/ws/orders/{trader_id}",
         "description": "Real-time WebSocket channel for trader order updates",
         "parameters": {
-            "trader_id": "Path parameter, string representation of trader ID (must be convertible to int)"
+            "trader_id": "Path parameter, string representation of trader ID (must be convertible to int)",
+            "since": "Optional query parameter: last seq the client applied, to resume without a snapshot",
+            "epoch": "Optional query parameter: epoch of the frames the client applied"
         },
         "client_messages": [
-            {"type": "subscribe", "description": "Subscribe to order updates for the specified trader"}
+            {"type": "subscribe", "description": "Request a fresh orders_snapshot"},
+            {"type": "resync", "description": "Request deltas after `since` (with `epoch`); a snapshot is sent if they are no longer buffered"},
+            {"type": "pong", "description": "Heartbeat reply; any client message keeps the connection alive"}
         ],
         "server_messages": [
-            {"type": "orders_update", "description": "List of trader orders in TraderOrderResponse format"},
+            {"type": "orders_snapshot", "description": "Full list of trader orders (TraderOrderResponse) with `epoch` and the `seq` it reflects"},
+            {"type": "orders_delta", "description": "`upserted` orders and `removed` order ids; `seq` grows by 1 per trader, a gap means the client must resync"},
+            {"type": "ping", "description": "Heartbeat; connections silent for longer than the ping timeout are closed"},
             {"type": "error", "description": "Error message if connection fails or authorization fails"}
         ],
-        "periodic_updates": "Every 5 seconds"
+        "updates": "Pushed when an order is created, updated or deleted; idle connections cost no queries"
     }
 
+# Connection, queue and drop counters for this worker
+@app.get("/ws/metrics", response_model=dict)
+async def get_websocket_metrics() -> Dict[str, Any]:
+    return websocket_manager.stats()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file